@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+##
+#
+# Compare the number of branch-and-bound nodes and the solve time
+# of the Gurobi MICP solver with a single global big-M value and
+# with per-predicate big-M values computed from the state and
+# control bounds.
+#
+##
+
+import numpy as np
+from stlpy.benchmarks import RandomMultitarget, DoorPuzzle
+from stlpy.solvers import GurobiMICPSolver
+
+# Bounds on state and control variables
+u_min = np.array([-0.5,-0.5])
+u_max = np.array([0.5, 0.5])
+
+scenarios = [
+    ("RandomMultitarget",
+        RandomMultitarget(1, 5, 2, 25, seed=0),
+        np.array([5.0,2.0,0,0]),
+        np.array([0.0, 0.0, -1.0, -1.0]),
+        np.array([10.0, 10.0, 1.0, 1.0])),
+    ("DoorPuzzle",
+        DoorPuzzle(25, 2),
+        np.array([6.0,1.0,0,0]),
+        np.array([0.0, 0.0, -2.0, -2.0]),
+        np.array([15.0, 10.0, 2.0, 2.0]))]
+
+print(f"{'scenario':<20}{'big-M':<10}{'nodes':>10}{'time (s)':>12}{'robustness':>12}")
+for name, scenario, x0, x_min, x_max in scenarios:
+    spec = scenario.GetSpecification()
+    sys = scenario.GetSystem()
+    T = scenario.T
+
+    for tight_big_m in [False, True]:
+        solver = GurobiMICPSolver(spec, sys, x0, T, tight_big_m=tight_big_m, verbose=False)
+        solver.AddControlBounds(u_min, u_max)
+        solver.AddStateBounds(x_min, x_max)
+        x, u, rho, solve_time = solver.Solve()
+
+        label = "tight" if tight_big_m else "global"
+        print(f"{name:<20}{label:<10}{int(solver.model.NodeCount):>10}{solve_time:>12.3f}{float(np.squeeze(rho)):>12.4f}")
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+##
+#
+# Compare the number of binary variables and the solve time of
+# the Gurobi MICP solver with different encodings of disjunction
+# on the disjunction-heavy stepping-stones and multitarget
+# scenarios.
+#
+##
+
+import numpy as np
+from stlpy.benchmarks import SteppingStones, RandomMultitarget
+from stlpy.solvers import GurobiMICPSolver
+
+# Bounds on state and control variables
+u_min = np.array([-0.5,-0.5])
+u_max = np.array([0.5, 0.5])
+x_min = np.array([0.0, 0.0, -1.0, -1.0])
+x_max = np.array([10.0, 10.0, 1.0, 1.0])
+
+scenarios = [
+    ("SteppingStones", SteppingStones(15, 15, seed=1), np.array([2.0,1.3,0,0])),
+    ("RandomMultitarget", RandomMultitarget(1, 5, 2, 25, seed=0), np.array([5.0,2.0,0,0]))]
+
+print(f"{'scenario':<20}{'encoding':<10}{'binaries':>10}{'time (s)':>12}{'robustness':>12}")
+for name, scenario, x0 in scenarios:
+    spec = scenario.GetSpecification()
+    sys = scenario.GetSystem()
+    T = scenario.T
+
+    for encoding in ["naive", "log_sos1", "sos1"]:
+        solver = GurobiMICPSolver(spec, sys, x0, T, encoding=encoding, verbose=False)
+        solver.AddControlBounds(u_min, u_max)
+        solver.AddStateBounds(x_min, x_max)
+        x, u, rho, solve_time = solver.Solve()
+
+        binaries = int(solver.encoding.integer.sum())
+        print(f"{name:<20}{encoding:<10}{binaries:>10}{solve_time:>12.3f}{float(np.squeeze(rho)):>12.4f}")
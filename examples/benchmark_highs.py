@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+##
+#
+# Compare the open-source HiGHS MICP solver with the other
+# mixed-integer solvers (whichever of them are installed) on
+# all of the benchmark scenarios. The nonlinear reach-avoid
+# scenario is left out, since mixed-integer solvers only support
+# linear systems and predicates.
+#
+##
+
+import numpy as np
+from stlpy.benchmarks import *
+from stlpy.solvers import *
+from stlpy.solvers import GUROBI_ENABLED, DRAKE_ENABLED
+
+# Stop each solver after this many seconds
+time_limit = 120
+
+# Bounds on state and control variables
+u_min = np.array([-0.5,-0.5])
+u_max = np.array([0.5, 0.5])
+x_min = np.array([0.0, 0.0, -1.0, -1.0])
+x_max = np.array([15.0, 10.0, 1.0, 1.0])
+
+scenarios = [
+    ("ReachAvoid", ReachAvoid((7,8,8,9), (2.8,4.8,3.2,5.2), 24), np.array([1.0,2.0,0,0])),
+    ("EitherOr", EitherOr((7,8,8,9), (1,2,6,7), (7,8,4.5,5.5), (3,5,4,6), 25, 5), np.array([1.0,2.0,0,0])),
+    ("NarrowPassage", NarrowPassage(25), np.array([3.0,3.6,0,0])),
+    ("RandomMultitarget", RandomMultitarget(1, 5, 2, 25, seed=0), np.array([5.0,2.0,0,0])),
+    ("DoorPuzzle", DoorPuzzle(25, 2), np.array([6.0,1.0,0,0])),
+    ("SteppingStones", SteppingStones(15, 15, seed=1), np.array([2.0,1.3,0,0]))]
+
+print(f"{'scenario':<22}{'solver':<10}{'time (s)':>12}{'robustness':>12}")
+for name, scenario, x0 in scenarios:
+    spec = scenario.GetSpecification()
+    sys = scenario.GetSystem()
+    T = scenario.T
+
+    # (name, solver, keyword arguments for Solve)
+    solvers = [("HiGHS", HighsMICPSolver(spec, sys, x0, T, verbose=False), {"time_limit": time_limit})]
+    if GUROBI_ENABLED:
+        solvers.append(("Gurobi", GurobiMICPSolver(spec, sys, x0, T, verbose=False), {"time_limit": time_limit}))
+    if DRAKE_ENABLED:
+        solvers.append(("Drake", DrakeMICPSolver(spec, sys, x0, T, verbose=False), {}))
+
+    for solver_name, solver, options in solvers:
+        solver.AddControlBounds(u_min, u_max)
+        solver.AddStateBounds(x_min, x_max)
+        x, u, rho, solve_time = solver.Solve(**options)
+        print(f"{name:<22}{solver_name:<10}{solve_time:>12.3f}{float(np.max(rho)):>12.4f}")
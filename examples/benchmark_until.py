@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+##
+#
+# Compare the size of the until operator p U_[0,L] q when it is
+# written as a disjunction over every switching time (quadratic
+# in L) and with the backwards recursion used by UntilTree
+# (linear in L), as the length L of the interval grows. The two
+# give the same Standard robustness, but differ for other metrics.
+#
+##
+
+import time
+import numpy as np
+from stlpy.STL import LinearPredicate
+from stlpy.systems import DoubleIntegrator
+from stlpy.solvers import MICPEncoding
+from stlpy.enumerations.option import RobustnessMetrics
+
+def count_edges(formula):
+    """
+    Count the (subformula, timestep) pairs of all unique nodes in the formula.
+    """
+    edges = 0
+    visited = set()
+    stack = [formula]
+    while stack:
+        node = stack.pop()
+        if id(node) in visited or node.is_predicate():
+            continue
+        visited.add(id(node))
+        for subformula, t in node.iter_subformulas():
+            edges += 1
+            stack.append(subformula)
+    return edges
+
+sys = DoubleIntegrator(2)
+x0 = np.zeros(4)
+p = LinearPredicate([1, 0, 0, 0, 0, 0], -5)   # px >= -5
+q = LinearPredicate([0, 1, 0, 0, 0, 0], 2)    # py >= 2
+y = np.random.default_rng(0).normal(size=(6, 1001))
+
+print(f"{'L':>6}{'until':>16}{'edges':>10}{'rows':>10}{'binaries':>10}{'build (s)':>12}{'eval (s)':>12}")
+for L in [10, 20, 50, 100, 200, 500]:
+    for label, linear in [("switching time", False), ("recursive", True)]:
+        st = time.time()
+        spec = p.until(q, 0, L, linear=linear)
+        encoding = MICPEncoding(spec, sys, x0, L+1)
+        build_time = time.time() - st
+
+        compiled = spec.compile()
+        st = time.time()
+        compiled.robustness(y, 0, RobustnessMetrics.Standard)
+        eval_time = time.time() - st
+
+        rows = sum(len(b) for A, sense, b in encoding.blocks.values())
+        binaries = int(np.sum(encoding.integer))
+        print(f"{L:>6}{label:>16}{count_edges(spec):>10}{rows:>10}{binaries:>10}{build_time:>12.4f}{eval_time:>12.4f}")
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+##
+#
+# Report the number of binary variables in the mixed-integer
+# encoding of each of the bundled benchmarks, with one binary
+# variable per occurrence of a predicate in the formula tree
+# (as in the original encoding) and with one binary variable per
+# distinct predicate and timestep (as in MICPEncoding).
+#
+##
+
+import numpy as np
+from stlpy.benchmarks import *
+from stlpy.solvers import MICPEncoding
+
+T = 25
+scenarios = [
+    ("ReachAvoid", ReachAvoid((7.5,8.5,7.5,8.5), (3,5,4,6), T)),
+    ("EitherOr", EitherOr((7.5,8.5,7.5,8.5), (3,4,5,6), (5,6,2,3), (3,5,4,6), T, 5)),
+    ("NarrowPassage", NarrowPassage(T)),
+    ("RandomMultitarget", RandomMultitarget(1, 5, 2, T, seed=0)),
+    ("DoorPuzzle", DoorPuzzle(T, 2)),
+    ("SteppingStones", SteppingStones(10, T, seed=0))]
+
+def count_occurrences(formula):
+    """
+    Count the predicates in the formula tree, with repetitions.
+    """
+    count = 0
+    stack = [formula]
+    while stack:
+        formula = stack.pop()
+        if formula.is_predicate():
+            count += 1
+        else:
+            stack += [s for s, t in formula.iter_subformulas()]
+    return count
+
+print(f"{'scenario':<20}{'per occurrence':>16}{'deduplicated':>14}")
+for name, scenario in scenarios:
+    spec = scenario.GetSpecification()
+    sys = scenario.GetSystem()
+    x0 = np.zeros(sys.n)
+
+    # The top-level specification also has a binary variable
+    before = count_occurrences(spec) + 1
+    after = int(MICPEncoding(spec, sys, x0, T+1).integer.sum())
+    print(f"{name:<20}{before:>16}{after:>14}")
@@ -1,17 +1,16 @@
 import stlpy.STL
+from stlpy.RobustnessMeasure.cache import subformula_robustness
 import math
 import numpy as np
 
 
 class RobustnessMeasure_and():
 
-    def Standard(self, y, t, robustness_type):
-        return min([formula.robustness(y, t + self.timesteps[i], robustness_type) for i, formula in
-             enumerate(self.subformula_list)])
+    def Standard(self, y, t, robustness_type, cache=None):
+        return min(subformula_robustness(self, y, t, robustness_type, cache))
 
-    def AGM(self, y, t, robustness_type):
-        list = ([formula.robustness(y, t + self.timesteps[i], robustness_type) for i, formula in
-                 enumerate(self.subformula_list)]) #all robustness in a entirely encoded STL
+    def AGM(self, y, t, robustness_type, cache=None):
+        list = subformula_robustness(self, y, t, robustness_type, cache) #all robustness in a entirely encoded STL
         if any(list[i] <= 0 for i in range(len(list))):
             list1 = [] #list which is calculated, only choose the negative robustness
             for i in range(len(list)):
@@ -25,23 +24,20 @@ class RobustnessMeasure_and():
             out = math.pow(out, 1 / len(list)) - 1
         return out
 
-    def Smooth(self, y, t, robustness_type):
-        list = ([formula.robustness(y, t + self.timesteps[i], robustness_type) for i, formula in
-                 enumerate(self.subformula_list)])
+    def Smooth(self, y, t, robustness_type, cache=None):
+        list = subformula_robustness(self, y, t, robustness_type, cache)
         k1 = 5
         x = np.array(list)
         return -(1 / k1) * np.log(np.sum(np.exp(-k1 * (x))))
 
-    def LSE(self, y, t, robustness_type):
-        list = ([formula.robustness(y, t + self.timesteps[i], robustness_type) for i, formula in
-                 enumerate(self.subformula_list)])
+    def LSE(self, y, t, robustness_type, cache=None):
+        list = subformula_robustness(self, y, t, robustness_type, cache)
         k = 5
         x = np.array(list)
         return (-1 / k) * np.log(np.sum(np.exp(k * (-x))))
 
-    def wSTL_Standard(self, y, t, robustness_type):
-        list = ([formula.robustness(y, t + self.timesteps[i], robustness_type) for i, formula in
-                 enumerate(self.subformula_list)])
+    def wSTL_Standard(self, y, t, robustness_type, cache=None):
+        list = subformula_robustness(self, y, t, robustness_type, cache)
         x = np.array(list)
         w = []
         # print("The length of subformula is " + str(len(list)) + " please input each weight of subformula.")
@@ -58,9 +54,8 @@ class RobustnessMeasure_and():
             out.append(((0.5-w[i]) * np.sign(x[i]) + 0.5) * x[i])
         return min(out)
 
-    def wSTL_AGM(self, y, t, robustness_type):
-        list = ([formula.robustness(y, t + self.timesteps[i], robustness_type) for i, formula in
-                 enumerate(self.subformula_list)])
+    def wSTL_AGM(self, y, t, robustness_type, cache=None):
+        list = subformula_robustness(self, y, t, robustness_type, cache)
         x = np.array(list)
         w = []
         #input weight
@@ -93,9 +88,8 @@ class RobustnessMeasure_and():
             out = out - 1
         return out
 
-    def NewRobustness(self, y, t, robustness_type):
-        list = ([formula.robustness(y, t + self.timesteps[i], robustness_type) for i, formula in
-                 enumerate(self.subformula_list)])  # all robustness in a entirely encoded STL
+    def NewRobustness(self, y, t, robustness_type, cache=None):
+        list = subformula_robustness(self, y, t, robustness_type, cache)  # all robustness in a entirely encoded STL
         v = 10  # parameter v > 0 is then defined by taking the weighted average of these effective measures
         rho_tilde = [] #Using this normalized measure, it can be transformed to be non-positive and becomes 0 at rho_i = rho_min
         rho_eff = []
@@ -125,5 +119,5 @@ class RobustnessMeasure_and():
         return out
 
 
-    def TimeRobustness(self, y, t, robustness_type):
+    def TimeRobustness(self, y, t, robustness_type, cache=None):
         pass
\ No newline at end of file
@@ -1,17 +1,16 @@
 import stlpy.STL
+from stlpy.RobustnessMeasure.cache import subformula_robustness
 import math
 import numpy as np
 
 
 class RobustnessMeasure_or():
 
-    def Standard(self, y, t, robustness_type):
-        return max([formula.robustness(y, t + self.timesteps[i], robustness_type) for i, formula in
-             enumerate(self.subformula_list)])
+    def Standard(self, y, t, robustness_type, cache=None):
+        return max(subformula_robustness(self, y, t, robustness_type, cache))
 
-    def AGM(self, y, t, robustness_type):
-        list = ([formula.robustness(y, t + self.timesteps[i], robustness_type) for i, formula in
-                 enumerate(self.subformula_list)])
+    def AGM(self, y, t, robustness_type, cache=None):
+        list = subformula_robustness(self, y, t, robustness_type, cache)
         if any(list[i] > 0 for i in range(len(list))):
             list1 = []
             for i in range(len(list)):
@@ -25,23 +24,20 @@ class RobustnessMeasure_or():
             out = - math.pow(out, 1 / len(list)) + 1
         return out
 
-    def Smooth(self, y, t, robustness_type):
-        list = ([formula.robustness(y, t + self.timesteps[i], robustness_type) for i, formula in
-                 enumerate(self.subformula_list)])
+    def Smooth(self, y, t, robustness_type, cache=None):
+        list = subformula_robustness(self, y, t, robustness_type, cache)
         k2 = 5
         x = np.array(list)
         return (np.sum(x * np.exp(k2 * (x))) / (np.sum(np.exp(k2 * (x)))))
 
-    def LSE(self, y, t, robustness_type):
-        list = ([formula.robustness(y, t + self.timesteps[i], robustness_type) for i, formula in
-                 enumerate(self.subformula_list)])
+    def LSE(self, y, t, robustness_type, cache=None):
+        list = subformula_robustness(self, y, t, robustness_type, cache)
         k = 5
         x = np.array(list)
         return (1 / k) * np.log(np.sum(np.exp(k * (x))))
 
-    def wSTL_Standard(self, y, t, robustness_type):
-        list = ([formula.robustness(y, t + self.timesteps[i], robustness_type) for i, formula in
-                 enumerate(self.subformula_list)])
+    def wSTL_Standard(self, y, t, robustness_type, cache=None):
+        list = subformula_robustness(self, y, t, robustness_type, cache)
         x = np.array(list)
         w = []
         for i in range(0, len(list)):#set weight for each formula
@@ -54,9 +50,8 @@ class RobustnessMeasure_or():
             out.append((-(0.5-w[i]) * np.sign(x[i]) + 0.5) * (x[i]))
         return max(out)
 
-    def wSTL_AGM(self, y, t, robustness_type):
-        list = ([formula.robustness(y, t + self.timesteps[i], robustness_type) for i, formula in
-                 enumerate(self.subformula_list)])
+    def wSTL_AGM(self, y, t, robustness_type, cache=None):
+        list = subformula_robustness(self, y, t, robustness_type, cache)
         x = np.array(list)
         w = []
         for i in range(0, len(list)):
@@ -80,9 +75,8 @@ class RobustnessMeasure_or():
             out = out + 1
         return out
 
-    def NewRobustness(self, y, t, robustness_type):
-        list = ([formula.robustness(y, t + self.timesteps[i], robustness_type) for i, formula in
-                 enumerate(self.subformula_list)])  # all robustness in a entirely encoded STL
+    def NewRobustness(self, y, t, robustness_type, cache=None):
+        list = subformula_robustness(self, y, t, robustness_type, cache)  # all robustness in a entirely encoded STL
         v = 10  # parameter v > 0 is then defined by taking the weighted average of these effective measures
         rho_tilde = []  # Using this normalized measure, it can be transformed to be non-positive and becomes 0 at rho_i = rho_max
         rho_eff = []
@@ -111,6 +105,6 @@ class RobustnessMeasure_or():
             out = 0
         return out
 
-    def TimeRobustness(self, y, t, robustness_type):
+    def TimeRobustness(self, y, t, robustness_type, cache=None):
         # TODO:
         pass
\ No newline at end of file
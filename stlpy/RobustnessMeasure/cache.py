@@ -0,0 +1,103 @@
+class RobustnessCache():
+    """
+    An evaluation-scoped cache of robustness values :math:`\\rho^{\\varphi_i}(y,t)`,
+    keyed on the identity of the subformula :math:`\\varphi_i` and the absolute
+    timestep :math:`t`.
+
+    Temporal operators put the same subformula object in ``subformula_list`` many
+    times, so nested operators (e.g., ``eventually`` of an ``always``) ask for the
+    same ``(subformula, t)`` pair over and over again. With a cache, each pair is
+    only evaluated once.
+
+    A cache is only valid for a single signal ``y`` and a single robustness metric.
+    :meth:`.STLTree.robustness` creates a fresh cache for each evaluation unless
+    one is passed in explicitly, which is useful for inspecting the hit rate:
+    ::
+
+        cache = RobustnessCache()
+        rho = spec.robustness(y, 0, RobustnessMetrics.Standard, cache=cache)
+        print(cache)
+
+    The cache also holds the values of every linear predicate at every timestep,
+    computed up front from a :class:`.PredicateTable`, so that predicates only
+    need to index into this table. Vectorized :class:`.NonlinearPredicate` objects
+    store their values at every timestep in ``nonlinear_values`` the first time
+    they are evaluated.
+    """
+    def __init__(self):
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+        self.predicate_table = None
+        self.predicate_values = None
+        self.nonlinear_values = {}
+
+    def set_predicate_values(self, table, y, robustness_type):
+        """
+        Evaluate all the predicates in the given table over the whole signal,
+        so that :class:`.LinearPredicate` objects can look up their values.
+
+        :param table:           A :class:`.PredicateTable`.
+        :param y:               A ``(d,T)`` numpy array representing the signal.
+        :param robustness_type: The :class:`.RobustnessMetrics` being evaluated.
+        """
+        self.predicate_table = table
+        self.predicate_values = table.evaluate(y, robustness_type)
+
+    def clear(self):
+        """
+        Remove all stored values and reset the hit/miss counters.
+        """
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+        self.predicate_table = None
+        self.predicate_values = None
+        self.nonlinear_values = {}
+
+    @property
+    def hit_rate(self):
+        """
+        The fraction of lookups that were answered from the cache.
+        """
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+    def __str__(self):
+        return "RobustnessCache: %s hits, %s misses (%.1f%% hit rate)" % (
+                self.hits, self.misses, 100*self.hit_rate)
+
+def subformula_robustness(formula, y, t, robustness_type, cache=None):
+    """
+    Compute the robustness of each subformula of the given :class:`.STLTree`,
+    where subformula ``i`` is evaluated at timestep ``t + formula.timesteps[i]``.
+
+    :param formula:         The :class:`.STLTree` whose subformulas we evaluate.
+    :param y:               A ``(d,T)`` numpy array representing the signal.
+    :param t:               The timestep at which ``formula`` is evaluated.
+    :param robustness_type: The :class:`.RobustnessMetrics` to use.
+    :param cache:           (optional) A :class:`.RobustnessCache` shared across the
+                            whole evaluation. If ``None``, nothing is cached.
+
+    :return:    A list with the robustness of each subformula.
+    """
+    if cache is None:
+        return [subformula.robustness(y, t + t_i, robustness_type)
+                for subformula, t_i in formula.iter_subformulas()]
+
+    values = cache.values
+    out = []
+    for subformula, t_i in formula.iter_subformulas():
+        t_sub = t + t_i
+        key = (id(subformula), t_sub)
+        if key in values:
+            cache.hits += 1
+            out.append(values[key])
+        else:
+            cache.misses += 1
+            value = subformula.robustness(y, t_sub, robustness_type, cache)
+            values[key] = value
+            out.append(value)
+    return out
@@ -0,0 +1,101 @@
+from collections import deque
+import numpy as np
+
+##
+#
+# Sliding-window reductions used to evaluate bounded temporal operators
+# (always/eventually) at every start time. Each function takes a 1D array x
+# and a window length w, and returns an array of length len(x)-w+1 whose
+# entry i is the reduction of x[i:i+w].
+#
+##
+
+def sliding_min(x, w):
+    """
+    Compute the minimum over every window of length ``w`` using a monotone
+    deque (Lemire's algorithm). Each element is pushed and popped at most
+    once, so the cost is :math:`O(n)` regardless of the window length.
+
+    :param x:   A ``(n,)`` numpy array.
+    :param w:   A positive integer window length, at most ``n``.
+
+    :return:    A ``(n-w+1,)`` numpy array.
+    """
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    assert 0 < w <= n, "window length must be between 1 and len(x)"
+    values = x.tolist()
+    out = [0.0]*(n-w+1)
+    window = deque()   # indices of increasing values in the current window
+    for i in range(n):
+        while window and values[window[-1]] >= values[i]:
+            window.pop()
+        window.append(i)
+        if window[0] <= i - w:
+            window.popleft()
+        if i >= w - 1:
+            out[i-w+1] = values[window[0]]
+    return np.array(out)
+
+def sliding_max(x, w):
+    """
+    Compute the maximum over every window of length ``w`` using a monotone
+    deque (Lemire's algorithm), in :math:`O(n)` time.
+
+    :param x:   A ``(n,)`` numpy array.
+    :param w:   A positive integer window length, at most ``n``.
+
+    :return:    A ``(n-w+1,)`` numpy array.
+    """
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    assert 0 < w <= n, "window length must be between 1 and len(x)"
+    values = x.tolist()
+    out = [0.0]*(n-w+1)
+    window = deque()   # indices of decreasing values in the current window
+    for i in range(n):
+        while window and values[window[-1]] <= values[i]:
+            window.pop()
+        window.append(i)
+        if window[0] <= i - w:
+            window.popleft()
+        if i >= w - 1:
+            out[i-w+1] = values[window[0]]
+    return np.array(out)
+
+def sliding_logsumexp(x, w):
+    """
+    Compute :math:`\\log \\sum_{j=i}^{i+w-1} \\exp(x_j)` for every window of
+    length ``w`` in :math:`O(n)` time.
+
+    The signal is split into blocks of length ``w``, and running log-sum-exps
+    are accumulated forwards and backwards within each block. Every window
+    then consists of the tail of one block and the head of the next, so it
+    can be computed with a single ``logaddexp``. This stays numerically
+    stable even for large values of ``x``.
+
+    :param x:   A ``(n,)`` numpy array.
+    :param w:   A positive integer window length, at most ``n``.
+
+    :return:    A ``(n-w+1,)`` numpy array.
+    """
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    assert 0 < w <= n, "window length must be between 1 and len(x)"
+
+    n_blocks = -(-n // w)
+    padded = np.full(n_blocks*w, -np.inf)
+    padded[:n] = x
+    blocks = padded.reshape((n_blocks, w))
+
+    prefix = np.logaddexp.accumulate(blocks, axis=1).ravel()
+    suffix = np.logaddexp.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    start = np.arange(n-w+1)
+    with np.errstate(invalid='ignore'):
+        out = np.logaddexp(suffix[start], prefix[start+w-1])
+
+    # Windows that line up exactly with a block are covered by the suffix alone
+    aligned = start % w == 0
+    out[aligned] = suffix[start[aligned]]
+    return out
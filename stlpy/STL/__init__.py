@@ -1,2 +1,6 @@
-from .formula import STLTree, STLFormula
-from .predicate import LinearPredicate, NonlinearPredicate
+from .formula import STLTree, STLFormula, TemporalTree, UntilTree, all_of, any_of
+from .predicate import LinearPredicate, NonlinearPredicate, PolytopePredicate, PredicateTable
+from .compiled import CompiledSTLFormula
+from .sliding_evaluator import SlidingWindowEvaluator
+from .monitor import STLMonitor
+from .interning import FormulaInterner
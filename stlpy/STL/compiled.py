@@ -0,0 +1,606 @@
+import numpy as np
+from .formula import STLFormula
+from .predicate import LinearPredicate, NonlinearPredicate, PolytopePredicate
+from stlpy.enumerations.option import RobustnessMetrics
+
+class CompiledSTLFormula:
+    """
+    A flat, vectorized representation of an :class:`.STLFormula` that can be used
+    to evaluate the robustness measure :math:`\\rho^\\varphi(y,t)` much more quickly
+    than the recursive :meth:`.STLFormula.robustness` method.
+
+    The formula tree is lowered once into a program made up of
+
+        - a gather of predicate values from a :class:`.PredicateTable`, where all
+          :class:`.LinearPredicate` objects in the formula are stacked into a single
+          matrix :math:`A` and offset vector :math:`b`, so that :math:`Ay - b` is
+          computed for all timesteps at once, and
+        - a sequence of levels, ordered from the leaves to the root, each of which
+          applies segmented ``and``/``or`` reductions (min, max, soft-min, etc.) over
+          the values computed at lower levels. Each :class:`.PolytopePredicate` is a
+          ``min`` (or ``max``) reduction over its faces, which is the same for every
+          robustness metric.
+
+    Identical ``(subformula, timestep)`` pairs, which appear frequently when temporal
+    operators are nested, are only evaluated once.
+
+    .. note::
+
+        This class is usually created with :meth:`.STLFormula.compile`, i.e.,
+        ::
+
+            compiled_spec = spec.compile()
+            rho = compiled_spec.robustness(y, 0, RobustnessMetrics.Standard)
+
+    :param formula: The :class:`.STLFormula` to compile.
+    """
+    def __init__(self, formula):
+        assert isinstance(formula, STLFormula), "formula must be an STLFormula"
+        self.formula = formula
+        self.d = formula.d
+        self._lower(formula)
+
+    def _lower(self, formula):
+        """
+        Traverse the formula tree (without recursion) and record the program
+        needed to evaluate the robustness measure.
+        """
+        self.predicate_table = formula.get_predicate_table()
+        nonlinear_index = {}  # id(predicate) -> index into nonlinear_predicates
+        nonlinear_predicates = []
+
+        # Each (formula, relative timestep) pair is one instance in the program
+        instance_id = {}      # (id(formula), t) -> temporary instance id
+        instance_info = []    # temporary instance id -> (formula, t, children, height)
+
+        stack = [(formula, 0, False)]
+        while stack:
+            node, t, expanded = stack.pop()
+            key = (id(node), t)
+            if key in instance_id:
+                continue
+
+            if node.is_predicate() and not isinstance(node, PolytopePredicate):
+                instance_id[key] = len(instance_info)
+                instance_info.append((node, t, None, 0))
+                if isinstance(node, NonlinearPredicate):
+                    if id(node) not in nonlinear_index:
+                        nonlinear_index[id(node)] = len(nonlinear_predicates)
+                        nonlinear_predicates.append(node)
+                elif not isinstance(node, LinearPredicate):
+                    raise TypeError("Unsupported predicate type %s" % type(node))
+
+            elif not expanded:
+                # Visit all the children first, then come back to this node
+                stack.append((node, t, True))
+                for subformula, t_i in _iter_children(node):
+                    stack.append((subformula, t + t_i, False))
+
+            else:
+                children = [instance_id[(id(subformula), t + t_i)]
+                            for subformula, t_i in _iter_children(node)]
+                height = 1 + max(instance_info[c][3] for c in children)
+                instance_id[key] = len(instance_info)
+                instance_info.append((node, t, children, height))
+
+        # Assign final instance ids: linear predicate leaves first, then
+        # nonlinear predicate leaves, then everything else ordered by height.
+        def sort_key(i):
+            node, _, _, height = instance_info[i]
+            if height == 0:
+                return (0, 0 if isinstance(node, LinearPredicate) else 1)
+            return (height, 0)
+        order = sorted(range(len(instance_info)), key=sort_key)
+        new_id = np.empty(len(order), dtype=int)
+        new_id[order] = np.arange(len(order))
+
+        # Predicate table
+        self.linear_predicates = self.predicate_table.predicates
+        self.nonlinear_predicates = nonlinear_predicates
+        self.A = self.predicate_table.A
+        self.b = self.predicate_table.b
+
+        # Leaves, which gather values from the predicate table
+        linear_leaves = [i for i in order if instance_info[i][3] == 0
+                         and isinstance(instance_info[i][0], LinearPredicate)]
+        nonlinear_leaves = [i for i in order if instance_info[i][3] == 0
+                            and isinstance(instance_info[i][0], NonlinearPredicate)]
+        self.linear_leaf_rows = np.array([self.predicate_table.row(instance_info[i][0])
+                                          for i in linear_leaves], dtype=int)
+        self.linear_leaf_times = np.array([instance_info[i][1] for i in linear_leaves], dtype=int)
+        self.nonlinear_leaf_rows = np.array([nonlinear_index[id(instance_info[i][0])]
+                                             for i in nonlinear_leaves], dtype=int)
+        self.nonlinear_leaf_times = np.array([instance_info[i][1] for i in nonlinear_leaves], dtype=int)
+        self.n_leaves = len(linear_leaves) + len(nonlinear_leaves)
+
+        # Levels of segmented reductions, from the leaves up to the root
+        buckets = {}  # (height, combination type) -> instances
+        for i in order:
+            node, _, _, height = instance_info[i]
+            if height > 0:
+                buckets.setdefault((height, _level_type(node)), []).append(i)
+
+        self.levels = []
+        heights = sorted(set(h for h, _ in buckets))
+        for h in heights:
+            level = []
+            for combination_type in ("and", "or", "min", "max"):
+                members = buckets.get((h, combination_type), [])
+                if len(members) == 0:
+                    continue
+                counts = np.array([len(instance_info[i][2]) for i in members], dtype=int)
+                starts = np.zeros(len(members), dtype=int)
+                starts[1:] = np.cumsum(counts)[:-1]
+                children = new_id[np.hstack([instance_info[i][2] for i in members])]
+                out = new_id[np.array(members, dtype=int)]
+                level.append((combination_type, out, children, starts, counts))
+            self.levels.append(level)
+
+        self.n_instances = len(order)
+        self.instance_times = np.array([instance_info[i][1] for i in order], dtype=int)
+        self.root = new_id[instance_id[(id(formula), 0)]]
+        self.horizon = max(info[1] for info in instance_info)
+
+    def predicate_values(self, y, robustness_type):
+        """
+        Compute the (scaled) values :math:`(Ay-b)/10` of all linear predicates
+        in this formula at every timestep at once.
+
+        :param y:                   A ``(d,T)`` numpy array representing the signal,
+                                    or a ``(N,d,T)`` numpy array representing a batch
+                                    of ``N`` signals.
+        :param robustness_type:     The :class:`.RobustnessMetrics` being evaluated.
+
+        :return:    A ``(P,T)`` (or ``(P,N,T)``) numpy array, where ``P`` is the number
+                    of unique linear predicates in the formula.
+        """
+        return self.predicate_table.evaluate(y, robustness_type)
+
+    def robustness(self, y, t, robustness_type):
+        """
+        Compute the robustness measure :math:`\\rho^\\varphi(y,t)` of the compiled
+        formula. This gives the same result as :meth:`.STLFormula.robustness`.
+
+        :param y:                   A ``(d,T)`` numpy array representing the signal
+                                    to evaluate, where ``d`` is the dimension of
+                                    the signal and ``T`` is the number of timesteps
+        :param t:                   The timestep :math:`t` to evaluate the signal at. This
+                                    is typically 0 for the full formula.
+        :param robustness_type:     The :class:`.RobustnessMetrics` to use.
+
+        :return:    A ``(1,)`` numpy array containing the robustness measure
+                    :math:`\\rho^\\varphi(y,t)`.
+        """
+        assert isinstance(y, np.ndarray), "y must be a numpy array"
+        assert y.ndim == 2 and y.shape[0] == self.d, "y must be of shape (d,T)"
+        return self.robustness_batch(y[np.newaxis], t, robustness_type)
+
+    def robustness_batch(self, Y, t, robustness_type):
+        """
+        Compute the robustness measure :math:`\\rho^\\varphi(y,t)` of the compiled
+        formula for a whole batch of signals at once.
+
+        Predicate values for every signal in the batch are computed together,
+        and each ``and``/``or`` reduction is applied to the whole batch, so this
+        is much faster than evaluating each signal separately.
+
+        :param Y:                   A ``(N,d,T)`` numpy array representing ``N`` signals,
+                                    each of dimension ``d`` with ``T`` timesteps.
+        :param t:                   The timestep :math:`t` to evaluate the signals at.
+        :param robustness_type:     The :class:`.RobustnessMetrics` to use.
+
+        :return:    A ``(N,)`` numpy array containing the robustness measure of each signal.
+        """
+        assert isinstance(Y, np.ndarray), "Y must be a numpy array"
+        assert Y.ndim == 3 and Y.shape[1] == self.d, "Y must be of shape (N,d,T)"
+        values = self._leaf_values(Y, t, robustness_type)
+        return self.evaluate_levels(values, robustness_type)
+
+    def robustness_gradient(self, y, t, robustness_type):
+        """
+        Compute the robustness measure :math:`\\rho^\\varphi(y,t)` and its gradient
+        with respect to the signal :math:`y`, using reverse-mode differentiation
+        through the compiled formula.
+
+        For non-smooth measures like ``Standard``, this is a subgradient: the
+        gradient of a min/max is split evenly between the subformulas that
+        attain it. Gradients of :class:`.NonlinearPredicate` functions are
+        computed with :meth:`.NonlinearPredicate.gradient`.
+
+        :param y:                   A ``(d,T)`` numpy array representing the signal.
+        :param t:                   The timestep :math:`t` to evaluate the signal at.
+        :param robustness_type:     The :class:`.RobustnessMetrics` to use.
+
+        :return rho:    A ``(1,)`` numpy array containing :math:`\\rho^\\varphi(y,t)`.
+        :return grad:   A ``(d,T)`` numpy array containing :math:`\\nabla_y \\rho^\\varphi(y,t)`.
+        """
+        assert isinstance(y, np.ndarray), "y must be a numpy array"
+        assert y.ndim == 2 and y.shape[0] == self.d, "y must be of shape (d,T)"
+        values = self._leaf_values(y[np.newaxis], t, robustness_type)
+        rho = self.evaluate_levels(values, robustness_type)
+
+        # Propagate the adjoint from the root down to the leaves
+        adjoint = np.zeros_like(values)
+        adjoint[self.root] = 1.0
+        for level in reversed(self.levels):
+            for combination_type, out, children, starts, counts in level:
+                partials = _level_gradient(combination_type, robustness_type)
+                local = partials(values[children], starts, counts, values[out])
+                np.add.at(adjoint, children, local * _broadcast(adjoint[out], counts))
+
+        # Chain rule through the predicates
+        grad = np.zeros(y.shape)
+        n_linear = len(self.linear_leaf_rows)
+        if n_linear > 0:
+            np.add.at(grad.T, self.linear_leaf_times + t,
+                      adjoint[:n_linear] * self.A[self.linear_leaf_rows] / 10)
+        for k in range(len(self.nonlinear_leaf_rows)):
+            if adjoint[n_linear + k, 0] == 0:
+                continue
+            predicate = self.nonlinear_predicates[self.nonlinear_leaf_rows[k]]
+            tk = int(self.nonlinear_leaf_times[k]) + t
+            grad[:, tk] += adjoint[n_linear + k, 0] * predicate.gradient(y[:, tk]) / 10
+
+        return rho, grad
+
+    def _leaf_values(self, Y, t, robustness_type):
+        """
+        Allocate the buffer of values for every instance in the program and
+        fill in the values of the predicate leaves for the batch of signals Y.
+        """
+        assert isinstance(t, int), "timestep t must be an integer"
+        assert Y.shape[2] > t + self.horizon, "requested timestep %s, but y only has %s timesteps" % (t + self.horizon, Y.shape[2])
+        if robustness_type == RobustnessMetrics.TimeRobustness:
+            raise NotImplementedError("Time robustness is not supported at this time")
+
+        N = Y.shape[0]
+        values = np.empty((self.n_instances, N))
+
+        # Gather predicate values
+        n_linear = len(self.linear_leaf_rows)
+        if n_linear > 0:
+            table = self.predicate_values(Y, robustness_type)
+            values[:n_linear] = table[self.linear_leaf_rows, :, self.linear_leaf_times + t]
+        for q, predicate in enumerate(self.nonlinear_predicates):
+            # All the timesteps this predicate is used at, for all signals at once
+            leaves = np.flatnonzero(self.nonlinear_leaf_rows == q)
+            times = self.nonlinear_leaf_times[leaves] + t
+            values[n_linear + leaves] = predicate.evaluate(Y[:, :, times], robustness_type).T
+
+        return values
+
+    def evaluate_levels(self, values, robustness_type):
+        """
+        Apply the ``and``/``or`` reductions of the compiled formula, one level at
+        a time, to the given predicate values.
+
+        This is the second half of :meth:`robustness_batch`, and is useful when
+        predicate values come from somewhere other than a full signal, e.g., the
+        partial signal seen so far by an :class:`.STLMonitor`.
+
+        :param values:              A ``(n_instances,N)`` numpy array whose first
+                                    ``n_leaves`` rows hold the values of the predicate
+                                    leaves, in the order given by ``linear_leaf_rows``
+                                    and ``nonlinear_leaf_rows``. The remaining rows
+                                    are overwritten.
+        :param robustness_type:     The :class:`.RobustnessMetrics` to use.
+
+        :return:    A ``(N,)`` numpy array containing the robustness measure.
+        """
+        for level in self.levels:
+            for combination_type, out, children, starts, counts in level:
+                reduction = _level_reduction(combination_type, robustness_type)
+                values[out] = reduction(values[children], starts, counts)
+
+        return values[self.root].copy()
+
+def _iter_children(node):
+    """
+    The (subformula, timestep) pairs that a node of the program reduces over.
+    """
+    if isinstance(node, PolytopePredicate):
+        return [(face, 0) for face in node.faces]
+    return node.iter_subformulas()
+
+def _level_type(node):
+    """
+    The kind of reduction a node of the program applies: "and"/"or" for formulas,
+    and "min"/"max" for polytopes, which use the standard reductions for every metric.
+    """
+    if isinstance(node, PolytopePredicate):
+        return "min" if node.inside else "max"
+    return node.combination_type
+
+def _level_reduction(combination_type, robustness_type):
+    if combination_type == "and":
+        return AND_REDUCTIONS[robustness_type]
+    elif combination_type == "or":
+        return OR_REDUCTIONS[robustness_type]
+    elif combination_type == "min":
+        return AND_REDUCTIONS[RobustnessMetrics.Standard]
+    return OR_REDUCTIONS[RobustnessMetrics.Standard]
+
+def _level_gradient(combination_type, robustness_type):
+    if combination_type == "and":
+        return AND_GRADIENTS[robustness_type]
+    elif combination_type == "or":
+        return OR_GRADIENTS[robustness_type]
+    elif combination_type == "min":
+        return AND_GRADIENTS[RobustnessMetrics.Standard]
+    return OR_GRADIENTS[RobustnessMetrics.Standard]
+
+##
+#
+# Segmented reductions for each robustness metric. Each function takes a
+# vector x of values, which is split into segments that start at the
+# indices given by 'starts' and have lengths 'counts', and returns the
+# reduction of each segment. These mirror the definitions in
+# RobustnessMeasure_and and RobustnessMeasure_or.
+#
+##
+
+def _segment_min(x, starts):
+    return np.minimum.reduceat(x, starts, axis=0)
+
+def _segment_max(x, starts):
+    return np.maximum.reduceat(x, starts, axis=0)
+
+def _segment_sum(x, starts):
+    return np.add.reduceat(x, starts, axis=0)
+
+def _segment_prod(x, starts):
+    return np.multiply.reduceat(x, starts, axis=0)
+
+def _segment_any(mask, starts):
+    return np.logical_or.reduceat(mask, starts, axis=0)
+
+def _broadcast(segment_values, counts):
+    """Repeat each segment value so that it lines up with the entries of x."""
+    return np.repeat(segment_values, counts, axis=0)
+
+def _as_column(counts, x):
+    """Reshape the segment counts so they broadcast against reduced values of x."""
+    return counts.reshape((-1,) + (1,)*(x.ndim-1)).astype(float)
+
+def _standard_and(x, starts, counts):
+    return _segment_min(x, starts)
+
+def _standard_or(x, starts, counts):
+    return _segment_max(x, starts)
+
+def _agm_and(x, starts, counts):
+    n = _as_column(counts, x)
+    any_nonpositive = _segment_any(x <= 0, starts)
+    negative = _segment_sum(np.where(x <= 0, x, 0.0), starts) / n
+    with np.errstate(invalid='ignore', divide='ignore'):
+        positive = _segment_prod(x + 1, starts)**(1 / n) - 1
+    return np.where(any_nonpositive, negative, positive)
+
+def _agm_or(x, starts, counts):
+    n = _as_column(counts, x)
+    any_positive = _segment_any(x > 0, starts)
+    positive = _segment_sum(np.where(x > 0, x, 0.0), starts) / n
+    with np.errstate(invalid='ignore', divide='ignore'):
+        negative = -_segment_prod(1 - x, starts)**(1 / n) + 1
+    return np.where(any_positive, positive, negative)
+
+def _lse_and(x, starts, counts, k=5):
+    m = _segment_min(x, starts)
+    return m - (1 / k) * np.log(_segment_sum(np.exp(-k * (x - _broadcast(m, counts))), starts))
+
+def _lse_or(x, starts, counts, k=5):
+    m = _segment_max(x, starts)
+    return m + (1 / k) * np.log(_segment_sum(np.exp(k * (x - _broadcast(m, counts))), starts))
+
+def _smooth_and(x, starts, counts, k1=5):
+    return _lse_and(x, starts, counts, k1)
+
+def _smooth_or(x, starts, counts, k2=5):
+    m = _segment_max(x, starts)
+    exp = np.exp(k2 * (x - _broadcast(m, counts)))
+    return _segment_sum(x * exp, starts) / _segment_sum(exp, starts)
+
+def _wstl_standard_and(x, starts, counts):
+    w = _broadcast(1 / _as_column(counts, x), counts)
+    return _segment_min(((0.5 - w) * np.sign(x) + 0.5) * x, starts)
+
+def _wstl_standard_or(x, starts, counts):
+    w = _broadcast(1 / _as_column(counts, x), counts)
+    return _segment_max((-(0.5 - w) * np.sign(x) + 0.5) * x, starts)
+
+def _wstl_agm_and(x, starts, counts):
+    w = 1 / _as_column(counts, x)
+    any_negative = _segment_any(x < 0, starts)
+    negative = _segment_sum(np.where(x <= 0, x, 0.0), starts) * w
+    with np.errstate(invalid='ignore', divide='ignore'):
+        positive = _segment_prod((1 + x)**_broadcast(w, counts), starts) - 1
+    return np.where(any_negative, negative, positive)
+
+def _wstl_agm_or(x, starts, counts):
+    w = 1 / _as_column(counts, x)
+    any_positive = _segment_any(x > 0, starts)
+    positive = _segment_sum(np.where(x > 0, x, 0.0), starts) * w
+    with np.errstate(invalid='ignore', divide='ignore'):
+        negative = -_segment_prod((1 - x)**_broadcast(w, counts), starts) + 1
+    return np.where(any_positive, positive, negative)
+
+def _new_robustness(x, starts, counts, rho, tilde, v=10):
+    """
+    Shared part of the and/or definitions of NewRobustness, given the
+    extreme value rho (min for 'and', max for 'or') of each segment and
+    the normalized measures tilde.
+    """
+    rho_x = _broadcast(rho, counts)
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        # rho < 0: weighted average of the effective measures rho*exp(tilde)
+        weights = np.exp(v * (tilde - _broadcast(_segment_max(tilde, starts), counts)))
+        negative = _segment_sum(rho_x * np.exp(tilde) * weights, starts) / _segment_sum(weights, starts)
+
+        # rho > 0: weighted average of the measures themselves
+        weights = np.exp(-v * (tilde - _broadcast(_segment_min(tilde, starts), counts)))
+        positive = _segment_sum(x * weights, starts) / _segment_sum(weights, starts)
+
+    return np.where(rho < 0, negative, np.where(rho > 0, positive, 0.0))
+
+def _new_robustness_and(x, starts, counts):
+    rho_min = _segment_min(x, starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tilde = (x - _broadcast(rho_min, counts)) / _broadcast(rho_min, counts)
+    return _new_robustness(x, starts, counts, rho_min, tilde)
+
+def _new_robustness_or(x, starts, counts):
+    rho_max = _segment_max(x, starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tilde = (_broadcast(rho_max, counts) - x) / _broadcast(rho_max, counts)
+    return _new_robustness(x, starts, counts, rho_max, tilde)
+
+AND_REDUCTIONS = {
+    RobustnessMetrics.Standard: _standard_and,
+    RobustnessMetrics.AGM: _agm_and,
+    RobustnessMetrics.LSE: _lse_and,
+    RobustnessMetrics.Smooth: _smooth_and,
+    RobustnessMetrics.wSTL_Standard: _wstl_standard_and,
+    RobustnessMetrics.wSTL_AGM: _wstl_agm_and,
+    RobustnessMetrics.NewRobustness: _new_robustness_and,
+}
+
+OR_REDUCTIONS = {
+    RobustnessMetrics.Standard: _standard_or,
+    RobustnessMetrics.AGM: _agm_or,
+    RobustnessMetrics.LSE: _lse_or,
+    RobustnessMetrics.Smooth: _smooth_or,
+    RobustnessMetrics.wSTL_Standard: _wstl_standard_or,
+    RobustnessMetrics.wSTL_AGM: _wstl_agm_or,
+    RobustnessMetrics.NewRobustness: _new_robustness_or,
+}
+
+##
+#
+# Partial derivatives of the segmented reductions above. Each function takes
+# the same (x, starts, counts) as the reduction together with the reduced
+# values p, and returns an array the same shape as x holding the derivative
+# of each segment's value with respect to each of its entries.
+#
+##
+
+def _argmin_weights(x, starts, counts, p):
+    """One-hot (sub)gradient of a min/max, split evenly among ties."""
+    mask = (x == _broadcast(p, counts)).astype(float)
+    return mask / _broadcast(_segment_sum(mask, starts), counts)
+
+def _standard_and_grad(x, starts, counts, p):
+    return _argmin_weights(x, starts, counts, p)
+
+def _standard_or_grad(x, starts, counts, p):
+    return _argmin_weights(x, starts, counts, p)
+
+def _agm_and_grad(x, starts, counts, p):
+    n = _as_column(counts, x)
+    any_nonpositive = _broadcast(_segment_any(x <= 0, starts), counts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        positive = _broadcast((p + 1) / n, counts) / (1 + x)
+    negative = (x <= 0) / _broadcast(n, counts)
+    return np.where(any_nonpositive, negative, positive)
+
+def _agm_or_grad(x, starts, counts, p):
+    n = _as_column(counts, x)
+    any_positive = _broadcast(_segment_any(x > 0, starts), counts)
+    positive = (x > 0) / _broadcast(n, counts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        negative = _broadcast((1 - p) / n, counts) / (1 - x)
+    return np.where(any_positive, positive, negative)
+
+def _softmax_weights(x, starts, counts, k):
+    """Weights exp(k x_i) / sum_j exp(k x_j) within each segment."""
+    m = _segment_max(k * x, starts)
+    exp = np.exp(k * x - _broadcast(m, counts))
+    return exp / _broadcast(_segment_sum(exp, starts), counts)
+
+def _lse_and_grad(x, starts, counts, p, k=5):
+    return _softmax_weights(x, starts, counts, -k)
+
+def _lse_or_grad(x, starts, counts, p, k=5):
+    return _softmax_weights(x, starts, counts, k)
+
+def _smooth_and_grad(x, starts, counts, p, k1=5):
+    return _lse_and_grad(x, starts, counts, p, k1)
+
+def _smooth_or_grad(x, starts, counts, p, k2=5):
+    w = _softmax_weights(x, starts, counts, k2)
+    return w * (1 + k2 * (x - _broadcast(p, counts)))
+
+def _wstl_standard_and_grad(x, starts, counts, p):
+    w = _broadcast(1 / _as_column(counts, x), counts)
+    slope = (0.5 - w) * np.sign(x) + 0.5
+    return _argmin_weights(slope * x, starts, counts, p) * slope
+
+def _wstl_standard_or_grad(x, starts, counts, p):
+    w = _broadcast(1 / _as_column(counts, x), counts)
+    slope = -(0.5 - w) * np.sign(x) + 0.5
+    return _argmin_weights(slope * x, starts, counts, p) * slope
+
+def _wstl_agm_and_grad(x, starts, counts, p):
+    w = 1 / _as_column(counts, x)
+    any_negative = _broadcast(_segment_any(x < 0, starts), counts)
+    negative = (x <= 0) * _broadcast(w, counts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        positive = _broadcast(w * (p + 1), counts) / (1 + x)
+    return np.where(any_negative, negative, positive)
+
+def _wstl_agm_or_grad(x, starts, counts, p):
+    w = 1 / _as_column(counts, x)
+    any_positive = _broadcast(_segment_any(x > 0, starts), counts)
+    positive = (x > 0) * _broadcast(w, counts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        negative = _broadcast(w * (1 - p), counts) / (1 - x)
+    return np.where(any_positive, positive, negative)
+
+def _new_robustness_grad(x, starts, counts, p, rho, sign, v=10):
+    """
+    Shared part of the derivatives of NewRobustness, where the normalized
+    measures are tilde_i = sign*(x_i/rho - 1) and rho is the segment min
+    (sign=1, 'and') or max (sign=-1, 'or').
+    """
+    rho_x = _broadcast(rho, counts)
+    g = _argmin_weights(x, starts, counts, rho)  # d rho / d x
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        tilde = sign * (x / rho_x - 1)
+
+        # rho < 0: p = rho*F with F = sum(exp((1+v) tilde)) / sum(exp(v tilde))
+        weights = _softmax_weights(tilde, starts, counts, v)
+        F = _broadcast(p / rho, counts)
+        dF = weights * ((1 + v) * np.exp(tilde) - v * F)
+        negative = sign * dF + g * (F - sign / rho_x * _broadcast(_segment_sum(dF * x, starts), counts))
+
+        # rho > 0: p = sum(x r) with r = exp(-v tilde) / sum(exp(-v tilde))
+        r = _softmax_weights(tilde, starts, counts, -v)
+        dp = -v * r * (x - _broadcast(p, counts))
+        positive = r + sign / rho_x * dp - g * sign / rho_x**2 * _broadcast(_segment_sum(dp * x, starts), counts)
+
+    return np.where(rho_x < 0, negative, np.where(rho_x > 0, positive, 0.0))
+
+def _new_robustness_and_grad(x, starts, counts, p):
+    return _new_robustness_grad(x, starts, counts, p, _segment_min(x, starts), 1)
+
+def _new_robustness_or_grad(x, starts, counts, p):
+    return _new_robustness_grad(x, starts, counts, p, _segment_max(x, starts), -1)
+
+AND_GRADIENTS = {
+    RobustnessMetrics.Standard: _standard_and_grad,
+    RobustnessMetrics.AGM: _agm_and_grad,
+    RobustnessMetrics.LSE: _lse_and_grad,
+    RobustnessMetrics.Smooth: _smooth_and_grad,
+    RobustnessMetrics.wSTL_Standard: _wstl_standard_and_grad,
+    RobustnessMetrics.wSTL_AGM: _wstl_agm_and_grad,
+    RobustnessMetrics.NewRobustness: _new_robustness_and_grad,
+}
+
+OR_GRADIENTS = {
+    RobustnessMetrics.Standard: _standard_or_grad,
+    RobustnessMetrics.AGM: _agm_or_grad,
+    RobustnessMetrics.LSE: _lse_or_grad,
+    RobustnessMetrics.Smooth: _smooth_or_grad,
+    RobustnessMetrics.wSTL_Standard: _wstl_standard_or_grad,
+    RobustnessMetrics.wSTL_AGM: _wstl_agm_or_grad,
+    RobustnessMetrics.NewRobustness: _new_robustness_or_grad,
+}
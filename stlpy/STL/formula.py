@@ -1,10 +1,12 @@
 import numpy as np
+import hashlib
 from abc import ABC, abstractmethod
 from treelib import Tree
 import math
 from stlpy.enumerations.option import RobustnessMetrics
 from stlpy.RobustnessMeasure.RobustnessMeasureAnd import RobustnessMeasure_and
 from stlpy.RobustnessMeasure.RobustnessMeasureOr import RobustnessMeasure_or
+from stlpy.RobustnessMeasure.cache import RobustnessCache
 class STLFormula(ABC):
     """
     An abstract class which encompasses represents all kinds of STL formulas :math:`\\varphi`, including
@@ -12,7 +14,7 @@ class STLFormula(ABC):
     predicates and other formulas).
     """
     @abstractmethod
-    def robustness(self, y, t, robustness_type):
+    def robustness(self, y, t, robustness_type, cache=None):
         """
         Compute the robustness measure :math:`\\rho^\\varphi(y,t)` of this formula for the
         given signal :math:`y = y_0,y_1,\\dots,y_T`, evaluated at timestep :math:`t`.
@@ -22,6 +24,10 @@ class STLFormula(ABC):
                      the signal and ``T`` is the number of timesteps
         :param t:    The timestep :math:`t` to evaluate the signal at. This
                      is typically 0 for the full formula.
+        :param robustness_type: The :class:`.RobustnessMetrics` to use.
+        :param cache:   (optional) A :class:`.RobustnessCache` used to avoid re-evaluating
+                        identical ``(subformula, timestep)`` pairs. A new cache is
+                        created for each evaluation if none is given.
 
         :return:    The robustness measure :math:`\\rho^\\varphi(y,t)` which is positive only
                     if the signal satisfies the specification.
@@ -178,7 +184,7 @@ class STLFormula(ABC):
 
     def always(self, t1, t2):
         """
-        Return a new :class:`.STLTree` :math:`\\varphi_{new}` which ensures that this
+        Return a new :class:`.TemporalTree` :math:`\\varphi_{new}` which ensures that this
         formula (:math:`\\varphi`) holds for all of the timesteps between
         :math:`t_1` and :math:`t_2`:
 
@@ -190,18 +196,16 @@ class STLFormula(ABC):
         :param t1:  An integer representing the delay :math:`t_1`
         :param t2:  An integer representing the deadline :math:`t_2`
 
-        :return: An :class:`.STLTree` representing :math:`\\varphi_{new}`
+        :return: A :class:`.TemporalTree` representing :math:`\\varphi_{new}`
         """
-        time_interval = [t for t in range(t1,t2+1)]
-        subformula_list = [self for t in time_interval]
-        formula = STLTree(subformula_list, "and", time_interval)
+        formula = TemporalTree(self, "and", t1, t2)
         if self.name is not None:
             formula.name = "always [%s,%s] %s" % (t1,t2,self.name)
         return formula
 
     def eventually(self, t1, t2):
         """
-        Return a new :class:`.STLTree` :math:`\\varphi_{new}` which ensures that this
+        Return a new :class:`.TemporalTree` :math:`\\varphi_{new}` which ensures that this
         formula (:math:`\\varphi`) holds for at least one timestep between
         :math:`t_1` and :math:`t_2`:
 
@@ -213,16 +217,14 @@ class STLFormula(ABC):
         :param t1:  An integer representing the delay :math:`t_1`
         :param t2:  An integer representing the deadline :math:`t_2`
 
-        :return: An :class:`.STLTree` representing :math:`\\varphi_{new}`
+        :return: A :class:`.TemporalTree` representing :math:`\\varphi_{new}`
         """
-        time_interval = [t for t in range(t1,t2+1)]
-        subformula_list = [self for t in time_interval]
-        formula = STLTree(subformula_list, "or", time_interval)
+        formula = TemporalTree(self, "or", t1, t2)
         if self.name is not None:
             formula.name = "eventually [%s,%s] %s" % (t1,t2,self.name)
         return formula
 
-    def until(self, other, t1, t2):
+    def until(self, other, t1, t2, linear=False):
         """
         Return a new :class:`.STLTree` :math:`\\varphi_{new}` which ensures that the
         given formula :math:`\\varphi_{other}` holds for at least one timestep between
@@ -233,12 +235,23 @@ class STLFormula(ABC):
 
             \\varphi_{new} = \\varphi U_{[t_1,t_2]}(\\varphi_{other})
 
+        By default, this is a disjunction over every candidate switching time, which
+        grows quadratically with the length of the interval. With ``linear=True``, an
+        :class:`.UntilTree` is returned instead, which grows linearly. Both give the
+        same ``Standard`` robustness, but other robustness metrics generally differ,
+        since they are applied to differently nested subformulas.
+
         :param other:   A :class:`.STLFormula` representing :math:`\\varphi_{other`
         :param t1:  An integer representing the delay :math:`t_1`
         :param t2:  An integer representing the deadline :math:`t_2`
+        :param linear:  (optional) Boolean flag for returning an :class:`.UntilTree`.
+                        Default is ``False``.
 
         :return: An :class:`.STLTree` representing :math:`\\varphi_{new}`
         """
+        if linear:
+            return UntilTree(self, other, t1, t2)
+
         # For every candidate swiching time (t_prime), construct a subformula
         # representing 'self' holding until t_prime, at which point 'other' holds.
         self_until_tprime = []
@@ -257,24 +270,206 @@ class STLFormula(ABC):
         Return a list of all of the (unique) conjunctive state
         formulas that make up this specification.
 
+        Formulas are considered the same if they are structurally identical
+        (see :meth:`structurally_equal`), even if they are different objects.
+
         :return:    A list of STLFormula objects
         """
-        CSFs = []
-        if self.is_conjunctive_state_formula():
-            CSFs.append(self)
-        else:
-            for subformula in self.subformula_list:
-                new_csf_list = subformula.get_all_conjunctive_state_formulas()
+        # Decide which nodes are conjunctive state formulas bottom-up, so that
+        # each node is only looked at once
+        is_csf = {}
+        stack = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in is_csf:
+                continue
+            if node.is_predicate():
+                is_csf[id(node)] = node.is_conjunctive_state_formula()
+            elif not expanded:
+                stack.append((node, True))
+                stack.extend((s, False) for s in node.unique_subformulas())
+            else:
+                is_csf[id(node)] = node.combination_type == "and" and node._is_boolean() and \
+                        all(is_csf[id(s)] for s in node.unique_subformulas())
+
+        # Collect the outermost conjunctive state formulas in depth-first order,
+        # keeping only the first of each group of identical formulas
+        CSFs = {}
+        visited = set()
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if id(node) in visited:
+                continue
+            visited.add(id(node))
+            if is_csf[id(node)]:
+                CSFs.setdefault(node.fingerprint(), node)
+            elif not node.is_predicate():
+                stack.extend(reversed(node.unique_subformulas()))
+
+        return list(CSFs.values())
+
+    def fingerprint(self):
+        """
+        Return a fingerprint of the structure of this formula, which can be used
+        as a cache key. Two formulas have the same fingerprint exactly when they are
+        made of the same predicates (same :math:`a` and :math:`b`) combined with the
+        same operations and timesteps, regardless of whether they share any objects.
+        Names are ignored.
+
+        The fingerprint of a formula over :class:`.LinearPredicate` objects only
+        depends on its structure, so it is the same across python sessions.
+        :class:`.NonlinearPredicate` objects are identified by their function ``g``,
+        so formulas that contain them are only comparable within a single session.
+
+        .. note::
+
+            The fingerprint is computed once and then stored. :meth:`.STLTree.simplify`
+            updates it, but if you modify a formula in some other way, call
+            :meth:`clear_cache` afterwards.
 
-                # TODO: Deal with special case where there is only one formula in the
-                # conjunction list: this comes up when the UNTIL operator is used
+        :return:    A string with the hex digest of the SHA-1 hash of this formula.
+        """
+        fingerprint = getattr(self, "_fingerprint", None)
+        if fingerprint is None:
+            fingerprint = hashlib.sha1(self._structure_bytes()).hexdigest()
+            self._fingerprint = fingerprint
+        return fingerprint
 
-                # Only add those formulas that we don't already have to the list
-                for csf in new_csf_list:
-                    if not csf in CSFs:
-                        CSFs.append(csf)
+    def clear_cache(self):
+        """
+        Forget the stored fingerprints (see :meth:`fingerprint`) and predicate
+        tables (see :meth:`get_predicate_table`) of this formula and all of its
+        subformulas, so that they are rebuilt the next time they are needed.
+        """
+        visited = set()
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if id(node) in visited:
+                continue
+            visited.add(id(node))
+            node._fingerprint = None
+            node._predicate_table = None
+            if not node.is_predicate():
+                stack.extend(node.unique_subformulas())
 
-        return CSFs
+    @abstractmethod
+    def _structure_bytes(self):
+        """
+        Return a canonical byte string describing the structure of this formula,
+        which is hashed by :meth:`fingerprint`.
+        """
+        pass
+
+    def structurally_equal(self, other):
+        """
+        Check whether this formula is structurally identical to another one, i.e.,
+        whether they have the same :meth:`fingerprint`, even if they don't share any
+        objects. Note that ``==`` compares formulas by identity.
+
+        :param other:   An :class:`.STLFormula` to compare to.
+
+        :return:    A boolean which is ``True`` if the formulas are structurally identical.
+        """
+        assert isinstance(other, STLFormula), "can only compare a formula to another STLFormula"
+        return self is other or self.fingerprint() == other.fingerprint()
+
+    def intern(self, interner=None):
+        """
+        Return a copy of this formula in which all identical subformulas (see
+        :meth:`fingerprint`) are a single shared object. Solvers and evaluators
+        treat each object as one node, so this reduces the size of their problems
+        for specifications that repeat the same subformulas, e.g., the same
+        rectangle built twice with :func:`.inside_rectangle_formula`.
+
+        :param interner:    (optional) A :class:`.FormulaInterner` to use. Passing the
+                            same interner to several formulas makes them share
+                            their identical subformulas too.
+
+        :return:    An equivalent :class:`.STLFormula`.
+        """
+        from .interning import FormulaInterner
+        if interner is None:
+            interner = FormulaInterner()
+        return interner.intern(self)
+
+    def compile(self):
+        """
+        Lower this formula into a :class:`.CompiledSTLFormula`, a flat program
+        of vectorized numpy operations that evaluates the robustness measure
+        much faster than the recursive :meth:`robustness` method.
+
+        This is useful when the robustness measure of the same formula must be
+        evaluated many times, e.g., as the cost function of an optimizer.
+
+        :return:    A :class:`.CompiledSTLFormula` representing this formula.
+        """
+        from .compiled import CompiledSTLFormula
+        return CompiledSTLFormula(self)
+
+    def get_predicate_table(self):
+        """
+        Collect all the unique linear predicates in this formula into a
+        :class:`.PredicateTable`, which computes the values of every predicate
+        at every timestep with a single pass over the signal.
+
+        The table is built once and then stored, like the :meth:`fingerprint`. If
+        you modify the formula, call :meth:`clear_cache` afterwards.
+
+        :return:    A :class:`.PredicateTable` for this formula.
+        """
+        table = getattr(self, "_predicate_table", None)
+        if table is None:
+            from .predicate import PredicateTable
+            table = PredicateTable(self)
+            self._predicate_table = table
+        return table
+
+    def robustness_batch(self, Y, t, robustness_type):
+        """
+        Compute the robustness measure :math:`\\rho^\\varphi(y,t)` of this formula
+        for each signal in a batch :math:`y^{(1)},y^{(2)},\\dots,y^{(N)}`, evaluated at
+        timestep :math:`t`.
+
+        All signals are evaluated together using a :class:`.CompiledSTLFormula`.
+        If you need to score several batches against the same formula, call
+        :meth:`compile` once and use :meth:`.CompiledSTLFormula.robustness_batch`
+        directly.
+
+        :param Y:                   A ``(N,d,T)`` numpy array representing ``N`` signals,
+                                    each of dimension ``d`` with ``T`` timesteps.
+        :param t:                   The timestep :math:`t` to evaluate the signals at.
+        :param robustness_type:     The :class:`.RobustnessMetrics` to use.
+
+        :return:    A ``(N,)`` numpy array containing the robustness measure of each signal.
+        """
+        return self.compile().robustness_batch(Y, t, robustness_type)
+
+    def robustness_signal(self, y, robustness_type, subformulas=False):
+        """
+        Compute the robustness measure :math:`\\rho^\\varphi(y,t)` of this formula at
+        every timestep :math:`t=0,1,\\dots,T-1` at once, rather than calling
+        :meth:`robustness` for each :math:`t`. Entries for which the signal is too
+        short to evaluate the formula are ``nan``.
+
+        The formula is evaluated bottom-up over arrays of values in time by a
+        :class:`.SlidingWindowEvaluator`, so for the standard robustness measure each
+        node costs :math:`O(T)`. To compute the signals of many trajectories for the
+        same formula, create a :class:`.SlidingWindowEvaluator` once and use
+        :meth:`.SlidingWindowEvaluator.robustness_signal` directly.
+
+        :param y:                   A ``(d,T)`` numpy array representing the signal.
+        :param robustness_type:     The :class:`.RobustnessMetrics` to use.
+        :param subformulas:         (optional) Boolean flag for also returning the robustness
+                                    signal of each named subformula. Default is ``False``.
+
+        :return rho:        A ``(T,)`` numpy array whose entry ``t`` is :math:`\\rho^\\varphi(y,t)`.
+        :return named:      (only if ``subformulas`` is ``True``) A dictionary mapping the
+                            name of each named subformula to its ``(T,)`` robustness signal.
+        """
+        from .sliding_evaluator import SlidingWindowEvaluator
+        return SlidingWindowEvaluator(self).robustness_signal(y, robustness_type, subformulas)
 
 class STLTree(STLFormula):
     """
@@ -324,21 +519,26 @@ class STLTree(STLFormula):
                                 to combine the child nodes. Must be either ``"and"`` or ``"or"``.
     :param timesteps:           A list of timesteps that the subformulas must hold at.
                                 This is needed to define the temporal operators.
+    :param name:                (optional) a string used to identify this formula.
+    :param check:               (optional) Boolean flag for checking the types and
+                                dimensions of the inputs. Only skip this for inputs
+                                that are known to be valid. Default is ``True``.
     """
-    def __init__(self, subformula_list, combination_type, timesteps, name=None):
+    def __init__(self, subformula_list, combination_type, timesteps, name=None, check=True):
         # Record the dimension of the signal this formula is defined over
         self.d = subformula_list[0].d
 
         # Run some type check on the inputs
-        assert (combination_type == "and") or (combination_type == "or"), "Invalid combination type"
-        assert isinstance(subformula_list, list), "subformula_list must be a list of STLTree or LinearPredicate objects"
-        assert isinstance(timesteps, list), "timesteps must be a list of integers"
-        assert len(timesteps) == len(subformula_list), "a timestep must be provided for each subformula"
-        for formula in subformula_list:
-            assert isinstance(formula, STLFormula), "subformula_list must be a list of STLTree or LinearPredicate objects"
-            assert formula.d == self.d, "all subformulas must be defined over same dimension of signal"
-        for t in timesteps:
-            assert isinstance(t, int), "each timestep must be an integer"
+        if check:
+            assert (combination_type == "and") or (combination_type == "or"), "Invalid combination type"
+            assert isinstance(subformula_list, list), "subformula_list must be a list of STLTree or LinearPredicate objects"
+            assert isinstance(timesteps, list), "timesteps must be a list of integers"
+            assert len(timesteps) == len(subformula_list), "a timestep must be provided for each subformula"
+            for formula in subformula_list:
+                assert isinstance(formula, STLFormula), "subformula_list must be a list of STLTree or LinearPredicate objects"
+                assert formula.d == self.d, "all subformulas must be defined over same dimension of signal"
+            for t in timesteps:
+                assert isinstance(t, int), "each timestep must be an integer"
 
         # Simply save the input arguments. We will parse these recursively later on to
         # determine, for example, the formula robustness.
@@ -352,40 +552,90 @@ class STLTree(STLFormula):
     def negation(self):
         raise NotImplementedError("Only formulas in positive normal form are supported at this time")
 
-    def robustness(self, y, t, robustness_type):
+    def _structure_bytes(self):
+        children = ",".join("%s@%d" % (s.fingerprint(), t)
+                            for s, t in zip(self.subformula_list, self.timesteps))
+        return ("tree:%s:%d:[%s]" % (self.combination_type, self.d, children)).encode()
+
+    def iter_subformulas(self):
+        """
+        Iterate over the subformulas of this formula together with the timesteps
+        they are evaluated at, relative to the timestep of this formula.
+
+        :return:    An iterator over ``(subformula, timestep)`` pairs.
+        """
+        return zip(self.subformula_list, self.timesteps)
+
+    def unique_subformulas(self):
+        """
+        Get the distinct subformula objects of this formula, e.g., for traversing
+        the formula tree without visiting the same subformula more than once.
+
+        :return:    A list of :class:`.STLFormula` objects.
+        """
+        unique = {}
+        for subformula in self.subformula_list:
+            unique.setdefault(id(subformula), subformula)
+        return list(unique.values())
+
+    def _is_boolean(self):
+        """
+        Check whether all subformulas are evaluated at the same timestep.
+        """
+        return all([self.timesteps[i] == self.timesteps[0] for i in range(len(self.timesteps))])
+
+    def _label(self):
+        """
+        The label of this node when printing the formula tree.
+        """
+        return self.combination_type
+
+    def _display_subformulas(self):
+        """
+        The children of this node when printing the formula tree.
+        """
+        return self.subformula_list
+
+    def robustness(self, y, t, robustness_type, cache=None):
+        if cache is None:
+            cache = RobustnessCache()
+        if cache.predicate_table is None:
+            # Compute all linear predicate values at once
+            cache.set_predicate_values(self.get_predicate_table(), y, robustness_type)
+
         if self.combination_type == "and":
             if robustness_type == RobustnessMetrics.AGM:
-                return RobustnessMeasure_and.AGM(self, y, t, robustness_type)
+                return RobustnessMeasure_and.AGM(self, y, t, robustness_type, cache)
             elif robustness_type == RobustnessMetrics.Standard:
-                return RobustnessMeasure_and.Standard(self, y, t, robustness_type)
+                return RobustnessMeasure_and.Standard(self, y, t, robustness_type, cache)
             elif robustness_type == RobustnessMetrics.Smooth:
-                return RobustnessMeasure_and.Smooth(self, y, t, robustness_type)
+                return RobustnessMeasure_and.Smooth(self, y, t, robustness_type, cache)
             elif robustness_type == RobustnessMetrics.LSE:
-                return RobustnessMeasure_and.LSE(self, y, t, robustness_type)
+                return RobustnessMeasure_and.LSE(self, y, t, robustness_type, cache)
             elif robustness_type == RobustnessMetrics.wSTL_Standard:
-                return RobustnessMeasure_and.wSTL_Standard(self, y, t, robustness_type)
+                return RobustnessMeasure_and.wSTL_Standard(self, y, t, robustness_type, cache)
             elif robustness_type == RobustnessMetrics.wSTL_AGM:
-                return RobustnessMeasure_and.wSTL_AGM(self, y, t, robustness_type)
+                return RobustnessMeasure_and.wSTL_AGM(self, y, t, robustness_type, cache)
             elif robustness_type == RobustnessMetrics.NewRobustness:
-                return RobustnessMeasure_and.NewRobustness(self, y, t, robustness_type)
+                return RobustnessMeasure_and.NewRobustness(self, y, t, robustness_type, cache)
             elif robustness_type == RobustnessMetrics.TimeRobustness:
                 # TODO:
                 pass
         elif self.combination_type == "or":
             if robustness_type == RobustnessMetrics.AGM:
-                return RobustnessMeasure_or.AGM(self, y, t, robustness_type)
+                return RobustnessMeasure_or.AGM(self, y, t, robustness_type, cache)
             elif robustness_type == RobustnessMetrics.Standard:
-                return RobustnessMeasure_or.Standard(self, y, t, robustness_type)
+                return RobustnessMeasure_or.Standard(self, y, t, robustness_type, cache)
             elif robustness_type == RobustnessMetrics.Smooth:
-                return RobustnessMeasure_or.Smooth(self, y, t, robustness_type)
+                return RobustnessMeasure_or.Smooth(self, y, t, robustness_type, cache)
             elif robustness_type == RobustnessMetrics.LSE:
-                return RobustnessMeasure_or.LSE(self, y, t, robustness_type)
+                return RobustnessMeasure_or.LSE(self, y, t, robustness_type, cache)
             elif robustness_type == RobustnessMetrics.wSTL_Standard:
-                return RobustnessMeasure_or.wSTL_Standard(self, y, t, robustness_type)
+                return RobustnessMeasure_or.wSTL_Standard(self, y, t, robustness_type, cache)
             elif robustness_type == RobustnessMetrics.wSTL_AGM:
-                return RobustnessMeasure_or.wSTL_AGM(self, y, t, robustness_type)
+                return RobustnessMeasure_or.wSTL_AGM(self, y, t, robustness_type, cache)
             elif robustness_type == RobustnessMetrics.NewRobustness:
-                return RobustnessMeasure_or.NewRobustness(self, y, t, robustness_type)
+                return RobustnessMeasure_or.NewRobustness(self, y, t, robustness_type, cache)
             elif robustness_type == RobustnessMetrics.TimeRobustness:
                 # TODO:
                 pass
@@ -393,71 +643,185 @@ class STLTree(STLFormula):
         return False
 
     def is_state_formula(self):
-        boolean_operation = all([self.timesteps[i] == self.timesteps[0] for i in range(len(self.timesteps))])
-        children_are_state_formulas = all([subformula.is_state_formula() for subformula in self.subformula_list])
+        boolean_operation = self._is_boolean()
+        children_are_state_formulas = all([subformula.is_state_formula() for subformula in self.unique_subformulas()])
 
         return boolean_operation and children_are_state_formulas
 
     def is_disjunctive_state_formula(self):
-        boolean_operation = all([self.timesteps[i] == self.timesteps[0] for i in range(len(self.timesteps))])
-        children_match = all([s.is_disjunctive_state_formula() for s in self.subformula_list])
+        boolean_operation = self._is_boolean()
+        children_match = all([s.is_disjunctive_state_formula() for s in self.unique_subformulas()])
 
         return boolean_operation and children_match and self.combination_type == "or"
 
     def is_conjunctive_state_formula(self):
-        boolean_operation = all([self.timesteps[i] == self.timesteps[0] for i in range(len(self.timesteps))])
-        children_match = all([s.is_conjunctive_state_formula() for s in self.subformula_list])
+        boolean_operation = self._is_boolean()
+        children_match = all([s.is_conjunctive_state_formula() for s in self.unique_subformulas()])
 
         return boolean_operation and children_match and self.combination_type == "and"
 
     def simplify(self):
         """
         Modify this formula to reduce the depth of the formula tree while preserving
-        logical equivalence.
+        logical equivalence. See :meth:`flattened`.
 
         A shallower formula tree can result in a more efficient binary encoding in some
         cases.
+
+        :return removed:    The number of nodes removed from the formula tree.
         """
-        mod = True
-        while mod:
-            # Just keep trying to flatten until we don't get any improvement
-            mod = self.flatten(self)
+        flat, removed = self._flatten()
+        self._replace_with(flat)
+        return removed
 
     def flatten(self, formula):
         """
         Reduce the depth of the given :class:`STLFormula` by combining adjacent
-        layers with the same logical operation. This preserves the meaning of the
-        formula, since, for example,
-
-        ..math::
-
-            (a \land b) \land (c \land d) = a \land b \land c \land d
+        layers with the same logical operation, modifying it in place. See
+        :meth:`flattened`.
 
         :param formula: The formula to modify
 
-        :return made_modification: boolean flag indicating whether the formula was changed.l
+        :return made_modification: boolean flag indicating whether the formula was changed.
 
         """
-        made_modification = False
+        flat, removed = formula._flatten()
+        formula._replace_with(flat)
+        return removed > 0
 
-        for subformula in formula.subformula_list:
-            if subformula.is_predicate():
-                pass
-            else:
-                if formula.combination_type == subformula.combination_type:
-                    # Remove the subformula
-                    i = formula.subformula_list.index(subformula)
-                    formula.subformula_list.pop(i)
-                    st = formula.timesteps.pop(i)
+    def flattened(self):
+        """
+        Return a new formula that reduces the depth of this formula tree by combining
+        adjacent layers with the same logical operation. This preserves the meaning of
+        the formula, since, for example,
+
+        .. math::
 
-                    # Add all the subformula's subformulas instead
-                    formula.subformula_list += subformula.subformula_list
-                    formula.timesteps += [t+st for t in subformula.timesteps]
-                    made_modification = True
+            (a \\land b) \\land (c \\land d) = a \\land b \\land c \\land d, \\quad
+            G_{[t_1,t_2]} G_{[s_1,s_2]} \\varphi = G_{[t_1+s_1,t_2+s_2]} \\varphi.
 
-                made_modification = self.flatten(subformula) or made_modification
+        Nodes with a single subformula are also merged into their parents, whatever
+        their logical operation.
 
-        return made_modification
+        This takes a single bottom-up pass over the formula, without recursion, so it
+        runs in time linear in the size of the formula tree. This formula is not
+        modified: the result shares its predicates, but all other nodes are new. Use
+        :meth:`simplify` to modify this formula instead.
+
+        :return:    An equivalent :class:`.STLTree`.
+        """
+        return self._flatten()[0]
+
+    def _flatten(self):
+        """
+        Build the flattened copy of this formula, and count the nodes removed.
+        """
+        # Each and/or node is first described by a list of entries, which are either
+        # (flattened formula, timestep) or (None, id of a node to splice in, timestep).
+        # Nodes are only built once we know they are not spliced into every parent,
+        # so that a long chain of nested nodes doesn't build a copy at every depth.
+        flat = {}       # id(node) -> flattened node
+        entries = {}    # id(node) -> entries of an and/or node
+        size = {}       # id(node) -> number of subformulas of the flattened and/or node
+        single = {}     # id(node) -> the only (subformula, timestep) of the flattened node
+        nodes = {}      # id(node) -> node
+
+        def build(i):
+            # Expand the spliced nodes in the entries of node i, in order
+            if i not in flat:
+                subformula_list = []
+                timesteps = []
+                stack = [(e, 0) for e in reversed(entries[i])]
+                while stack:
+                    entry, offset = stack.pop()
+                    if entry[0] is None:
+                        stack.extend((e, offset + entry[2]) for e in reversed(entries[entry[1]]))
+                    else:
+                        subformula_list.append(entry[0])
+                        timesteps.append(offset + entry[1])
+                node = nodes[i]
+                flat[i] = STLTree(subformula_list, node.combination_type, timesteps,
+                                  name=node.name, check=False)
+            return flat[i]
+
+        def resolve(subformula, t):
+            # Skip over operators that just delay a single subformula
+            while True:
+                if isinstance(subformula, TemporalTree) and subformula.t1 == subformula.t2:
+                    subformula, t = subformula.subformula, t + subformula.t1
+                elif id(subformula) in single:
+                    subformula, t_s = single[id(subformula)]
+                    t += t_s
+                else:
+                    return subformula, t
+
+        def get(subformula):
+            # The flattened version of an already visited subformula
+            if id(subformula) in entries:
+                return build(id(subformula))
+            return flat[id(subformula)]
+
+        stack = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in flat or id(node) in entries:
+                continue
+
+            if node.is_predicate():
+                flat[id(node)] = node
+            elif not expanded:
+                stack.append((node, True))
+                stack.extend((s, False) for s in node._display_subformulas())
+
+            elif isinstance(node, UntilTree):
+                flat[id(node)] = UntilTree(get(node.left), get(node.right),
+                                           node.t1, node.t2, name=node.name)
+
+            elif isinstance(node, TemporalTree):
+                t1, t2 = node.t1, node.t2
+                subformula, t_s = resolve(node.subformula, 0)
+                t1, t2 = t1 + t_s, t2 + t_s
+                # Merge nested temporal operators of the same kind
+                while isinstance(subformula, TemporalTree) and \
+                        subformula.combination_type == node.combination_type:
+                    t1, t2 = t1 + subformula.t1, t2 + subformula.t2
+                    subformula, t_s = resolve(subformula.subformula, 0)
+                    t1, t2 = t1 + t_s, t2 + t_s
+                flat[id(node)] = TemporalTree(get(subformula), node.combination_type, t1, t2, name=node.name)
+
+            else:
+                node_entries = []
+                count = 0
+                for subformula, t in zip(node.subformula_list, node.timesteps):
+                    subformula, t = resolve(subformula, t)
+                    if id(subformula) in entries and \
+                            nodes[id(subformula)].combination_type == node.combination_type:
+                        node_entries.append((None, id(subformula), t))
+                        count += size[id(subformula)]
+                        last = single.get(id(subformula))
+                        if last is not None:
+                            last = (last[0], t + last[1])
+                    else:
+                        node_entries.append((get(subformula), t))
+                        count += 1
+                        last = (subformula, t)
+                nodes[id(node)] = node
+                entries[id(node)] = node_entries
+                size[id(node)] = count
+                if count == 1:
+                    # Original (not flattened) subformula, so it can be resolved further
+                    single[id(node)] = last
+
+        result = get(self)
+        return result, _count_nodes(self) - _count_nodes(result)
+
+    def _replace_with(self, other):
+        """
+        Make this formula an (in-place) copy of another formula of the same type.
+        """
+        assert type(other) is type(self), "can only replace a formula with one of the same type"
+        self.__dict__.update(other.__dict__)
+        self.clear_cache()
 
     def get_all_inequalities(self):
         As = []
@@ -478,9 +842,9 @@ class STLTree(STLFormula):
         a conjuction or disjuction of subformulas, and leaves are state formulas.
         """
         tree = Tree()
-        root = tree.create_node(self.combination_type)
+        root = tree.create_node(self._label())
 
-        for subformula in self.subformula_list:
+        for subformula in self._display_subformulas():
             self._add_subformula_to_tree(tree, root, subformula)
 
         return tree.__str__()
@@ -493,6 +857,294 @@ class STLTree(STLFormula):
         if formula.is_predicate():
             tree.create_node(formula.__str__(), parent=root)
         else:
-            new_node = tree.create_node(formula.combination_type, parent=root)
-            for subformula in formula.subformula_list:
+            new_node = tree.create_node(formula._label(), parent=root)
+            for subformula in formula._display_subformulas():
                 self._add_subformula_to_tree(tree, new_node, subformula)
+
+class TemporalTree(STLTree):
+    """
+    Describes a bounded temporal operator applied to an :class:`.STLFormula`
+    :math:`\\varphi`, i.e., either
+
+    .. math::
+
+        G_{[t_1,t_2]} \\varphi \quad \\text{or} \quad F_{[t_1,t_2]} \\varphi.
+
+    This is equivalent to an :class:`.STLTree` whose subformulas are :math:`\\varphi`
+    at each of the timesteps :math:`t_1,t_1+1,\\dots,t_2`, combined with conjunction
+    (always) or disjunction (eventually), but only stores :math:`(\\varphi,t_1,t_2)`.
+    The lists ``subformula_list`` and ``timesteps`` are only built if some code asks
+    for them.
+
+    Formulas of this type are usually created with :meth:`.STLFormula.always` and
+    :meth:`.STLFormula.eventually`.
+
+    :param subformula:          The :class:`.STLFormula` :math:`\\varphi`.
+    :param combination_type:    ``"and"`` for always (:math:`G`) or ``"or"`` for
+                                eventually (:math:`F`).
+    :param t1:                  An integer representing the delay :math:`t_1`.
+    :param t2:                  An integer representing the deadline :math:`t_2`.
+    """
+    def __init__(self, subformula, combination_type, t1, t2, name=None):
+        assert (combination_type == "and") or (combination_type == "or"), "Invalid combination type"
+        assert isinstance(subformula, STLFormula), "subformula must be an STLTree or LinearPredicate object"
+        assert isinstance(t1, int) and isinstance(t2, int), "t1 and t2 must be integers"
+        assert 0 <= t1 <= t2, "the time interval must satisfy 0 <= t1 <= t2"
+
+        self.d = subformula.d
+        self.subformula = subformula
+        self.combination_type = combination_type
+        self.t1 = t1
+        self.t2 = t2
+        self.name = name
+
+        self._subformula_list = None
+        self._timesteps = None
+
+    @property
+    def subformula_list(self):
+        if self._subformula_list is None:
+            self._subformula_list = [self.subformula for t in range(self.t1, self.t2+1)]
+        return self._subformula_list
+
+    @property
+    def timesteps(self):
+        if self._timesteps is None:
+            self._timesteps = [t for t in range(self.t1, self.t2+1)]
+        return self._timesteps
+
+    def _structure_bytes(self):
+        return ("temporal:%s:%d:%d:%d:%s" % (self.combination_type, self.d, self.t1, self.t2,
+                                             self.subformula.fingerprint())).encode()
+
+    def iter_subformulas(self):
+        return ((self.subformula, t) for t in range(self.t1, self.t2+1))
+
+    def unique_subformulas(self):
+        return [self.subformula]
+
+    def _is_boolean(self):
+        return self.t1 == self.t2
+
+    def _label(self):
+        operator = "always" if self.combination_type == "and" else "eventually"
+        return "%s [%s,%s]" % (operator, self.t1, self.t2)
+
+    def _display_subformulas(self):
+        return [self.subformula]
+
+class UntilTree(STLTree):
+    """
+    Describes the bounded until operator
+
+    .. math::
+
+        \\varphi_1 U_{[t_1,t_2]} \\varphi_2,
+
+    which holds if :math:`\\varphi_2` holds at some timestep :math:`t' \in [t_1,t_2]`
+    and :math:`\\varphi_1` holds at every timestep :math:`t_1,\\dots,t'-1`.
+
+    Instead of a disjunction over every switching time :math:`t'`, which grows
+    quadratically with the length of the interval, the operator is expanded with the
+    backwards recursion
+
+    .. math::
+
+        \\varphi_1 U_{[0,0]} \\varphi_2 = \\varphi_2, \quad
+        \\varphi_1 U_{[0,j]} \\varphi_2 = \\varphi_2 \lor
+            (\\varphi_1 \land X(\\varphi_1 U_{[0,j-1]} \\varphi_2)),
+
+    where :math:`X` shifts a formula one timestep forward. This gives a chain of
+    :math:`t_2-t_1` ``or``/``and`` nodes with two subformulas each. The chain is only
+    built when it is first needed, and is shared by all timesteps at which the
+    formula is evaluated.
+
+    For the standard robustness measure this is the same as
+
+    .. math::
+
+        \\rho(y,t) = \max_{t' \in [t_1,t_2]} \min \\big( \\rho^{\\varphi_2}(y,t+t'),
+            \min_{t_1 \leq k < t'} \\rho^{\\varphi_1}(y,t+k) \\big),
+
+    i.e., the same as the disjunction over every switching time built by
+    :meth:`.STLFormula.until`. The other robustness metrics are not associative,
+    so they give different values for the two constructions.
+
+    Formulas of this type are usually created with ``STLFormula.until(..., linear=True)``.
+
+    :param left:    The :class:`.STLFormula` :math:`\\varphi_1`.
+    :param right:   The :class:`.STLFormula` :math:`\\varphi_2`.
+    :param t1:      An integer representing the delay :math:`t_1`.
+    :param t2:      An integer representing the deadline :math:`t_2`.
+    """
+    def __init__(self, left, right, t1, t2, name=None):
+        assert isinstance(left, STLFormula) and isinstance(right, STLFormula), \
+                "left and right must be STLTree or LinearPredicate objects"
+        assert left.d == right.d, "all subformulas must be defined over same dimension of signal"
+        assert isinstance(t1, int) and isinstance(t2, int), "t1 and t2 must be integers"
+        assert 0 <= t1 <= t2, "the time interval must satisfy 0 <= t1 <= t2"
+
+        self.d = left.d
+        self.left = left
+        self.right = right
+        self.combination_type = "or"
+        self.t1 = t1
+        self.t2 = t2
+        self.name = name
+
+        self._children = None      # list of (subformula, timestep) pairs
+        self._chain = None         # the nodes left U_[0,j] right for j = 0,1,...
+        self._chain_length = t2 - t1
+        self._subformula_list = None
+        self._timesteps = None
+
+    def _expand(self):
+        """
+        Build the chain of nodes left U_[0,j] right for j < t2-t1, and return
+        the children of this node.
+        """
+        if self._children is None:
+            chain = []
+            for j in range(self._chain_length):
+                node = UntilTree(self.left, self.right, 0, j)
+                if j == 0:
+                    node._children = [(self.right, 0)]
+                else:
+                    step = STLTree([self.left, chain[j-1]], "and", [0, 1])
+                    node._children = [(self.right, 0), (step, 0)]
+                node._chain = chain
+                chain.append(node)
+
+            self._chain = chain
+            if self._chain_length == 0:
+                self._children = [(self.right, self.t1)]
+            else:
+                step = STLTree([self.left, chain[-1]], "and", [0, 1])
+                self._children = [(self.right, self.t1), (step, self.t1)]
+        return self._children
+
+    @property
+    def subformula_list(self):
+        if self._subformula_list is None:
+            self._subformula_list = [s for s, t in self._expand()]
+        return self._subformula_list
+
+    @property
+    def timesteps(self):
+        if self._timesteps is None:
+            self._timesteps = [t for s, t in self._expand()]
+        return self._timesteps
+
+    def robustness(self, y, t, robustness_type, cache=None):
+        if cache is None:
+            cache = RobustnessCache()
+        if cache.predicate_table is None:
+            cache.set_predicate_values(self.get_predicate_table(), y, robustness_type)
+
+        # Evaluate the chain from the deadline backwards, so that each node finds
+        # the value of the next one in the cache rather than recursing into it
+        self._expand()
+        L = self._chain_length
+        for j in range(L):
+            node = self._chain[j]
+            key = (id(node), t + self.t1 + L - j)
+            if key not in cache.values:
+                cache.values[key] = STLTree.robustness(node, y, key[1], robustness_type, cache)
+        return STLTree.robustness(self, y, t, robustness_type, cache)
+
+    def _structure_bytes(self):
+        return ("until:%d:%d:%d:%s:%s" % (self.d, self.t1, self.t2, self.left.fingerprint(),
+                                          self.right.fingerprint())).encode()
+
+    def iter_subformulas(self):
+        return iter(self._expand())
+
+    def unique_subformulas(self):
+        return [s for s, t in self._expand()]
+
+    def _label(self):
+        return "until [%s,%s]" % (self.t1, self.t2)
+
+    def _display_subformulas(self):
+        return [self.left, self.right]
+
+def all_of(formulas, timesteps=None, name=None, check=True):
+    """
+    Return the conjunction of several formulas as a single :class:`.STLTree`,
+
+    .. math::
+
+        \\varphi_1 \\land \\varphi_2 \\land \\dots \\land \\varphi_N.
+
+    Folding the ``&`` operator over a list instead gives a tree of depth :math:`N`,
+    and checks all the subformulas of every level as it is built, which takes
+    :math:`O(N^2)` time. This builds one node in :math:`O(N)` time.
+
+    .. note::
+
+        The ``Standard`` robustness of the flat node is the same as that of the
+        nested tree. The other robustness metrics (e.g., ``AGM`` or ``LSE``) are
+        not associative, so they are applied to all :math:`N` subformulas at once
+        and generally give different values than folding ``&``.
+
+    :param formulas:    A list of :class:`.STLFormula` objects.
+    :param timesteps:   (optional) A list of timesteps that each formula must hold at.
+                        Default is ``0`` for all of them.
+    :param name:        (optional) a string used to identify this formula.
+    :param check:       (optional) Boolean flag for checking the inputs. Default is ``True``.
+
+    :return:    An :class:`.STLTree`, or the only formula if ``formulas`` has length one
+                and neither ``timesteps`` nor ``name`` are given.
+    """
+    return _n_ary(formulas, "and", timesteps, name, check)
+
+def any_of(formulas, timesteps=None, name=None, check=True):
+    """
+    Return the disjunction of several formulas as a single :class:`.STLTree`,
+
+    .. math::
+
+        \\varphi_1 \\lor \\varphi_2 \\lor \\dots \\lor \\varphi_N.
+
+    This is the disjunctive counterpart of :func:`.all_of`, and likewise only
+    matches folding ``|`` for the ``Standard`` robustness metric.
+
+    :param formulas:    A list of :class:`.STLFormula` objects.
+    :param timesteps:   (optional) A list of timesteps that each formula must hold at.
+                        Default is ``0`` for all of them.
+    :param name:        (optional) a string used to identify this formula.
+    :param check:       (optional) Boolean flag for checking the inputs. Default is ``True``.
+
+    :return:    An :class:`.STLTree`, or the only formula if ``formulas`` has length one
+                and neither ``timesteps`` nor ``name`` are given.
+    """
+    return _n_ary(formulas, "or", timesteps, name, check)
+
+def _n_ary(formulas, combination_type, timesteps, name, check):
+    """
+    Combine a list of formulas with a single and/or node.
+    """
+    formulas = list(formulas)
+    assert len(formulas) > 0, "at least one formula is required"
+    if timesteps is None:
+        # A single formula is returned as is, unless it needs a node to carry
+        # the given name
+        if len(formulas) == 1 and name is None:
+            return formulas[0]
+        timesteps = [0 for formula in formulas]
+    return STLTree(formulas, combination_type, list(timesteps), name=name, check=check)
+
+def _count_nodes(formula):
+    """
+    Count the unique nodes in a formula tree.
+    """
+    visited = set()
+    stack = [formula]
+    while stack:
+        node = stack.pop()
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+        if not node.is_predicate():
+            stack.extend(node._display_subformulas())
+    return len(visited)
@@ -0,0 +1,76 @@
+from .formula import STLTree, TemporalTree, UntilTree
+
+class FormulaInterner:
+    """
+    A table of structurally unique :class:`.STLFormula` objects, used to
+    hash-cons formulas: every formula passed through :meth:`intern` is rebuilt so
+    that identical subformulas (those with the same :meth:`.STLFormula.fingerprint`)
+    are one shared object.
+
+    For example, building the same rectangle twice gives two different objects,
+    which solvers encode separately. After interning, both occurrences are the
+    same object:
+
+    .. code-block:: python
+
+        interner = FormulaInterner()
+        r1 = interner.intern(inside_rectangle_formula(bounds, 0, 1, 2))
+        r2 = interner.intern(inside_rectangle_formula(bounds, 0, 1, 2))
+        assert r1 is r2
+
+    The table keeps one representative of each unique formula it has seen, so
+    the same interner can be reused across several formulas.
+    """
+    def __init__(self):
+        self.table = {}  # fingerprint -> representative formula
+
+    def __len__(self):
+        return len(self.table)
+
+    def __contains__(self, formula):
+        return formula.fingerprint() in self.table
+
+    def intern(self, formula):
+        """
+        Get a copy of the given formula in which identical subformulas are shared.
+        Predicates (including :class:`.PolytopePredicate` objects and their faces)
+        are reused as they are, while new :class:`.STLTree` nodes are created, so the
+        given formula is not modified.
+
+        :param formula: The :class:`.STLFormula` to intern.
+
+        :return:    An equivalent :class:`.STLFormula`, built from the formulas in this table.
+        """
+        interned = {}  # id(node) -> interned node
+        stack = [(formula, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in interned:
+                continue
+
+            if node.is_predicate():
+                interned[id(node)] = self.table.setdefault(node.fingerprint(), node)
+            elif not expanded:
+                # Intern the children first
+                stack.append((node, True))
+                if isinstance(node, UntilTree):
+                    stack.extend([(node.left, False), (node.right, False)])
+                else:
+                    stack.extend((s, False) for s in node.unique_subformulas())
+            else:
+                key = node.fingerprint()
+                if key not in self.table:
+                    if isinstance(node, TemporalTree):
+                        new_node = TemporalTree(interned[id(node.subformula)], node.combination_type,
+                                                node.t1, node.t2, name=node.name)
+                    elif isinstance(node, UntilTree):
+                        new_node = UntilTree(interned[id(node.left)], interned[id(node.right)],
+                                             node.t1, node.t2, name=node.name)
+                    else:
+                        new_node = STLTree([interned[id(s)] for s in node.subformula_list],
+                                           node.combination_type, list(node.timesteps), name=node.name)
+                    new_node._fingerprint = key
+                    self.table[key] = new_node
+                interned[id(node)] = self.table[key]
+
+        return interned[id(formula)]
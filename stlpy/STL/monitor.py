@@ -0,0 +1,197 @@
+from collections import deque
+import numpy as np
+from .formula import STLFormula
+from .predicate import LinearPredicate, NonlinearPredicate, PolytopePredicate
+from .sliding_evaluator import SlidingWindowEvaluator
+from stlpy.enumerations.option import RobustnessMetrics
+
+class STLMonitor:
+    """
+    An online monitor that computes the (standard) robustness measure of an
+    :class:`.STLFormula` over a stream of samples :math:`y_0,y_1,\\dots`, one
+    sample at a time.
+
+    A formula with horizon :math:`h` can only be evaluated at time :math:`s` once
+    samples up to :math:`y_{s+h}` are available. After receiving sample
+    :math:`y_k`, the monitor therefore reports the final value of
+    :math:`\\rho^\\varphi(y,k-h)`. For the first :math:`h` samples, no final value
+    is available yet, and the monitor instead reports lower and upper bounds on
+    :math:`\\rho^\\varphi(y,0)`, which hold for any continuation of the signal.
+
+    Each node of the formula keeps only the values its parents still need in a
+    fixed-size ring buffer, and bounded temporal operators (always/eventually)
+    use a monotone-deque sliding min/max. The work per sample is constant and the
+    memory use is bounded by the horizon of the formula, no matter how long the
+    stream is. The bounds reported during warm-up are computed with a
+    :class:`.CompiledSTLFormula`, so they cost one pass over the compiled formula
+    per sample.
+    ::
+
+        monitor = STLMonitor(spec)
+        for y_k in stream:
+            rho, lower, upper = monitor.update(y_k)
+
+    :param formula: The :class:`.STLFormula` to monitor.
+    """
+    def __init__(self, formula):
+        assert isinstance(formula, STLFormula), "formula must be an STLFormula"
+        self.formula = formula
+        self.d = formula.d
+
+        # Reuse the traversal, horizons, and predicate table of the offline
+        # sliding-window evaluator, which processes nodes in the same order
+        evaluator = SlidingWindowEvaluator(formula)
+        self.nodes = evaluator.nodes
+        self.node_horizon = [evaluator.horizon[id(node)] for node in self.nodes]
+        self.horizon = evaluator.horizon[id(formula)]
+        self.predicate_table = evaluator.predicate_table
+        self.A = self.predicate_table.A
+        self.b = self.predicate_table.b
+        index = {id(node): i for i, node in enumerate(self.nodes)}
+
+        # Used to compute bounds during warm-up
+        self.compiled = formula.compile()
+        nonlinear_index = {id(p): i for i, p in enumerate(self.compiled.nonlinear_predicates)}
+
+        # How many past values of each node its parents need to look at
+        retention = [1 for node in self.nodes]
+        self.program = []
+        for i, node in enumerate(self.nodes):
+            h = self.node_horizon[i]
+            if isinstance(node, LinearPredicate):
+                self.program.append(("linear", self.predicate_table.row(node)))
+            elif isinstance(node, PolytopePredicate):
+                rows = [self.predicate_table.row(face) for face in node.faces]
+                self.program.append(("polytope", rows, node.inside))
+            elif isinstance(node, NonlinearPredicate):
+                row = nonlinear_index[id(node)]
+                self.program.append(("nonlinear", node, row))
+            elif id(node) in evaluator.interval:
+                # Each new value of the child enters the window as soon as it is
+                # produced, so the child only needs to keep its latest value
+                subformula, t1, t2 = evaluator.interval[id(node)]
+                self.program.append(("interval", index[id(subformula)], t2 - t1))
+            else:
+                children = [index[id(s)] for s in node.subformula_list]
+                lags = [h - self.node_horizon[c] - t for c, t in zip(children, node.timesteps)]
+                for c, lag in zip(children, lags):
+                    retention[c] = max(retention[c], lag + 1)
+                self.program.append(("tree", children, lags))
+        self.retention = retention
+        self.reset()
+
+    def reset(self):
+        """
+        Forget all samples received so far and start monitoring a new stream.
+        """
+        self.k = -1
+        self.buffers = [[0.0]*r for r in self.retention]
+        self.windows = [deque() for node in self.nodes]
+
+        # During warm-up, keep the predicate values seen so far so that we
+        # can bound the robustness of the whole formula
+        n_steps = self.horizon + 1
+        self.warmup_linear = np.zeros((len(self.predicate_table), n_steps))
+        self.warmup_nonlinear = np.zeros((len(self.compiled.nonlinear_predicates), n_steps))
+
+    def update(self, y_k):
+        """
+        Add the next sample to the stream.
+
+        :param y_k:     A ``(d,)`` numpy array representing the newest sample :math:`y_k`.
+
+        :return rho:    The robustness measure :math:`\\rho^\\varphi(y,k-h)`, where
+                        :math:`h` is the horizon of the formula, or ``None`` if
+                        fewer than :math:`h+1` samples have been received.
+        :return lower:  A lower bound on :math:`\\rho^\\varphi(y,\\max(0,k-h))`.
+        :return upper:  An upper bound on :math:`\\rho^\\varphi(y,\\max(0,k-h))`.
+        """
+        y_k = np.asarray(y_k, dtype=float).ravel()
+        assert y_k.shape == (self.d,), "y_k must be of shape (d,)"
+        self.k += 1
+        k = self.k
+
+        if len(self.predicate_table) > 0:
+            linear = ((self.A @ y_k - self.b) / 10).tolist()
+
+        for i, instruction in enumerate(self.program):
+            s = k - self.node_horizon[i]
+            kind = instruction[0]
+            if kind == "interval":
+                # Push the child's newest value, which ends the window that
+                # starts at s. This starts before the first full window.
+                _, child, width = instruction
+                j = k - self.node_horizon[child]
+                if j < 0:
+                    continue
+                buffer = self.buffers[child]
+                new_value = buffer[j % len(buffer)]
+                window = self.windows[i]
+                if self.nodes[i].combination_type == "and":
+                    while window and window[-1][1] >= new_value:
+                        window.pop()
+                else:
+                    while window and window[-1][1] <= new_value:
+                        window.pop()
+                window.append((j, new_value))
+                if window[0][0] < j - width:
+                    window.popleft()
+                if s < 0:
+                    continue
+                value = window[0][1]
+            elif s < 0:
+                continue
+            elif kind == "linear":
+                value = linear[instruction[1]]
+            elif kind == "polytope":
+                _, rows, inside = instruction
+                faces = [linear[r] for r in rows]
+                value = min(faces) if inside else max(faces)
+            elif kind == "nonlinear":
+                _, predicate, row = instruction
+                value = float(predicate.g(y_k)) / 10
+                if k < self.horizon:
+                    self.warmup_nonlinear[row, k] = value
+            else:
+                _, children, lags = instruction
+                values = []
+                for c, lag in zip(children, lags):
+                    buffer = self.buffers[c]
+                    values.append(buffer[(k - self.node_horizon[c] - lag) % len(buffer)])
+                if self.nodes[i].combination_type == "and":
+                    value = min(values)
+                else:
+                    value = max(values)
+            buffer = self.buffers[i]
+            buffer[s % len(buffer)] = value
+
+        if k >= self.horizon:
+            buffer = self.buffers[-1]
+            rho = buffer[(k - self.horizon) % len(buffer)]
+            return rho, rho, rho
+
+        # Warm-up: bound the robustness by filling in all the predicate
+        # values we have not seen yet with -inf/+inf
+        if len(self.predicate_table) > 0:
+            self.warmup_linear[:, k] = linear
+        lower = self._bound(k, -np.inf)
+        upper = self._bound(k, np.inf)
+        return None, lower, upper
+
+    def _bound(self, k, fill):
+        """
+        Evaluate :math:`\\rho^\\varphi(y,0)` with the predicate values after
+        timestep ``k`` replaced by ``fill``.
+        """
+        compiled = self.compiled
+        linear = self.warmup_linear.copy()
+        linear[:, k+1:] = fill
+        nonlinear = self.warmup_nonlinear.copy()
+        nonlinear[:, k+1:] = fill
+
+        values = np.empty((compiled.n_instances, 1))
+        n_linear = len(compiled.linear_leaf_rows)
+        values[:n_linear, 0] = linear[compiled.linear_leaf_rows, compiled.linear_leaf_times]
+        values[n_linear:compiled.n_leaves, 0] = nonlinear[compiled.nonlinear_leaf_rows,
+                                                          compiled.nonlinear_leaf_times]
+        return float(compiled.evaluate_levels(values, RobustnessMetrics.Standard)[0])
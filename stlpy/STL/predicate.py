@@ -12,16 +12,31 @@ class NonlinearPredicate(STLFormula):
 
     where :math:`y_t \in \mathbb{R}^d` is the value of the signal
     at a given timestep :math:`t`, and :math:`g : \mathbb{R}^d \\to \mathbb{R}`.
+
+    If ``g`` is written with numpy operations that act elementwise, e.g.,
+    ``lambda y : 1 - y[0]**2 - y[1]**2``, it usually also accepts a ``(d,T)``
+    array holding the signal at every timestep, or a ``(d,N,T)`` array holding
+    a batch of signals, and returns a ``(T,)`` (or ``(N,T)``) array. Declaring
+    this with ``vectorized=True`` lets :meth:`values` call ``g`` once for a whole
+    signal rather than once per timestep. If ``g`` turns out to fail (or return
+    the wrong shape) on such arrays, it is called one timestep at a time instead.
     
-    :param g:       A function mapping the signal at a given timestep to 
-                    a scalar value. 
-    :param d:       An integer expressing the dimension of the signal y.
-    :param name:    (optional) a string used to identify this predicate.
+    :param g:           A function mapping the signal at a given timestep to 
+                        a scalar value. 
+    :param d:           An integer expressing the dimension of the signal y.
+    :param name:        (optional) a string used to identify this predicate.
+    :param vectorized:  (optional) Boolean flag indicating that ``g`` also accepts
+                        arrays whose first axis is the signal dimension. Default
+                        is ``False``.
     """
-    def __init__(self, g, d, name=None):
+    def __init__(self, g, d, name=None, vectorized=False):
         self.d = d
         self.name = name
         self.g = g
+        self.vectorized = vectorized
+
+        # Whether autograd can differentiate g, see gradient()
+        self._differentiable = True
 
     def negation(self):
         if self.name is None:
@@ -30,9 +45,98 @@ class NonlinearPredicate(STLFormula):
             newname = "not " + self.name
 
         negative_g = lambda y : -self.g(y)
-        return NonlinearPredicate(negative_g, self.d, name=newname)
+        return NonlinearPredicate(negative_g, self.d, name=newname, vectorized=self.vectorized)
+
+    def _structure_bytes(self):
+        # Functions can't be compared, so only the same function is the same predicate
+        return ("nonlinear:%d:%d" % (self.d, id(self.g))).encode()
+
+    def values(self, y):
+        """
+        Compute :math:`g(y_t)` at every timestep.
+
+        :param y:   A ``(d,T)`` numpy array representing the signal, or a ``(N,d,T)``
+                    numpy array representing a batch of ``N`` signals.
+
+        :return:    A ``(T,)`` (or ``(N,T)``) numpy array.
+        """
+        assert isinstance(y, np.ndarray), "y must be a numpy array"
+        assert y.ndim in (2, 3), "y must be of shape (d,T) or (N,d,T)"
+        if y.ndim == 3:
+            assert y.shape[1] == self.d, "y must be of shape (N,d,T)"
+            # g indexes the signal dimension first
+            y = np.moveaxis(y, 1, 0)
+        else:
+            assert y.shape[0] == self.d, "y must be of shape (d,T)"
+        shape = y.shape[1:]
+
+        if self.vectorized:
+            try:
+                out = np.asarray(self.g(y), dtype=float)
+            except Exception:
+                out = None
+            if out is not None and out.shape == shape:
+                return out
+            # Only evaluate g one timestep at a time from now on
+            self.vectorized = False
+
+        columns = y.reshape((self.d, -1))
+        out = [np.asarray(self.g(columns[:, i]), dtype=float).item() for i in range(columns.shape[1])]
+        return np.array(out, dtype=float).reshape(shape)
+
+    def gradient(self, y_t):
+        """
+        Compute the gradient :math:`\\nabla g(y_t)` at a single timestep.
+
+        The gradient is computed with ``autograd``. If ``autograd`` isn't installed,
+        or ``g`` can't be traced by it (for instance because it calls plain ``numpy``
+        functions like ``np.cos`` rather than ``autograd.numpy`` ones), the gradient
+        is approximated with central finite differences instead.
+
+        :param y_t:     A ``(d,)`` numpy array representing the signal at one timestep.
+
+        :return:        A ``(d,)`` numpy array.
+        """
+        assert isinstance(y_t, np.ndarray), "y_t must be a numpy array"
+        assert y_t.shape == (self.d,), "y_t must be of shape (d,)"
+        y_t = y_t.astype(float)
+        if self._differentiable:
+            try:
+                from autograd import grad
+                return np.asarray(grad(self.g)(y_t), dtype=float)
+            except Exception:
+                self._differentiable = False
+
+        # Finite difference fallback: each column is y_t with one entry shifted
+        eps = 1e-6
+        steps = eps * np.eye(self.d)
+        return (self.values(y_t[:, np.newaxis] + steps) -
+                self.values(y_t[:, np.newaxis] - steps)) / (2*eps)
+
+    def evaluate(self, y, robustness_type):
+        """
+        Compute the robustness of this predicate at every timestep. See :meth:`values`.
+
+        :param y:                   A ``(d,T)`` numpy array representing the signal,
+                                    or a ``(N,d,T)`` numpy array representing a batch
+                                    of ``N`` signals.
+        :param robustness_type:     The :class:`.RobustnessMetrics` being evaluated.
+
+        :return:    A ``(T,)`` (or ``(N,T)``) numpy array.
+        """
+        if robustness_type == RobustnessMetrics.wSTL_Standard:
+            return (self.values(y) - 0.5) / 10
+        return self.values(y) / 10
+
+    def robustness(self, y, t, robustness_type, cache=None):
+        if cache is not None and self.vectorized:
+            # Evaluate g over the whole signal once, and look up every other timestep
+            row = cache.nonlinear_values.get(id(self))
+            if row is None:
+                row = self.evaluate(y, robustness_type)
+                cache.nonlinear_values[id(self)] = row
+            return row[t, np.newaxis]
 
-    def robustness(self, y, t,robustness_type):
         assert isinstance(y, np.ndarray), "y must be a numpy array"
         assert isinstance(t, int), "timestep t must be an integer"
         assert y.shape[0] == self.d, "y must be of shape (d,T)"
@@ -101,7 +205,20 @@ class LinearPredicate(STLFormula):
             newname = "not " + self.name
         return LinearPredicate(-self.a, -self.b, name=newname)
 
-    def robustness(self, y, t, robustness_type):
+    def _structure_bytes(self):
+        # Adding zero turns -0.0 into 0.0, so that it hashes the same
+        a = np.ascontiguousarray(self.a.ravel(), dtype=np.float64) + 0.0
+        b = np.ascontiguousarray(self.b, dtype=np.float64) + 0.0
+        return b"linear:" + a.tobytes() + b":" + b.tobytes()
+
+    def robustness(self, y, t, robustness_type, cache=None):
+        if cache is not None and cache.predicate_table is not None:
+            # The values of this predicate at every timestep have already been
+            # computed together with all the other predicates in the formula
+            row = cache.predicate_table.index.get(id(self))
+            if row is not None:
+                return cache.predicate_values[row, t, np.newaxis]
+
         assert isinstance(y, np.ndarray), "y must be a numpy array"
         assert isinstance(t, int), "timestep t must be an integer"
         assert y.shape[0] == self.d, "y must be of shape (d,T)"
@@ -136,3 +253,254 @@ class LinearPredicate(STLFormula):
         else:
             return "{ Predicate " + self.name + " }"
 
+
+class PolytopePredicate(STLFormula):
+    """
+    A polytope :math:`\\mathcal{P} = \\{ y : Ay \\leq b \\}`, used as a single
+    predicate that holds when the signal is inside the polytope,
+
+    .. math::
+
+        A y_t \\leq b,
+
+    or (with ``inside=False``) when it is outside of it, i.e., some
+    :math:`a_i^Ty_t > b_i`. Here :math:`A \\in \\mathbb{R}^{k \\times d}` and
+    :math:`b \\in \\mathbb{R}^k` describe the :math:`k` faces of the polytope.
+
+    Each face is a :class:`.LinearPredicate`, :math:`b_i - a_i^Ty_t \\geq 0` (or
+    :math:`a_i^Ty_t - b_i \\geq 0` outside), which is owned by this predicate and
+    stored in the list ``faces``. The faces can be given names, and can be passed
+    to solvers like any other linear predicate, e.g., to move one side of the
+    polytope with :meth:`.GurobiMICPSolver.UpdatePredicateOffsets`. Mixed-integer
+    solvers use a single binary variable for the inside of each polytope (see
+    :class:`.MICPEncoding`).
+
+    The robustness of this predicate is
+
+    .. math::
+
+        \\rho(y,t) = \\min_i (b_i - a_i^Ty_t)/10 \\quad \\text{or} \\quad
+        \\rho(y,t) = \\max_i (a_i^Ty_t - b_i)/10
+
+    for every robustness metric, since it is a single predicate rather than a
+    formula over its faces. For the ``Standard`` metric, this is the same as the
+    conjunction (or disjunction) of the faces, but other metrics give different
+    values than combining the faces with ``&`` (or ``|``).
+
+    :param A:           A ``(k,d)`` numpy array or list describing the faces :math:`A`.
+    :param b:           A ``(k,)`` numpy array or list describing the offsets :math:`b`.
+    :param inside:      (optional) Boolean flag for being inside (``True``) or outside
+                        (``False``) of the polytope. Default is ``True``.
+    :param name:        (optional) a string used to identify this predicate.
+    :param face_names:  (optional) a list of ``k`` strings used to identify the faces.
+    """
+    def __init__(self, A, b, inside=True, name=None, face_names=None):
+        self.A = np.atleast_2d(np.asarray(A, dtype=float))
+        self.b = np.atleast_1d(np.asarray(b, dtype=float)).ravel()
+
+        assert self.A.ndim == 2, "A must be of shape (k,d)"
+        assert self.b.shape == (self.A.shape[0],), "b must be of shape (k,)"
+
+        self.d = self.A.shape[1]
+        self.k = self.A.shape[0]
+        self.inside = bool(inside)
+        self.combination_type = "and" if self.inside else "or"
+        self.name = name
+
+        if face_names is None:
+            face_names = [None for i in range(self.k)]
+        assert len(face_names) == self.k, "a name must be provided for each face"
+        sign = -1 if self.inside else 1
+        self.faces = [LinearPredicate(sign*self.A[i], sign*self.b[i], name=face_names[i])
+                      for i in range(self.k)]
+
+    def negation(self):
+        if self.name is None:
+            newname = None
+        else:
+            newname = "not " + self.name
+        return PolytopePredicate(self.A, self.b, inside=not self.inside, name=newname,
+                                 face_names=[face.negation().name for face in self.faces])
+
+    def _structure_bytes(self):
+        A = np.ascontiguousarray(self.A, dtype=np.float64) + 0.0
+        b = np.ascontiguousarray(self.b, dtype=np.float64) + 0.0
+        header = ("polytope:%s:%d:%d:" % (self.combination_type, self.k, self.d)).encode()
+        return header + A.tobytes() + b":" + b.tobytes()
+
+    def reduce_faces(self, values):
+        """
+        Combine the robustness of the faces into the robustness of this predicate.
+
+        :param values:  A numpy array whose first axis has the ``k`` faces.
+
+        :return:        The minimum (inside) or maximum (outside) over the first axis.
+        """
+        if self.inside:
+            return np.min(values, axis=0)
+        return np.max(values, axis=0)
+
+    def evaluate(self, y, robustness_type):
+        """
+        Compute the robustness of this predicate at every timestep.
+
+        :param y:                   A ``(d,T)`` numpy array representing the signal,
+                                    or a ``(N,d,T)`` numpy array representing a batch
+                                    of ``N`` signals.
+        :param robustness_type:     The :class:`.RobustnessMetrics` being evaluated.
+
+        :return:    A ``(T,)`` (or ``(N,T)``) numpy array.
+        """
+        assert isinstance(y, np.ndarray), "y must be a numpy array"
+        assert y.ndim in (2, 3), "y must be of shape (d,T) or (N,d,T)"
+        if y.ndim == 3:
+            assert y.shape[1] == self.d, "y must be of shape (N,d,T)"
+            values = np.einsum('kd,ndt->knt', self.A, y, optimize=True)
+        else:
+            assert y.shape[0] == self.d, "y must be of shape (d,T)"
+            values = self.A @ y
+        values = values - self.b.reshape((-1,) + (1,)*(y.ndim-1))
+        return self.reduce_faces(self._face_robustness(values, robustness_type))
+
+    def _face_robustness(self, values, robustness_type):
+        """
+        Turn the values of A y - b into the robustness of each face.
+        """
+        if self.inside:
+            values = -values
+        if robustness_type == RobustnessMetrics.wSTL_Standard:
+            return (values - 0.5) / 10
+        return values / 10
+
+    def robustness(self, y, t, robustness_type, cache=None):
+        if cache is not None and cache.predicate_table is not None and \
+                id(self.faces[0]) in cache.predicate_table.index:
+            # The values of the faces have already been computed
+            index = cache.predicate_table.index
+            rows = [index[id(face)] for face in self.faces]
+            return np.array([self.reduce_faces(cache.predicate_values[rows, t])])
+
+        assert isinstance(y, np.ndarray), "y must be a numpy array"
+        assert isinstance(t, int), "timestep t must be an integer"
+        assert y.shape[0] == self.d, "y must be of shape (d,T)"
+        assert y.shape[1] > t, "requested timestep %s, but y only has %s timesteps" % (t, y.shape[1])
+        values = self._face_robustness(self.A @ y[:, t] - self.b, robustness_type)
+        return np.array([self.reduce_faces(values)])
+
+    def is_predicate(self):
+        return True
+
+    def is_state_formula(self):
+        return True
+
+    def is_disjunctive_state_formula(self):
+        return not self.inside
+
+    def is_conjunctive_state_formula(self):
+        return self.inside
+
+    def get_all_inequalities(self):
+        As = []
+        bs = []
+        for face in self.faces:
+            A, b = face.get_all_inequalities()
+            As.append(A)
+            bs.append(b)
+        return np.vstack(As), np.hstack(bs)
+
+    def __str__(self):
+        if self.name is None:
+            return "{ Polytope %s*y %s %s }" % (self.A, "<=" if self.inside else "not <=", self.b)
+        else:
+            return "{ Predicate " + self.name + " }"
+
+class PredicateTable:
+    """
+    A table of all the unique :class:`.LinearPredicate` objects in a formula,
+    stacked into a single matrix :math:`A \\in \\mathbb{R}^{P \\times d}` and
+    offset vector :math:`b \\in \\mathbb{R}^P`, so that the values of every
+    predicate at every timestep,
+
+    .. math::
+
+        (Ay - b) / 10,
+
+    can be computed at once. Each predicate then just indexes into the
+    resulting ``(P,T)`` table. Predicates with the same :math:`a` and :math:`b`
+    share a single row, even if they are different objects.
+
+    The same table is used by the recursive :meth:`.STLFormula.robustness`
+    method, by :class:`.CompiledSTLFormula` and :class:`.SlidingWindowEvaluator`,
+    and is available to solvers through :meth:`.STLFormula.get_predicate_table`.
+
+    :param formula: The :class:`.STLFormula` whose predicates are collected.
+    """
+    def __init__(self, formula):
+        self.d = formula.d
+        self.predicates = []  # one representative predicate per row
+        self.index = {}       # id(predicate) -> row of A
+
+        rows = {}             # (a, b) -> row of A
+        visited = set()
+        stack = [formula]
+        while stack:
+            node = stack.pop()
+            if id(node) in visited:
+                continue
+            visited.add(id(node))
+            if isinstance(node, LinearPredicate):
+                key = (tuple(node.a.ravel().tolist()), float(node.b[0]))
+                if key not in rows:
+                    rows[key] = len(self.predicates)
+                    self.predicates.append(node)
+                self.index[id(node)] = rows[key]
+            elif isinstance(node, PolytopePredicate):
+                stack.extend(reversed(node.faces))
+            elif not node.is_predicate():
+                stack.extend(reversed(node.unique_subformulas()))
+
+        if len(self.predicates) > 0:
+            self.A = np.vstack([p.a.T for p in self.predicates])
+            self.b = np.hstack([p.b for p in self.predicates])
+        else:
+            self.A = np.zeros((0, self.d))
+            self.b = np.zeros(0)
+
+    def __len__(self):
+        return len(self.predicates)
+
+    def row(self, predicate):
+        """
+        Get the row of the table that holds the values of the given predicate.
+
+        :param predicate:   A :class:`.LinearPredicate` in the formula.
+
+        :return:    An integer index into the rows of :math:`A` and :math:`b`.
+        """
+        return self.index[id(predicate)]
+
+    def evaluate(self, y, robustness_type):
+        """
+        Compute the values of all predicates in the table at every timestep.
+
+        :param y:                   A ``(d,T)`` numpy array representing the signal,
+                                    or a ``(N,d,T)`` numpy array representing a batch
+                                    of ``N`` signals.
+        :param robustness_type:     The :class:`.RobustnessMetrics` being evaluated.
+
+        :return:    A ``(P,T)`` (or ``(P,N,T)``) numpy array, where ``P`` is the number
+                    of rows in the table.
+        """
+        assert isinstance(y, np.ndarray), "y must be a numpy array"
+        assert y.ndim in (2, 3), "y must be of shape (d,T) or (N,d,T)"
+        if y.ndim == 3:
+            assert y.shape[1] == self.d, "y must be of shape (N,d,T)"
+            # One product over the whole batch, with the predicates first
+            values = np.einsum('pd,ndt->pnt', self.A, y, optimize=True)
+        else:
+            assert y.shape[0] == self.d, "y must be of shape (d,T)"
+            values = self.A @ y
+        offset = self.b.reshape((-1,) + (1,)*(y.ndim-1))
+        if robustness_type == RobustnessMetrics.wSTL_Standard:
+            return (values - offset - 0.5) / 10
+        return (values - offset) / 10
@@ -0,0 +1,221 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from .formula import STLFormula, TemporalTree
+from .predicate import LinearPredicate, NonlinearPredicate, PolytopePredicate
+from .compiled import AND_REDUCTIONS, OR_REDUCTIONS
+from stlpy.enumerations.option import RobustnessMetrics
+from stlpy.RobustnessMeasure.sliding_window import sliding_min, sliding_max, sliding_logsumexp
+
+class SlidingWindowEvaluator:
+    """
+    Evaluate the robustness measure :math:`\\rho^\\varphi(y,t)` of a formula at every
+    start time :math:`t` at once, working bottom-up over arrays of values in time.
+
+    Nodes that represent bounded temporal operators, i.e., :class:`.TemporalTree`
+    objects or :class:`.STLTree` objects whose subformulas are all the same formula
+    at consecutive timesteps :math:`t_1,t_1+1,\\dots,t_2`, are evaluated with sliding-window reductions.
+    For the standard robustness measure this is a monotone-deque sliding min/max,
+    so each such node costs :math:`O(T)` regardless of the window length. The
+    ``LSE`` and ``Smooth`` measures use a sliding log-sum-exp. Other measures
+    reduce over every window explicitly, which costs :math:`O(T(t_2-t_1+1))`.
+
+    All other nodes combine time-shifted copies of their subformulas' values.
+
+    :param formula: The :class:`.STLFormula` to evaluate.
+    """
+    supported_metrics = (RobustnessMetrics.Standard,
+                         RobustnessMetrics.AGM,
+                         RobustnessMetrics.LSE,
+                         RobustnessMetrics.Smooth,
+                         RobustnessMetrics.wSTL_Standard,
+                         RobustnessMetrics.wSTL_AGM,
+                         RobustnessMetrics.NewRobustness)
+    sliding_metrics = (RobustnessMetrics.Standard,
+                       RobustnessMetrics.LSE,
+                       RobustnessMetrics.Smooth)
+
+    def __init__(self, formula):
+        assert isinstance(formula, STLFormula), "formula must be an STLFormula"
+        self.formula = formula
+        self.d = formula.d
+
+        # Post-order traversal over the unique nodes of the formula
+        self.nodes = []
+        self.horizon = {}     # id(node) -> largest timestep the node looks ahead
+        self.interval = {}    # id(node) -> (subformula, t1, t2) for always/eventually nodes
+        stack = [(formula, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in self.horizon:
+                continue
+            if node.is_predicate():
+                self.horizon[id(node)] = 0
+                self.nodes.append(node)
+            elif not expanded:
+                stack.append((node, True))
+                for subformula in node.unique_subformulas():
+                    stack.append((subformula, False))
+            elif isinstance(node, TemporalTree):
+                self.horizon[id(node)] = node.t2 + self.horizon[id(node.subformula)]
+                self.interval[id(node)] = (node.subformula, node.t1, node.t2)
+                self.nodes.append(node)
+            else:
+                self.horizon[id(node)] = max(t + self.horizon[id(s)]
+                        for s, t in zip(node.subformula_list, node.timesteps))
+                if self._is_interval(node):
+                    self.interval[id(node)] = (node.subformula_list[0], node.timesteps[0], node.timesteps[-1])
+                self.nodes.append(node)
+
+        self.predicate_table = formula.get_predicate_table()
+
+    @staticmethod
+    def _is_interval(node):
+        """
+        Check whether the given STLTree applies the same subformula at
+        consecutive timesteps, as in G_[t1,t2] or F_[t1,t2].
+        """
+        if len(node.subformula_list) < 2:
+            return False
+        first = node.subformula_list[0]
+        t1 = node.timesteps[0]
+        return all(s is first for s in node.subformula_list) and \
+               all(t == t1 + i for i, t in enumerate(node.timesteps))
+
+    def evaluate(self, y, robustness_type):
+        """
+        Compute the robustness measure at every start time for which the
+        signal is long enough to evaluate the formula.
+
+        :param y:                   A ``(d,T)`` numpy array representing the signal.
+        :param robustness_type:     The :class:`.RobustnessMetrics` to use. Time
+                                    robustness is not supported.
+
+        :return:    A ``(T-h,)`` numpy array whose entry ``t`` is :math:`\\rho^\\varphi(y,t)`,
+                    where ``h`` is the horizon of the formula.
+        """
+        assert isinstance(y, np.ndarray), "y must be a numpy array"
+        assert y.ndim == 2, "y must be of shape (d,T)"
+        horizon = self.horizon[id(self.formula)]
+        assert y.shape[1] > horizon, "signal must have more than %s timesteps" % horizon
+        return self._signals(y, robustness_type)[id(self.formula)]
+
+    def robustness_signal(self, y, robustness_type, subformulas=False):
+        """
+        Compute the robustness signal :math:`\\rho^\\varphi(y,0),\\rho^\\varphi(y,1),\\dots,
+        \\rho^\\varphi(y,T-1)` of the formula, and optionally of each of its named
+        subformulas, in a single bottom-up pass. The formula can't be evaluated at
+        start times :math:`t` for which :math:`t+h \\geq T`, where :math:`h` is
+        the horizon of the (sub)formula, so these entries are ``nan``. In particular,
+        if the signal has no more than :math:`h` timesteps, the whole signal is ``nan``.
+
+        :param y:                   A ``(d,T)`` numpy array representing the signal.
+        :param robustness_type:     The :class:`.RobustnessMetrics` to use. Time
+                                    robustness is not supported.
+        :param subformulas:         (optional) Boolean flag for also returning the
+                                    signals of the subformulas. Default is ``False``.
+
+        :return rho:        A ``(T,)`` numpy array whose entry ``t`` is
+                            :math:`\\rho^\\varphi(y,t)`.
+        :return named:      (only if ``subformulas`` is ``True``) A dictionary mapping the
+                            ``name`` of each named subformula (including the formula
+                            itself) to its ``(T,)`` robustness signal. If several
+                            subformulas have the same name, only the first one found
+                            is included.
+        """
+        signals = self._signals(y, robustness_type)
+        T = y.shape[1]
+
+        def pad(node):
+            out = np.full(T, np.nan)
+            value = signals[id(node)]
+            out[:len(value)] = value
+            return out
+
+        rho = pad(self.formula)
+        if not subformulas:
+            return rho
+
+        named = {}
+        for node in reversed(self.nodes):
+            if node.name is not None and node.name not in named:
+                named[node.name] = pad(node)
+        return rho, named
+
+    def _signals(self, y, robustness_type):
+        """
+        Compute the robustness signal of every node, as a dictionary mapping
+        id(node) to an array of length max(T-h, 0), where h is the horizon of the node.
+        """
+        assert isinstance(y, np.ndarray), "y must be a numpy array"
+        assert y.ndim == 2 and y.shape[0] == self.d, "y must be of shape (d,T)"
+        if robustness_type not in self.supported_metrics:
+            raise NotImplementedError("Sliding-window evaluation is not supported for %s" % robustness_type)
+        T = y.shape[1]
+
+        signals = {}
+
+        # All linear predicates (including the faces of polytopes) at all timesteps at once
+        table = self.predicate_table.evaluate(y, robustness_type)
+        for node in self.nodes:
+            if isinstance(node, LinearPredicate):
+                signals[id(node)] = table[self.predicate_table.row(node)]
+
+        for node in self.nodes:
+            if isinstance(node, LinearPredicate):
+                continue
+            elif isinstance(node, PolytopePredicate):
+                rows = [self.predicate_table.row(face) for face in node.faces]
+                signals[id(node)] = node.reduce_faces(table[rows])
+                continue
+            elif isinstance(node, NonlinearPredicate):
+                signals[id(node)] = node.evaluate(y, robustness_type)
+                continue
+            elif T <= self.horizon[id(node)]:
+                # The signal is too short to evaluate this node at any start time
+                signals[id(node)] = np.zeros(0)
+                continue
+
+            if node.combination_type == "and":
+                reduction = AND_REDUCTIONS[robustness_type]
+            else:
+                reduction = OR_REDUCTIONS[robustness_type]
+
+            if id(node) in self.interval:
+                subformula, t1, t2 = self.interval[id(node)]
+                child = signals[id(subformula)]
+                if robustness_type in self.sliding_metrics:
+                    signals[id(node)] = self._sliding(child[t1:], t2-t1+1, node.combination_type, robustness_type)
+                else:
+                    # One column for each window
+                    x = sliding_window_view(child[t1:], t2-t1+1).T
+                    signals[id(node)] = reduction(x, np.array([0]), np.array([len(x)]))[0]
+            else:
+                L = T - self.horizon[id(node)]
+                x = np.vstack([signals[id(s)][t:t+L] for s, t in zip(node.subformula_list, node.timesteps)])
+                signals[id(node)] = reduction(x, np.array([0]), np.array([len(x)]))[0]
+
+        return signals
+
+    def _sliding(self, x, w, combination_type, robustness_type):
+        """
+        Apply the ``and``/``or`` reduction of the given metric over every
+        window of length w in x.
+        """
+        k = 5  # same smoothing parameter as RobustnessMeasure_and/_or
+        if robustness_type == RobustnessMetrics.Standard:
+            if combination_type == "and":
+                return sliding_min(x, w)
+            return sliding_max(x, w)
+
+        if combination_type == "and" or robustness_type == RobustnessMetrics.LSE:
+            # Soft min (LSE and Smooth) and soft max (LSE) via log-sum-exp
+            sign = -1 if combination_type == "and" else 1
+            return sign / k * sliding_logsumexp(sign * k * x, w)
+
+        # Smooth max: sum(x*exp(kx)) / sum(exp(kx)), with the positive and negative
+        # parts of the numerator accumulated separately in the log domain
+        log_denominator = sliding_logsumexp(k * x, w)
+        with np.errstate(divide='ignore'):
+            log_positive = sliding_logsumexp(k * x + np.log(np.maximum(x, 0)), w)
+            log_negative = sliding_logsumexp(k * x + np.log(np.maximum(-x, 0)), w)
+        return np.exp(log_positive - log_denominator) - np.exp(log_negative - log_denominator)
@@ -1,9 +1,16 @@
 from abc import ABC, abstractmethod
+from ..enumerations.option import RobustnessMetrics
 
 class BenchmarkScenario(ABC):
     """
     An abstract base class defining a benchmark
     scenario for STL synthesis.
+
+    Specifications combine many subformulas with :func:`.all_of` and
+    :func:`.any_of`, so robustness metrics other than ``Standard`` are
+    applied to flat n-ary nodes rather than to nested binary ones. Rectangles
+    are :class:`.PolytopePredicate` objects, which use the minimum (or maximum)
+    over their sides for every metric.
     """
     @abstractmethod
     def GetSpecification(self):
@@ -35,3 +42,24 @@ class BenchmarkScenario(ABC):
                     visualization to.
         """
         pass
+
+    def ScoreTrajectories(self, Y, robustness_type=RobustnessMetrics.Standard):
+        """
+        Compute the robustness of many output trajectories (e.g., logged
+        or sampled rollouts) with respect to this scenario's specification
+        in a single call.
+
+        The specification is compiled the first time this method is called,
+        and the compiled version is reused afterwards.
+
+        :param Y:               A ``(N,p,T)`` numpy array containing ``N`` output
+                                trajectories of the system.
+        :param robustness_type: (optional) The :class:`.RobustnessMetrics` to use.
+                                Default is ``RobustnessMetrics.Standard``.
+
+        :return rho:    A ``(N,)`` numpy array containing the robustness of each
+                        trajectory.
+        """
+        if getattr(self, "_compiled_spec", None) is None:
+            self._compiled_spec = self.GetSpecification().compile()
+        return self._compiled_spec.robustness_batch(Y, 0, robustness_type)
@@ -5,7 +5,7 @@
 ##
 
 import numpy as np
-from stlpy.STL import LinearPredicate, NonlinearPredicate
+from stlpy.STL import NonlinearPredicate, PolytopePredicate
 from matplotlib.patches import Rectangle, Circle
 
 def inside_circle_formula(center, radius, y1_index, y2_index, d, name=None):
@@ -24,13 +24,14 @@ def inside_circle_formula(center, radius, y1_index, y2_index, d, name=None):
     :return inside_circle:   A ``NonlinearPredicate`` specifying being inside the
                              circle at time zero.
     """
-    # Define the predicate function g(y) >= 0
+    # Define the predicate function g(y) >= 0, which works elementwise
+    # on the signal at any number of timesteps
     def g(y):
         y1 = y[y1_index]
         y2 = y[y2_index]
         return radius**2 - (y1-center[0])**2 - (y2-center[1])**2
 
-    return NonlinearPredicate(g, d, name=name)
+    return NonlinearPredicate(g, d, name=name, vectorized=True)
 
 
 def inside_rectangle_formula(bounds, y1_index, y2_index, d, name=None):
@@ -54,36 +55,23 @@ def inside_rectangle_formula(bounds, y1_index, y2_index, d, name=None):
     :param d:           dimension of the overall signal
     :param name:        (optional) string describing this formula
 
-    :return inside_rectangle:   An ``STLFormula`` specifying being inside the
-                                rectangle at time zero.
+    :return inside_rectangle:   A ``PolytopePredicate`` specifying being inside the
+                                rectangle at time zero. Its ``faces`` are the
+                                sides of the rectangle, named ``"right of name"``,
+                                ``"left of name"``, ``"top of name"``, and
+                                ``"bottom of name"``.
     """
     assert y1_index < d , "index must be less than signal dimension"
     assert y2_index < d , "index must be less than signal dimension"
 
-    # Unpack the bounds
-    y1_min, y1_max, y2_min, y2_max = bounds
-
-    # Create predicates a*y >= b for each side of the rectangle
-    a1 = np.zeros((1,d)); a1[:,y1_index] = 1
-    right = LinearPredicate(a1, y1_min)
-    left = LinearPredicate(-a1, -y1_max)
-
-    a2 = np.zeros((1,d)); a2[:,y2_index] = 1
-    top = LinearPredicate(a2, y2_min)
-    bottom = LinearPredicate(-a2, -y2_max)
+    A, b = _rectangle_faces(bounds, y1_index, y2_index, d)
 
-    # Take the conjuction across all the sides
-    inside_rectangle = right & left & top & bottom
-
-    # set the names
+    # Name each side, e.g., to move it with GurobiMICPSolver.UpdatePredicateOffsets
+    face_names = None
     if name is not None:
-        right.name = "right of " + name
-        left.name = "left of " + name
-        top.name = "top of " + name
-        bottom.name = "bottom of " + name
-        inside_rectangle.name = name
+        face_names = [side + " of " + name for side in ("right", "left", "top", "bottom")]
 
-    return inside_rectangle
+    return PolytopePredicate(A, b, name=name, face_names=face_names)
 
 def outside_rectangle_formula(bounds, y1_index, y2_index, d, name=None):
     """
@@ -106,36 +94,33 @@ def outside_rectangle_formula(bounds, y1_index, y2_index, d, name=None):
     :param d:           dimension of the overall signal
     :param name:        (optional) string describing this formula
     
-    :return outside_rectangle:   An ``STLFormula`` specifying being outside the
-                                 rectangle at time zero.
+    :return outside_rectangle:   A ``PolytopePredicate`` specifying being outside the
+                                 rectangle at time zero. Its ``faces`` are named
+                                 like those of :func:`inside_rectangle_formula`.
     """
     assert y1_index < d , "index must be less than signal dimension"
     assert y2_index < d , "index must be less than signal dimension"
 
-    # Unpack the bounds
-    y1_min, y1_max, y2_min, y2_max = bounds
-
-    # Create predicates a*y >= b for each side of the rectangle
-    a1 = np.zeros((1,d)); a1[:,y1_index] = 1
-    right = LinearPredicate(a1, y1_max)
-    left = LinearPredicate(-a1, -y1_min)
+    A, b = _rectangle_faces(bounds, y1_index, y2_index, d)
 
-    a2 = np.zeros((1,d)); a2[:,y2_index] = 1
-    top = LinearPredicate(a2, y2_max)
-    bottom = LinearPredicate(-a2, -y2_min)
-
-    # Take the disjuction across all the sides
-    outside_rectangle = right | left | top | bottom
-
-    # set the names
+    # Name each side, e.g., to move it with GurobiMICPSolver.UpdatePredicateOffsets
+    face_names = None
     if name is not None:
-        right.name = "right of " + name
-        left.name = "left of " + name
-        top.name = "top of " + name
-        bottom.name = "bottom of " + name
-        outside_rectangle.name = name
+        face_names = [side + " of " + name for side in ("left", "right", "bottom", "top")]
+
+    return PolytopePredicate(A, b, inside=False, name=name, face_names=face_names)
 
-    return outside_rectangle
+def _rectangle_faces(bounds, y1_index, y2_index, d):
+    """
+    Write the rectangle with the given bounds as A y <= b, with rows for
+    y1 >= y1_min, y1 <= y1_max, y2 >= y2_min, and y2 <= y2_max.
+    """
+    y1_min, y1_max, y2_min, y2_max = bounds
+    A = np.zeros((4,d))
+    A[0,y1_index] = -1; A[1,y1_index] = 1
+    A[2,y2_index] = -1; A[3,y2_index] = 1
+    b = np.array([-y1_min, y1_max, -y2_min, y2_max], dtype=float)
+    return A, b
 
 def make_rectangle_patch(xmin, xmax, ymin, ymax, **kwargs):
     """
@@ -3,6 +3,7 @@ from .common import (inside_rectangle_formula,
                      outside_rectangle_formula,
                      make_rectangle_patch)
 from ..systems import DoubleIntegrator
+from ..STL import all_of
 
 class DoorPuzzle(BenchmarkScenario):
     r"""
@@ -59,7 +60,7 @@ class DoorPuzzle(BenchmarkScenario):
         not_at_obs3 = outside_rectangle_formula(self.obs3_bounds, 0, 1, 6)
         not_at_obs4 = outside_rectangle_formula(self.obs4_bounds, 0, 1, 6)
         not_at_obs5 = outside_rectangle_formula(self.obs5_bounds, 0, 1, 6)
-        obstacle_avoidance = not_at_obs1 & not_at_obs2 & not_at_obs3 & not_at_obs4 & not_at_obs5
+        obstacle_avoidance = all_of([not_at_obs1, not_at_obs2, not_at_obs3, not_at_obs4, not_at_obs5])
 
         # Being outside a door region
         no_door1 = outside_rectangle_formula(self.door1_bounds, 0, 1, 6)
@@ -81,19 +82,12 @@ class DoorPuzzle(BenchmarkScenario):
         k4d4 = no_door4.until(key4, 0, self.T)
 
         # Putting it all together
-        if self.N == 1:
-            key_constraints = k1d1
-        elif self.N == 2:
-            key_constraints = k1d1 & k2d2
-        elif self.N == 3:
-            key_constraints = k1d1 & k2d2 & k3d3
-        elif elf.N == 4:
-            key_constraints = k1d1 & k2d2 & k3d3 & k4d4
+        key_constraints = [k1d1, k2d2, k3d3, k4d4][:self.N]
 
         # Put all of the constraints together in one specification
-        specification = obstacle_avoidance.always(0, self.T) & \
-                        key_constraints & \
-                        at_goal.eventually(0, self.T)
+        specification = all_of([obstacle_avoidance.always(0, self.T)] +
+                               key_constraints +
+                               [at_goal.eventually(0, self.T)])
 
         return specification
 
@@ -3,6 +3,7 @@ from .common import (inside_rectangle_formula,
                      outside_rectangle_formula,
                      make_rectangle_patch)
 from ..systems import DoubleIntegrator
+from ..STL import all_of, any_of
 
 class EitherOr(BenchmarkScenario):
     r"""
@@ -42,14 +43,14 @@ class EitherOr(BenchmarkScenario):
         # Target reaching
         at_target_one = inside_rectangle_formula(self.target_one, 0, 1, 6).always(0, self.T_dwell)
         at_target_two = inside_rectangle_formula(self.target_two, 0, 1, 6).always(0, self.T_dwell)
-        at_either_target = at_target_one | at_target_two
+        at_either_target = any_of([at_target_one, at_target_two])
 
         # Obstacle Avoidance
         not_at_obstacle = outside_rectangle_formula(self.obstacle, 0, 1, 6)
 
-        specification = at_either_target.eventually(0, self.T-self.T_dwell) & \
-                        not_at_obstacle.always(0, self.T) & \
-                        at_goal.eventually(0, self.T)
+        specification = all_of([at_either_target.eventually(0, self.T-self.T_dwell),
+                                not_at_obstacle.always(0, self.T),
+                                at_goal.eventually(0, self.T)])
 
         return specification
 
@@ -3,6 +3,7 @@ from .common import (inside_rectangle_formula,
                      outside_rectangle_formula,
                      make_rectangle_patch)
 from ..systems import DoubleIntegrator
+from ..STL import all_of, any_of
 
 class NarrowPassage(BenchmarkScenario):
     r"""
@@ -34,22 +35,18 @@ class NarrowPassage(BenchmarkScenario):
         for goal in self.goals:
             goal_formulas.append(inside_rectangle_formula(goal, 0, 1, 6))
 
-        at_any_goal = goal_formulas[0]
-        for i in range(1,len(goal_formulas)):
-            at_any_goal = at_any_goal | goal_formulas[i]
+        at_any_goal = any_of(goal_formulas)
 
         # Obstacle Avoidance
         obstacle_formulas = []
         for obs in self.obstacles:
             obstacle_formulas.append(outside_rectangle_formula(obs, 0, 1, 6))
 
-        obstacle_avoidance = obstacle_formulas[0]
-        for i in range(1, len(obstacle_formulas)):
-            obstacle_avoidance = obstacle_avoidance & obstacle_formulas[i]
+        obstacle_avoidance = all_of(obstacle_formulas)
 
         # Put all of the constraints together in one specification
-        specification = at_any_goal.eventually(0, self.T) & \
-                        obstacle_avoidance.always(0, self.T)
+        specification = all_of([at_any_goal.eventually(0, self.T),
+                                obstacle_avoidance.always(0, self.T)])
 
         return specification
 
@@ -1,6 +1,7 @@
 from .base import BenchmarkScenario
 from .common import inside_circle_formula, make_circle_patch
 from ..systems import Unicycle
+from ..STL import all_of
 
 class NonlinearReachAvoid(BenchmarkScenario):
     r"""
@@ -39,7 +40,7 @@ class NonlinearReachAvoid(BenchmarkScenario):
         not_at_obstacle = at_obstacle.negation()
 
         # Put all of the constraints together in one specification
-        spec = not_at_obstacle.always(0, self.T) & at_goal.eventually(0, self.T)
+        spec = all_of([not_at_obstacle.always(0, self.T), at_goal.eventually(0, self.T)])
 
         return spec
 
@@ -6,6 +6,7 @@ from .common import (inside_rectangle_formula,
                      outside_rectangle_formula,
                      make_rectangle_patch)
 from ..systems import DoubleIntegrator
+from ..STL import all_of, any_of
 
 class RandomMultitarget(BenchmarkScenario):
     r"""
@@ -57,9 +58,7 @@ class RandomMultitarget(BenchmarkScenario):
         obstacle_formulas = []
         for obs in self.obstacles:
             obstacle_formulas.append(outside_rectangle_formula(obs, 0, 1, 6))
-        obstacle_avoidance = obstacle_formulas[0]
-        for i in range(1, len(obstacle_formulas)):
-            obstacle_avoidance = obstacle_avoidance & obstacle_formulas[i]
+        obstacle_avoidance = all_of(obstacle_formulas)
 
         # Specify that for each target group, we need to visit at least one
         # of the targets in that group
@@ -68,15 +67,12 @@ class RandomMultitarget(BenchmarkScenario):
             group_formulas = []
             for target in target_group:
                 group_formulas.append(inside_rectangle_formula(target, 0, 1, 6))
-            reach_target_group = group_formulas[0]
-            for i in range(1, self.targets_per_group):
-                reach_target_group = reach_target_group | group_formulas[i]
-            target_group_formulas.append(reach_target_group)
+            target_group_formulas.append(any_of(group_formulas))
 
         # Put all of the constraints together in one specification
-        specification = obstacle_avoidance.always(0, self.T)
-        for reach_target_group in target_group_formulas:
-            specification = specification & reach_target_group.eventually(0, self.T)
+        specification = all_of([obstacle_avoidance.always(0, self.T)] +
+                               [reach_target_group.eventually(0, self.T)
+                                for reach_target_group in target_group_formulas])
 
         return specification
 
@@ -3,6 +3,7 @@ from .common import (inside_rectangle_formula,
                      outside_rectangle_formula,
                      make_rectangle_patch)
 from ..systems import DoubleIntegrator
+from ..STL import all_of
 
 class ReachAvoid(BenchmarkScenario):
     r"""
@@ -32,7 +33,7 @@ class ReachAvoid(BenchmarkScenario):
         not_at_obstacle = outside_rectangle_formula(self.obstacle_bounds, 0, 1, 6)
 
         # Put all of the constraints together in one specification
-        spec = not_at_obstacle.always(0, self.T) & at_goal.eventually(0, self.T)
+        spec = all_of([not_at_obstacle.always(0, self.T), at_goal.eventually(0, self.T)])
 
         return spec
 
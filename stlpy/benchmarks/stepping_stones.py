@@ -3,6 +3,7 @@ import numpy as np
 from .base import BenchmarkScenario
 from .common import inside_rectangle_formula, make_rectangle_patch
 from ..systems import DoubleIntegrator
+from ..STL import all_of, any_of
 
 class SteppingStones(BenchmarkScenario):
     r"""
@@ -43,16 +44,14 @@ class SteppingStones(BenchmarkScenario):
         for stone in self.stones:
             stone_formulas.append(inside_rectangle_formula(stone, 0, 1, 6))
 
-        on_any_stone = stone_formulas[0]
-        for i in range(1, len(stone_formulas)):
-            on_any_stone = on_any_stone | stone_formulas[i]
+        on_any_stone = any_of(stone_formulas)
 
         # Specify that we much reach the target
         reach_target = inside_rectangle_formula(self.target, 0, 1, 6)
 
         # Put all of the constraints together in one specification
-        specification = on_any_stone.always(0, self.T) & \
-                        reach_target.eventually(0, self.T)
+        specification = all_of([on_any_stone.always(0, self.T),
+                                reach_target.eventually(0, self.T)])
 
         return specification
 
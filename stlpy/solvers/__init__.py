@@ -28,10 +28,17 @@ except ImportError:
     GUROBI_ENABLED = False
 
 # And load the corresponding solvers accordingly
+from .big_m import predicate_big_m
+from .problem import STLProblem, compile_problem, clear_problem_cache
+
 if SCIPY_ENABLED:
     from .scipy.gradient_solver import ScipyGradientSolver
 
-if GUROBI_ENABLED:
+if SCIPY_ENABLED:
+    from .micp_encoding import MICPEncoding
+    from .scipy.highs_micp import HighsMICPSolver
+
+if GUROBI_ENABLED and SCIPY_ENABLED:
     from .gurobi.gurobi_micp import GurobiMICPSolver
 
 if DRAKE_ENABLED:
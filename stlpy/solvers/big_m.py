@@ -0,0 +1,71 @@
+import numpy as np
+
+def _interval_product(c, lower, upper):
+    """
+    Compute the smallest and largest values of c @ v over the box
+    lower <= v <= upper, for every row of c. Bounds may be infinite.
+    """
+    # Zero coefficients contribute nothing, even if the bound is infinite
+    with np.errstate(invalid='ignore'):
+        low = np.where(c > 0, c*lower, np.where(c < 0, c*upper, 0.0))
+        high = np.where(c > 0, c*upper, np.where(c < 0, c*lower, 0.0))
+    return low.sum(axis=1), high.sum(axis=1)
+
+def predicate_big_m(A, b, sys, x_min, x_max, u_min, u_max, M=1000):
+    """
+    Compute a big-M value for each linear predicate :math:`a_i^Ty - b_i \geq 0`
+    that is valid for any state :math:`x \in [x_{min}, x_{max}]` and control
+    :math:`u \in [u_{min}, u_{max}]`.
+
+    Interval arithmetic on :math:`a_i^Ty = a_i^TCx + a_i^TDu` gives bounds
+    :math:`L_i \leq a_i^Ty \leq U_i`. If every :math:`U_i` is finite, the
+    robustness of any formula over these predicates is at most
+    :math:`\\rho_{max} = \max_i U_i - b_i`, and the constraint
+
+    .. math::
+
+        a_i^Ty - b_i + (1-z)M_i \geq \\rho
+
+    is redundant for :math:`z=0` as long as :math:`M_i \geq \\rho_{max} - L_i + b_i`.
+    Otherwise, the robustness can't be bounded, since some predicates rely on the
+    global value ``M``. The global assumption :math:`\\rho \leq M` is then used in
+    place of :math:`\\rho_{max}`, so that the predicates with a finite lower bound
+    :math:`L_i` still get a valid :math:`M_i`. Only predicates whose lower bound is
+    infinite (e.g., because some of the states they depend on are unbounded) use
+    ``M`` itself.
+
+    :param A:       A ``(P,p)`` numpy array whose rows are the :math:`a_i`.
+    :param b:       A ``(P,)`` numpy array of the offsets :math:`b_i`.
+    :param sys:     A :class:`.LinearSystem` with output :math:`y = Cx + Du`.
+    :param x_min:   A ``(n,)`` numpy array of lower bounds on the state, possibly ``-inf``.
+    :param x_max:   A ``(n,)`` numpy array of upper bounds on the state, possibly ``inf``.
+    :param u_min:   A ``(m,)`` numpy array of lower bounds on the control, possibly ``-inf``.
+    :param u_max:   A ``(m,)`` numpy array of upper bounds on the control, possibly ``inf``.
+    :param M:       (optional) The global big-M value, used where no finite bound
+                    is available. Default is ``1000``.
+
+    :return M_i:        A ``(P,)`` numpy array of big-M values.
+    :return rho_max:    An upper bound on the robustness :math:`\\rho`, which is ``inf``
+                        unless every predicate has a finite upper bound.
+    """
+    A = np.asarray(A, dtype=float).reshape((-1, sys.p))
+    b = np.asarray(b, dtype=float).ravel()
+    if len(b) == 0:
+        return np.zeros(0), np.inf
+
+    x_low, x_high = _interval_product(A @ sys.C, np.ravel(x_min), np.ravel(x_max))
+    u_low, u_high = _interval_product(A @ sys.D, np.ravel(u_min), np.ravel(u_max))
+    lower = x_low + u_low
+    upper = x_high + u_high
+
+    if np.all(np.isfinite(upper)):
+        rho_max = np.max(upper - b)
+        rho_bound = rho_max
+    else:
+        # Unbounded predicates can only rely on the global M, so the robustness
+        # is only known to be at most M, and isn't bounded by the solvers
+        rho_max = np.inf
+        rho_bound = float(M)
+    M_i = rho_bound - lower + b
+    M_i = np.where(np.isfinite(M_i), M_i, float(M))
+    return M_i, rho_max
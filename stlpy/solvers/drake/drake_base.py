@@ -1,4 +1,5 @@
 from ..base import STLSolver
+from ..problem import compile_problem
 from pydrake.all import MathematicalProgram, ge, le
 
 class DrakeSTLSolver(STLSolver):
@@ -8,6 +9,7 @@ class DrakeSTLSolver(STLSolver):
     """
     def __init__(self, spec, sys, x0, T, verbose):
         STLSolver.__init__(self, spec, sys, x0, T, verbose)
+        self.problem = compile_problem(spec, sys, self.T)
 
         # Create the drake MathematicalProgram instance that will allow
         # us to interface with a MIP solver like Gurobi or Mosek
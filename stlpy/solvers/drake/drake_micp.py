@@ -1,5 +1,5 @@
 from .drake_base import DrakeSTLSolver
-from ...STL import LinearPredicate, NonlinearPredicate
+from ..big_m import predicate_big_m
 import numpy as np
 import time
 from pydrake.all import (GurobiSolver, MosekSolver, ClpSolver,
@@ -50,6 +50,10 @@ class DrakeMICPSolver(DrakeSTLSolver):
     :param T:               A positive integer fixing the total number of timesteps :math:`T`.
     :param M:               (optional) A large positive scalar used to rewrite ``min`` and ``max`` as
                             mixed-integer constraints. Default is ``1000``.
+    :param tight_big_m:     (optional) Boolean flag for replacing ``M`` with a separate, much
+                            smaller value for each predicate once state and control bounds are
+                            added (see :func:`.predicate_big_m`). ``M`` is still used for
+                            predicates that depend on unbounded variables. Default is ``True``.
     :param robustness_cost: (optional) Boolean flag for adding a linear cost to maximize
                             the robustness measure. Default is ``True``.
     :param solver:          (optional) String describing the solver to use. Must be one
@@ -60,13 +64,25 @@ class DrakeMICPSolver(DrakeSTLSolver):
                             solver info. Default is ``True``.
     """
     def __init__(self, spec, sys, x0, T, M=1000, robustness_cost=True, 
-            solver='gurobi', presolve=True, verbose=True):
+            solver='gurobi', presolve=True, verbose=True, tight_big_m=True):
         assert M > 0, "M should be a (large) positive scalar"
         super().__init__(spec, sys, x0, T, verbose)
 
         self.M = M
         self.presolve = presolve
 
+        # Big-M constraints of all predicates, which are updated when state
+        # and control bounds are added
+        self.tight_big_m = tight_big_m
+        self.predicate_table = self.problem.predicate_table
+        self.predicate_bindings = []    # (binding, predicate table row)
+        self.predicate_variables = {}   # (predicate table row, t) -> binary variable
+        self.rho_bound = None
+        self.x_min = np.full(self.sys.n, -np.inf)
+        self.x_max = np.full(self.sys.n, np.inf)
+        self.u_min = np.full(self.sys.m, -np.inf)
+        self.u_max = np.full(self.sys.m, np.inf)
+
         # Choose which solver to use
         if solver == 'gurobi':
             self.solver = GurobiSolver()
@@ -129,6 +145,65 @@ class DrakeMICPSolver(DrakeSTLSolver):
 
         return (x,u, rho, solve_time)
 
+    def AddControlBounds(self, u_min, u_max):
+        super().AddControlBounds(u_min, u_max)
+        self.u_min = np.maximum(self.u_min, np.ravel(u_min))
+        self.u_max = np.minimum(self.u_max, np.ravel(u_max))
+        if self.tight_big_m:
+            self.UpdateBigM()
+
+    def AddStateBounds(self, x_min, x_max):
+        super().AddStateBounds(x_min, x_max)
+        self.x_min = np.maximum(self.x_min, np.ravel(x_min))
+        self.x_max = np.minimum(self.x_max, np.ravel(x_max))
+        if self.tight_big_m:
+            self.UpdateBigM()
+
+    def UpdateBigM(self):
+        """
+        Replace the big-M value in the constraint of each predicate with the
+        smallest value that is valid given the state and control bounds added
+        so far (see :func:`.predicate_big_m`), and bound the robustness
+        variable from above accordingly if every predicate is bounded.
+        """
+        table = self.predicate_table
+        M, rho_max = predicate_big_m(table.A, table.b, self.sys,
+                self.x_min, self.x_max, self.u_min, self.u_max, self.M)
+        for binding, row in self.predicate_bindings:
+            binding.evaluator().UpdateCoefficients(
+                    self._PredicateCoefficients(row, M[row]),
+                    [table.b[row] - M[row]], [np.inf])
+
+        # The robustness is only bounded if every predicate is, see predicate_big_m
+        if self.rho_bound is not None:
+            self.rho_bound.evaluator().UpdateUpperBound([rho_max])
+        elif np.isfinite(rho_max):
+            self.rho_bound = self.mp.AddBoundingBoxConstraint(-np.inf, rho_max, self.rho)
+
+    def _PredicateCoefficients(self, row, M):
+        """
+        Coefficients of the big-M constraint of the given predicate table row,
+        with respect to the variables [y_t, z, rho].
+        """
+        return np.hstack([self.predicate_table.A[row], -M, -1.0])[np.newaxis]
+
+    def AddPredicateConstraint(self, row, z, t):
+        """
+        Add the big-M constraint
+
+            a'y(t) - b + (1-z)M >= rho
+
+        for the predicate in the given row of the predicate table, written as
+
+            a'y(t) - Mz - rho >= b - M
+
+        so that M can be changed later on by :meth:`UpdateBigM`.
+        """
+        variables = np.hstack([self.y[:,t], np.ravel(z), [self.rho]])
+        binding = self.mp.AddLinearConstraint(self._PredicateCoefficients(row, self.M),
+                [self.predicate_table.b[row] - self.M], [np.inf], variables)
+        self.predicate_bindings.append((binding, row))
+
     def AddDynamicsConstraints(self):
         """
         Add the constraints
@@ -159,35 +234,20 @@ class DrakeMICPSolver(DrakeSTLSolver):
 
             (x,u) |= specification
 
-        to the optimization problem, via the recursive introduction
-        of binary variables for all subformulas in the specification.
-        """
-        # Add a binary variable which takes a value of 1 only
-        # if the overall specification is satisfied.
-        z_spec = self.mp.NewContinuousVariables(1)
-        self.mp.AddConstraint(eq( z_spec, 1 ))
-
-        # Recursively traverse the tree defined by the specification
-        # subformulas and add similar binary constraints.
-        self.AddSubformulaConstraints(self.spec, z_spec, 0)
+        to the optimization problem, via the introduction of binary
+        variables for all predicates and continuous variables z in [0,1]
+        for all other subformulas in the specification.
 
-    def AddSubformulaConstraints(self, formula, z, t):
-        """
-        Given an STLFormula (formula) and a binary variable (z),
-        add constraints to the optimization problem such that z
-        takes value 1 only if the formula is satisfied (at time t).
-
-        If the formula is a predicate, this constraint uses the "big-M"
-        formulation
+        Each predicate at each timestep gets a single variable (see
+        :meth:`GetPredicateVariable`), with the "big-M" constraint
 
             A[x(t);u(t)] - b + (1-z)M >= 0,
 
         which enforces A[x;u] - b >= 0 if z=1, where (A,b) are the
-        linear constraints associated with this predicate.
+        linear constraints associated with this predicate. The faces of a
+        polytope (see :meth:`AddPolytopeConstraint`) share a single variable.
 
-        If the formula is not a predicate, we recursively traverse the
-        subformulas associated with this formula, adding new binary
-        variables z_i for each subformula and constraining
+        For all other subformulas, we constrain
 
             z <= z_i  for all i
 
@@ -197,36 +257,93 @@ class DrakeMICPSolver(DrakeSTLSolver):
             z <= sum(z_i)
 
         if the subformulas are combined with disjuction (at least one
-        subformula must hold).
-        """
-        # We're at the bottom of the tree, so add the big-M constraints
-        if isinstance(formula, LinearPredicate):
-            # a.T*y - b + (1-z)*M >= rho
-            y = self.y[:,t]
-            self.mp.AddLinearConstraint(ge(
-                formula.a.T@y - formula.b + (1-z)*self.M, self.rho
-            ))
+        subformula must hold). Subformulas are taken from the nodes of
+        the :class:`.STLProblem`, so identical subformulas at the same
+        timestep share a variable.
+        """
+        problem = self.problem
+        if len(problem.nonlinear_predicates) > 0:
+            raise TypeError("Mixed integer programming does not support nonlinear predicates")
 
-            # By default, z is defined as a continuous variable. This
-            # is a hack to make it binary. The redundant continuous
-            # variable will be removed in presolve.
-            tmp = self.mp.NewBinaryVariables(1)
-            self.mp.AddConstraint(eq(tmp, z))
+        # Add a variable which takes a value of 1 only
+        # if the overall specification is satisfied.
+        z_spec = self.mp.NewContinuousVariables(1)
+        self.mp.AddConstraint(eq( z_spec, 1 ))
 
-        elif isinstance(formula, NonlinearPredicate):
-            raise TypeError("Mixed integer programming does not support nonlinear predicates")
+        # One variable for each node
+        z = []
+        for i in range(problem.n_nodes):
+            if problem.polytope_only[i]:
+                z.append(None)
+            elif i < problem.n_leaves:
+                z.append(self.GetPredicateVariable(problem.linear_leaf_rows[i], problem.node_times[i]))
+            elif i == problem.root:
+                z.append(z_spec)
+            elif problem.is_polytope[i]:
+                z.append(self.NewPredicateVariable())
+            else:
+                z_sub = self.mp.NewContinuousVariables(1)
+                self.mp.AddConstraint(ge(z_sub, 0))
+                z.append(z_sub)
+
+        # The specification is a single predicate
+        if problem.root < problem.n_leaves:
+            self.mp.AddConstraint(le( z_spec, z[problem.root] ))
+
+        for i in range(problem.n_leaves, problem.n_nodes):
+            if problem.is_polytope[i]:
+                self.AddPolytopeConstraint(i, z[i])
+                continue
+            z_subs = np.array([z[c] for c in problem.children(i)])
+            if problem.is_and[i]:
+                self.AddAndConstraint(z[i], z_subs)
+            else:
+                self.AddOrConstraint(z[i], z_subs)
+
+    def AddPolytopeConstraint(self, i, z):
+        """
+        Add the big-M constraint of every face of the polytope at node i of the
+        :class:`.STLProblem` with the same variable z, such that z takes value 1
+        only if all of the faces hold.
+        """
+        problem = self.problem
+        for c in problem.children(i):
+            self.AddPredicateConstraint(problem.linear_leaf_rows[c], z, problem.node_times[c])
 
-        # We haven't reached the bottom of the tree, so keep adding
-        # boolean constraints recursively
-        else:
-            z_subs = self.mp.NewContinuousVariables(len(formula.subformula_list),1)
-            self.mp.AddConstraint(ge(z_subs, 0))
+    def AddAndConstraint(self, z, z_subs):
+        """
+        Constrain z <= z_i for all variables z_i in z_subs, such that z
+        takes value 1 only if all of the subformulas are satisfied.
+        """
+        self.mp.AddConstraint(le( z, z_subs ))
+
+    def AddOrConstraint(self, z, z_subs):
+        """
+        Constrain z <= sum(z_i) over the variables z_i in z_subs, such that
+        z takes value 1 only if at least one of the subformulas is satisfied.
+        """
+        self.mp.AddConstraint(le( z, sum(z_subs) ))
+
+    def NewPredicateVariable(self):
+        """
+        Create the variable z associated with a predicate at some timestep.
+        """
+        return self.mp.NewBinaryVariables(1)
 
-            if formula.combination_type == "and":
-                self.mp.AddConstraint(le( z, z_subs ))
-            else:  # combination_type == "or":
-                self.mp.AddConstraint(le( z, sum(z_subs) ))
+    def GetPredicateVariable(self, row, t):
+        """
+        Get the variable z which takes value 1 only if the predicate in
+        the given row of the predicate table holds at time t, adding it
+        and the big-M constraint
 
-            for i, subformula in enumerate(formula.subformula_list):
-                t_sub = formula.timesteps[i]
-                self.AddSubformulaConstraints(subformula, z_subs[i], t+t_sub)
+            a'y(t) - b + (1-z)M >= rho
+
+        the first time this predicate (or another predicate with the same
+        a and b) is used at time t.
+        """
+        key = (row, t)
+        if key not in self.predicate_variables:
+            z = self.NewPredicateVariable()
+            self.AddPredicateConstraint(row, z, t)
+            self.predicate_variables[key] = z
+        return self.predicate_variables[key]
@@ -1,5 +1,4 @@
 from .drake_base import DrakeSTLSolver
-from ...STL import LinearPredicate, NonlinearPredicate
 import numpy as np
 
 from pydrake.all import eq
@@ -135,64 +134,55 @@ class DrakeSmoothSolver(DrakeSTLSolver):
 
             (x,u) |= specification
 
-        to the optimization problem, via the recursive introduction
-        of binary variables for all subformulas in the specification.
-        """
-        # Recursively traverse the tree defined by the specification
-        # to add constraints that define the STL robustness score
-        self.AddSubformulaConstraints(self.spec, np.array([self.rho]), 0)
-
-    def AddSubformulaConstraints(self, formula, rho, t):
-        """
-        Given an STLFormula (formula) and a continuous variable (rho),
-        add constraints to the optimization problem such that rho is
-        the robustness score for that formula.
+        to the optimization problem, via the introduction of a continuous
+        variable rho_i for the robustness score of each node of the
+        :class:`.STLProblem`, i.e., each subformula at each timestep.
 
-        If the formula is a predicate (Ay-b>=0), this means that
+        If the node is a predicate (Ay-b>=0), this means that
 
-            rho = A[x(t);u(t)] - b.
+            rho_i = A[x(t);u(t)] - b.
 
-        If the formula is not a predicate, we recursively traverse the
-        subformulas associated with this formula, adding new subformula
-        robustness scores rho_i for each subformula and defining
+        Otherwise, we define
 
-            rho = min_i{ rho_i }
+            rho_i = min_j{ rho_j }
 
-        if the subformulas are combined with conjunction and
+        over its subformulas j if the subformulas are combined with
+        conjunction and
 
-            rho = max_i{ rho_i }
+            rho_i = max_j{ rho_j }
 
-        if the subformulas are combined with disjuction.
+        if the subformulas are combined with disjuction. The robustness
+        score of the root node is rho.
         """
-        # We're at the bottom of the tree, so add the predicate constraints
-        if isinstance(formula, LinearPredicate):
+        problem = self.problem
+        table = problem.predicate_table
+
+        rho = []
+        for i in range(problem.n_nodes):
+            rho.append(np.array([self.rho]) if i == problem.root
+                       else self.mp.NewContinuousVariables(1))
+
+        # Predicates
+        for i in range(problem.n_linear_leaves):
             # rho = a'y - b
-            y = self.y[:,t]
-            self.mp.AddConstraint(eq( formula.a.T@y - formula.b, rho ))
-        
-        elif isinstance(formula, NonlinearPredicate):
+            row = problem.linear_leaf_rows[i]
+            y = self.y[:,problem.node_times[i]]
+            self.mp.AddConstraint(eq( table.A[row]@y - table.b[row], rho[i] ))
+        for i in range(problem.n_linear_leaves, problem.n_leaves):
             # rho = g(y)
-            y = self.y[:,t]
-            self.mp.AddConstraint(eq( formula.g(y), rho ))
-
-        # We haven't reached the bottom of the tree, so keep adding
-        # boolean constraints recursively
-        else:
-            rho_subs = []
-            for i, subformula in enumerate(formula.subformula_list):
-                rho_sub = self.mp.NewContinuousVariables(1)
-                t_sub = formula.timesteps[i]   # the timestep at which this formula
-                                               # should hold
-                self.AddSubformulaConstraints(subformula, rho_sub, t+t_sub)
-                rho_subs.append(rho_sub)
-
-            if formula.combination_type == "and":
+            formula = problem.nonlinear_predicates[problem.nonlinear_leaf_rows[i - problem.n_linear_leaves]]
+            y = self.y[:,problem.node_times[i]]
+            self.mp.AddConstraint(eq( formula.g(y), rho[i] ))
+
+        # Everything else
+        for i in range(problem.n_leaves, problem.n_nodes):
+            rho_subs = [rho[c] for c in problem.children(i)]
+            if problem.is_and[i]:
                 # rho = min(rho_subs)
-                self._add_min_constraint(rho, rho_subs)
-
-            else:  # combination_type == "or":
+                self._add_min_constraint(rho[i], rho_subs)
+            else:
                 # rho = max(rho_subs)
-                self._add_max_constraint(rho, rho_subs)
+                self._add_max_constraint(rho[i], rho_subs)
 
     def _add_max_constraint(self, a, b_lst):
         """
@@ -1,5 +1,4 @@
 from .drake_micp import DrakeMICPSolver
-from ...STL import LinearPredicate
 import numpy as np
 from pydrake.all import (AddLogarithmicSos1Constraint,
                          eq, le, ge)
@@ -47,6 +46,10 @@ class DrakeSos1Solver(DrakeMICPSolver):
     :param T:               A positive integer fixing the total number of timesteps :math:`T`.
     :param M:               (optional) A large positive scalar used to rewrite ``min`` and ``max`` as
                             mixed-integer constraints. Default is ``1000``.
+    :param tight_big_m:     (optional) Boolean flag for replacing ``M`` with a separate, much
+                            smaller value for each predicate once state and control bounds are
+                            added (see :func:`.predicate_big_m`). ``M`` is still used for
+                            predicates that depend on unbounded variables. Default is ``True``.
     :param robustness_cost: (optional) Boolean flag for adding a linear cost to maximize
                             the robustness measure. Default is ``True``.
     :param solver:          (optional) String describing the solver to use. Must be one
@@ -57,61 +60,36 @@ class DrakeSos1Solver(DrakeMICPSolver):
                             solver info. Default is ``True``.
     """
     def __init__(self, spec, sys, x0, T, M=1000, robustness_cost=True, 
-            solver='gurobi', presolve=True, verbose=True):
+            solver='gurobi', presolve=True, verbose=True, tight_big_m=True):
         super().__init__(spec, sys, x0, T, M, robustness_cost=robustness_cost, 
-                solver=solver, presolve=presolve, verbose=verbose)
+                solver=solver, presolve=presolve, verbose=verbose,
+                tight_big_m=tight_big_m)
 
-    def AddSubformulaConstraints(self, formula, z, t):
+    def NewPredicateVariable(self):
         """
-        Given an STLFormula (formula) and a binary variable (z),
-        add constraints to the optimization problem such that z
-        takes value 1 only if the formula is satisfied (at time t).
-
-        If the formula is a predicate, this constraint uses the "big-M"
-        formulation
-
-            A[x(t);u(t)] - b + (1-z)M >= 0,
-
-        which enforces A[x;u] - b >= 0 if z=1, where (A,b) are the
-        linear constraints associated with this predicate.
-
-        If the formula is not a predicate, we recursively traverse the
-        subformulas associated with this formula, adding new binary
-        variables z_i for each subformula and constraining
-
-            z <= z_i  for all i
-
-        if the subformulas are combined with conjunction (i.e. all
-        subformulas must hold), or otherwise constraining
-
-            z <= sum(z_i)
-
-        if the subformulas are combined with disjuction (at least one
-        subformula must hold).
+        Create the variable z associated with a predicate at some timestep.
+        With the SOS1 encoding of disjunction, this is a continuous variable.
         """
-        # We're at the bottom of the tree, so add the big-M constraints
-        if isinstance(formula, LinearPredicate):
-            # a.T*y - b + (1-z)*M >= rho
-            y = self.y[:,t]
-            self.mp.AddLinearConstraint(ge(
-                formula.a.T@y - formula.b + (1-z)*self.M, self.rho
-            ))
-
-        # We haven't reached the bottom of the tree, so keep adding
-        # boolean constraints recursively
-        else:
-            nz = len(formula.subformula_list)
-
-            if formula.combination_type == "and":
-                z_subs = self.mp.NewContinuousVariables(nz,1)
-                self.mp.AddConstraint(le( z, z_subs ))
-
-            else:  # combination_type == "or":
-                lambda_, _ = AddLogarithmicSos1Constraint(self.mp, nz + 1)
-                z_subs = lambda_[1:][np.newaxis].T
-                self.mp.AddConstraint(eq( 1-z, lambda_[0] ))
-
-            for i, subformula in enumerate(formula.subformula_list):
-                t_sub = formula.timesteps[i]
-                self.AddSubformulaConstraints(subformula, z_subs[i], t+t_sub)
+        z = self.mp.NewContinuousVariables(1)
+        self.mp.AddConstraint(ge(z, 0))
+        return z
 
+    def AddOrConstraint(self, z, z_subs):
+        """
+        Add constraints such that z takes value 1 only if at least one of
+        the subformulas is satisfied, using a logarithmic encoding of the
+        SOS1 constraint
+
+            lambda_0 + lambda_1 + ... + lambda_N = 1
+            lambda_0 = 1 - z
+            lambda_i <= z_i
+            at most one lambda_i is nonzero,
+
+        so only log2(N+1) binary variables are needed for N subformulas.
+        Since the subformula variables z_i may be shared with other parents,
+        they are linked to the SOS1 variables by lambda_i <= z_i.
+        """
+        nz = len(z_subs)
+        lambda_, _ = AddLogarithmicSos1Constraint(self.mp, nz + 1)
+        self.mp.AddConstraint(eq( 1-z, lambda_[0] ))
+        self.mp.AddConstraint(le( lambda_[1:][np.newaxis].T, z_subs ))
@@ -1,7 +1,8 @@
 import stlpy.enumerations.option
 from ..base import STLSolver
-from ...STL import LinearPredicate, NonlinearPredicate
+from ..micp_encoding import MICPEncoding
 import numpy as np
+import scipy.sparse as sp
 
 import gurobipy as gp
 from gurobipy import GRB
@@ -27,6 +28,10 @@ class GurobiMICPSolver(STLSolver):
 
     with Gurobi using mixed-integer convex programming. This gives a globally optimal
     solution, but may be computationally expensive for long and complex specifications.
+
+    The problem is first written in sparse matrix form by :class:`.MICPEncoding`,
+    and then added to the Gurobi model as a single vector of variables and a
+    handful of matrix constraints. The time this takes is stored in ``setup_time``.
     
     .. note::
 
@@ -43,8 +48,18 @@ class GurobiMICPSolver(STLSolver):
     :param T:               A positive integer fixing the total number of timesteps :math:`T`.
     :param M:               (optional) A large positive scalar used to rewrite ``min`` and ``max`` as
                             mixed-integer constraints. Default is ``1000``.
+    :param tight_big_m:     (optional) Boolean flag for replacing ``M`` with a separate, much
+                            smaller value for each predicate once state and control bounds are
+                            added (see :func:`.predicate_big_m`). ``M`` is still used for
+                            predicates that depend on unbounded variables. Default is ``True``.
     :param robustness_cost: (optional) Boolean flag for adding a linear cost to maximize
                             the robustness measure. Default is ``True``.
+    :param encoding:        (optional) How to encode disjunctions (``or`` nodes). ``"naive"`` uses a
+                            binary variable for each predicate, as described above. ``"log_sos1"``
+                            uses the logarithmic SOS1 encoding of :class:`.DrakeSos1Solver`, with
+                            only a logarithmic number of binary variables per ``or`` node, and
+                            ``"sos1"`` uses Gurobi's native SOS1 constraints instead of binary
+                            variables. See :class:`.MICPEncoding` for details. Default is ``"naive"``.
     :param presolve:        (optional) A boolean indicating whether to use Gurobi's
                             presolve routines. Default is ``True``.
     :param verbose:         (optional) A boolean indicating whether to print detailed
@@ -52,7 +67,7 @@ class GurobiMICPSolver(STLSolver):
     """
 
     def __init__(self, spec, sys, x0, T, M=1000, robustness_cost=True, 
-            presolve=True, verbose=True, robustness_type=stlpy.enumerations.option.RobustnessMetrics.Standard):
+            presolve=True, tight_big_m=True, encoding="naive", verbose=True, robustness_type=stlpy.enumerations.option.RobustnessMetrics.Standard):
         assert M > 0, "M should be a (large) positive scalar"
         super().__init__(spec, sys, x0, T, verbose, robustness_type)
         self.spec = spec
@@ -61,6 +76,7 @@ class GurobiMICPSolver(STLSolver):
 
         self.M = float(M)
         self.presolve = presolve
+        self.tight_big_m = tight_big_m
 
         # Set up the optimization problem
         self.model = gp.Model("STL_MICP")
@@ -76,13 +92,22 @@ class GurobiMICPSolver(STLSolver):
 
         if self.verbose:
             print("Setting up optimization problem...")
-            st = time.time()  # for computing setup time
-
-        # Create optimization variables
-        self.y = self.model.addMVar((self.sys.p, self.T), lb=-float('inf'), name='y')
-        self.x = self.model.addMVar((self.sys.n, self.T), lb=-float('inf'), name='x')
-        self.u = self.model.addMVar((self.sys.m, self.T), lb=-float('inf'), name='u')
-        self.rho = self.model.addMVar(1, name="rho", lb=0.0) # lb sets minimum robustness
+        st = time.time()  # for computing setup time
+
+        # Write the problem in sparse matrix form
+        self.encoding = MICPEncoding(spec, sys, x0, self.T, self.M, encoding)
+        enc = self.encoding
+
+        # Create all optimization variables at once, and keep views of the
+        # outputs, states, controls, and robustness
+        vtype = np.where(enc.integer, GRB.BINARY, GRB.CONTINUOUS)
+        self.vars = self.model.addMVar(enc.num_vars, lb=enc.lb, ub=enc.ub, vtype=vtype, name='v')
+        self.y = self._view(enc.y_index)
+        self.x = self._view(enc.x_index)
+        self.u = self._view(enc.u_index)
+        self.rho = self.vars[enc.rho_index:enc.rho_index+1]
+        self.constraints = {}
+        self.last_solution = None
 
         # Add cost and constraints to the optimization problem
         self.AddDynamicsConstraints()
@@ -91,44 +116,157 @@ class GurobiMICPSolver(STLSolver):
         if robustness_cost:
             self.AddRobustnessCost()
 
+        self.model.update()
+        self.setup_time = time.time() - st
         if self.verbose:
-            print(f"Setup complete in {time.time()-st} seconds.")
+            print(f"Setup complete in {self.setup_time} seconds.")
+
+    def _view(self, index):
+        """
+        Get the variables with the given (contiguous, row-major) block of indices
+        as an MVar of the same shape.
+        """
+        start = index.flat[0]
+        return self.vars[start:start+index.size].reshape(index.shape)
+
+    def _add_block(self, name):
+        """
+        Add a constraint block of the encoding as a single matrix constraint.
+        """
+        A, sense, b = self.encoding.blocks[name]
+        if len(b) > 0:
+            self.constraints[name] = self.model.addMConstr(A, self.vars, sense, b, name=name)
+
+    def _update_bounds(self):
+        """
+        Copy the variable bounds and big-M values of the encoding to the model.
+        """
+        self.vars.LB = self.encoding.lb
+        self.vars.UB = self.encoding.ub
+        if self.encoding.bounded and "predicates" in self.constraints:
+            # The coefficients of the z variables have changed, so the whole
+            # block is replaced
+            self.model.remove(self.constraints.pop("predicates"))
+            self._add_block("predicates")
 
     def AddControlBounds(self, u_min, u_max):
-        for t in range(self.T):
-            self.model.addConstr( u_min <= self.u[:,t] )
-            self.model.addConstr( self.u[:,t] <= u_max )
+        self.encoding.set_bounds(u_min=u_min, u_max=u_max, tighten=self.tight_big_m)
+        self._update_bounds()
 
     def AddStateBounds(self, x_min, x_max):
-        for t in range(self.T):
-            self.model.addConstr( x_min <= self.x[:,t] )
-            self.model.addConstr( self.x[:,t] <= x_max )
+        self.encoding.set_bounds(x_min=x_min, x_max=x_max, tighten=self.tight_big_m)
+        self._update_bounds()
 
     def AddQuadraticCost(self, Q, R):
-        self.cost += self.x[:,0]@Q@self.x[:,0] + self.u[:,0]@R@self.u[:,0]
-        for t in range(1,self.T):
-            self.cost += self.x[:,t]@Q@self.x[:,t] + self.u[:,t]@R@self.u[:,t]
+        # sum_t x_t'Qx_t = x'(Q kron I_T)x with x flattened in row-major order
+        x = self.vars[self.encoding.x_index.flat[0]:self.encoding.x_index.flat[-1]+1]
+        u = self.vars[self.encoding.u_index.flat[0]:self.encoding.u_index.flat[-1]+1]
+        I = sp.identity(self.T, format='csr')
+        self.cost += x @ sp.kron(Q, I, format='csr') @ x + u @ sp.kron(R, I, format='csr') @ u
 
-        print(type(self.cost))
-
-    
     def AddRobustnessCost(self):
         self.cost -= self.rho
 
     def AddRobustnessConstraint(self, rho_min=0.0):
         self.model.addConstr( self.rho >= rho_min )
 
-    def Solve(self):
+    def UpdateInitialState(self, x0):
+        """
+        Change the initial state :math:`x_0` of the already-built model, e.g.,
+        for receding-horizon control. Only the right-hand side of the initial
+        condition constraint is changed, so the next call to :meth:`Solve` does
+        not rebuild anything and is warm-started from the previous solution.
+
+        :param x0:  A ``(n,)`` numpy array describing the new initial state.
+        """
+        self.encoding.set_initial_state(x0)
+        self.x0 = self.encoding.x0
+        self.constraints["initial_state"].RHS = self.encoding.blocks["initial_state"][2]
+
+    def UpdatePredicateOffsets(self, offsets):
+        """
+        Change the offsets :math:`b` of some :class:`.LinearPredicate` objects
+        :math:`a^Ty_t - b \geq 0` in the already-built model, e.g., to move an
+        obstacle or goal region. Only the right-hand sides of the corresponding
+        big-M constraints are changed, so the next call to :meth:`Solve` does not
+        rebuild anything and is warm-started from the previous solution.
+
+        One side of a :class:`.PolytopePredicate` (e.g., a rectangle built with
+        :func:`.inside_rectangle_formula`) can be moved by passing its face, which is
+        the :class:`.LinearPredicate` in ``faces``. The polytope itself can be passed
+        with a ``(k,)`` array of new offsets for :math:`Ay \leq b` to move all of its
+        faces (see :meth:`.MICPEncoding.set_predicate_offset`).
+
+        .. note::
+
+            Predicates with the same :math:`a` and :math:`b` share their constraints,
+            so changing the offset of one of them changes all of them.
+
+        :param offsets: A dictionary mapping :class:`.LinearPredicate` (or
+                        :class:`.PolytopePredicate`) objects in the specification to
+                        their new offsets :math:`b`.
+        """
+        for predicate, b in offsets.items():
+            self.encoding.set_predicate_offset(predicate, b)
+        if self.encoding.bounded:
+            self._update_bounds()
+        elif "predicates" in self.constraints:
+            self.constraints["predicates"].RHS = self.encoding.blocks["predicates"][2]
+
+    def Solve(self, time_limit=None, mip_gap=None, incumbent_callback=None, rho_threshold=None):
+        """
+        Solve the optimization problem. By default, this runs until a globally
+        optimal solution is found. For real-time use, the search can instead be
+        stopped early, in which case the best solution found so far (if any) is
+        returned.
+
+        :param time_limit:          (optional) A wall-clock budget in seconds. Default is
+                                    no limit.
+        :param mip_gap:             (optional) Stop once the relative gap between the best
+                                    solution and the best bound is below this value. Default
+                                    is Gurobi's default of ``1e-4``.
+        :param incumbent_callback:  (optional) A function ``f(x, u, rho)`` that is called
+                                    with each new incumbent solution as soon as it is found.
+        :param rho_threshold:       (optional) Stop as soon as an incumbent with robustness
+                                    :math:`\\rho \\geq` ``rho_threshold`` is found.
+
+        :return x:          A ``(n,T)`` numpy array with the state trajectory, or ``None``
+                            if no solution was found.
+        :return u:          A ``(m,T)`` numpy array with the control inputs, or ``None``.
+        :return rho:        The robustness :math:`\\rho` of the solution, or ``-np.inf``.
+        :return solve_time: The time it took to solve the problem, in seconds.
+        """
         # Set the cost function now, right before we solve.
         # This is needed since model.setObjective resets the cost.
         self.model.setObjective(self.cost, GRB.MINIMIZE)
 
-        # Do the actual solving
-        self.model.optimize()
+        # Parameters persist on the model between solves, so reset any limits
+        # left over from a previous call to Gurobi's defaults
+        self.model.setParam('TimeLimit', GRB.INFINITY if time_limit is None else time_limit)
+        self.model.setParam('MIPGap', 1e-4 if mip_gap is None else mip_gap)
+
+        # Warm-start from the binary variables of the previous solution, if any,
+        # and let Gurobi fill in the continuous variables
+        if self.last_solution is not None:
+            start = np.where(self.encoding.integer, self.last_solution, GRB.UNDEFINED)
+            self.vars.Start = start
 
-        if self.model.status == GRB.OPTIMAL:
+        # Do the actual solving, with a callback that looks at each new incumbent
+        if incumbent_callback is None and rho_threshold is None:
+            self.model.optimize()
+        else:
+            self.model.optimize(self._incumbent_callback(incumbent_callback, rho_threshold))
+        if self.verbose:
+            print("Setup time: ", self.setup_time)
+        if self.model.SolCount > 0:
+            self.last_solution = self.vars.X
+
+        if self.model.status == GRB.OPTIMAL or self.model.SolCount > 0:
             if self.verbose:
-                print("\nOptimal Solution Found!\n")
+                if self.model.status == GRB.OPTIMAL:
+                    print("\nOptimal Solution Found!\n")
+                else:
+                    print(f"\nStopped with status {self.model.status}, returning the best solution found.\n")
             x = self.x.X
             u = self.u.X
             rho = self.rho.X
@@ -136,7 +274,7 @@ class GurobiMICPSolver(STLSolver):
             # Report optimal cost and robustness
             if self.verbose:
                 print("Solve time: ", self.model.Runtime)
-                print("Optimal robustness: ", rho)
+                print("Robustness: ", rho)
                 print("")
         else:
             if self.verbose:
@@ -147,92 +285,54 @@ class GurobiMICPSolver(STLSolver):
 
         return (x,u,rho,self.model.Runtime)
 
-    def AddDynamicsConstraints(self):
-        # Initial condition
-        self.model.addConstr( self.x[:,0] == self.x0 )
+    def _incumbent_callback(self, incumbent_callback, rho_threshold):
+        """
+        Create a Gurobi callback that passes each new incumbent solution to
+        incumbent_callback, and stops the solver once the robustness of an
+        incumbent reaches rho_threshold.
+        """
+        enc = self.encoding
 
-        # Dynamics
-        for t in range(self.T-1):
-            self.model.addConstr(
-                    self.x[:,t+1] == self.sys.A@self.x[:,t] + self.sys.B@self.u[:,t] )
+        def callback(model, where):
+            if where != GRB.Callback.MIPSOL:
+                return
+            v = model.cbGetSolution(self.vars)
+            rho = v[enc.rho_index:enc.rho_index+1]
+            if incumbent_callback is not None:
+                incumbent_callback(v[enc.x_index], v[enc.u_index], rho)
+            if rho_threshold is not None and rho[0] >= rho_threshold:
+                model.terminate()
 
-            self.model.addConstr(
-                    self.y[:,t] == self.sys.C@self.x[:,t] + self.sys.D@self.u[:,t] )
+        return callback
 
-        self.model.addConstr(
-                self.y[:,self.T-1] == self.sys.C@self.x[:,self.T-1] + self.sys.D@self.u[:,self.T-1] )
+    def AddDynamicsConstraints(self):
+        # Initial condition, dynamics, and outputs
+        self._add_block("initial_state")
+        self._add_block("dynamics")
+        self._add_block("outputs")
 
     def AddSTLConstraints(self, robustness_type):
         """
         Add the STL constraints
             (x,u) |= specification
-        to the optimization problem, via the recursive introduction
-        of binary variables for all subformulas in the specification.
-        """
-        # Recursively traverse the tree defined by the specification
-        # to add binary variables and constraints that ensure that
-        # rho is the robustness value
-        z_spec = self.model.addMVar(1,vtype=GRB.BINARY)
-        self.AddSubformulaConstraints(self.spec, z_spec, 0)
-        self.model.addConstr( z_spec == 1 )
-
-    def AddSubformulaConstraints(self, formula, z, t):
-        """
-        Given an STLFormula (formula) and a binary variable (z),
-        add constraints to the optimization problem such that z
-        takes value 1 only if the formula is satisfied (at time t).
-
-        If the formula is a predicate, this constraint uses the "big-M"
-        formulation
+        to the optimization problem. The binary variables and big-M
+        constraints for all subformulas in the specification (see
+        :class:`.MICPEncoding`) are added as a few matrix constraints:
 
-            A[x(t);u(t)] - b + (1-z)M >= 0,
+            a'y(t) - b + (1-z)M >= rho      for each predicate,
+            z <= z_i                        for each child of an "and" node,
+            z <= sum(z_i)                   for each "or" node,
 
-        which enforces A[x;u] - b >= 0 if z=1, where (A,b) are the
-        linear constraints associated with this predicate.
-
-        If the formula is not a predicate, we recursively traverse the
-        subformulas associated with this formula, adding new binary
-        variables z_i for each subformula and constraining
-
-            z <= z_i  for all i
-
-        if the subformulas are combined with conjunction (i.e. all
-        subformulas must hold), or otherwise constraining
-
-            z <= sum(z_i)
-
-        if the subformulas are combined with disjuction (at least one
-        subformula must hold).
+        where z is 1 for the top-level specification. With the SOS1
+        encodings, "or" nodes are written as SOS1 constraints instead.
         """
-        # We're at the bottom of the tree, so add the big-M constraints
-        if isinstance(formula, LinearPredicate):
-            # a.T*y - b + (1-z)*M >= rho
-            self.model.addConstr( formula.a.T@self.y[:, t] - formula.b + (1-z)*self.M  >= self.rho )
-
-            # Force z to be binary
-            b = self.model.addMVar(1, vtype=GRB.BINARY)
-            self.model.addConstr(z == b)
-        
-        elif isinstance(formula, NonlinearPredicate):
-            raise TypeError("Mixed integer programming does not support nonlinear predicates")
-
-        # We haven't reached the bottom of the tree, so keep adding
-        # boolean constraints recursively
-        else:
-            if formula.combination_type == "and":
-                for i, subformula in enumerate(formula.subformula_list):
-                    z_sub = self.model.addMVar(1, vtype=GRB.CONTINUOUS)
-                    t_sub = formula.timesteps[i]   # the timestep at which this formula
-                                                   # should hold
-                    self.AddSubformulaConstraints(subformula, z_sub, t+t_sub)
-                    self.model.addConstr( z <= z_sub )
-
-            else:  # combination_type == "or":
-                z_subs = []
-                for i, subformula in enumerate(formula.subformula_list):
-                    z_sub = self.model.addMVar(1, vtype=GRB.CONTINUOUS)
-                    z_subs.append(z_sub)
-                    t_sub = formula.timesteps[i]
-                    self.AddSubformulaConstraints(subformula, z_sub, t+t_sub)
-                self.model.addConstr(z <= sum(z_subs))
-
+        for name in ("predicates", "and", "or", "root"):
+            self._add_block(name)
+
+        if self.encoding.encoding == "log_sos1":
+            self._add_block("sos1")
+        elif self.encoding.encoding == "sos1":
+            variables = self.vars.tolist()
+            for group in self.encoding.sos1_groups:
+                self.model.addSOS(GRB.SOS_TYPE1, [variables[i] for i in group],
+                                  list(range(1, len(group)+1)))
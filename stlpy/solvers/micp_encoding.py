@@ -0,0 +1,443 @@
+import numpy as np
+import scipy.sparse as sp
+from stlpy.STL.predicate import PolytopePredicate
+from .big_m import predicate_big_m
+from .problem import compile_problem
+
+class MICPEncoding:
+    """
+    A solver-independent, sparse matrix form of the mixed-integer encoding of
+
+    .. math::
+
+        & x_0 \\text{ fixed}
+
+        & x_{t+1} = A x_t + B u_t
+
+        & y_{t} = C x_t + D u_t
+
+        & \\rho^{\\varphi}(y_0,y_1,\dots,y_T) \geq \\rho
+
+    where the STL constraints are written with the standard big-M formulation,
+    using a continuous variable :math:`z \\in [0,1]` for every node of the
+    :class:`.STLProblem` (i.e., every distinct subformula at every timestep)
+    other than the predicates:
+
+    .. math::
+
+        a^Ty_t - b + (1-z)M \geq \\rho \quad & \\text{(predicates)}
+
+        z \leq z_i \quad & \\text{(and nodes)}
+
+        z \leq \sum_i z_i \quad & \\text{(or nodes)}
+
+    and a binary variable :math:`z` for each predicate at each timestep it is
+    used at. Predicates that appear several times in the formula (e.g., inside
+    ``always`` or ``eventually``), including distinct :class:`.LinearPredicate`
+    objects with the same :math:`a` and :math:`b`, share a single binary
+    variable and big-M constraint per timestep.
+
+    The inside of a polytope (a :class:`.PolytopePredicate`, or any other ``and``
+    node of predicates that are not used elsewhere, see :class:`.STLProblem`)
+    instead uses one binary variable :math:`z` for all of its faces,
+
+    .. math::
+
+        a_i^Ty_t - b_i + (1-z)M \\geq \\rho \\quad \\text{for all } i,
+
+    rather than one for each face. The outside of a polytope is an ``or`` node
+    over its faces, written with the chosen encoding of disjunctions below.
+
+    All decision variables are stacked into a single vector with layout
+    ``[y, x, u, rho, z]``, where ``y``, ``x``, and ``u`` are flattened in row-major
+    (``C``) order, so that, e.g., :math:`x_{i,t}` is entry ``x_index[i,t]``. The
+    constraints are collected into a few sparse blocks, each of the form
+    :math:`A v \leq b` or :math:`A v = b`, that can be passed directly to a solver.
+
+    :param spec:    An :class:`.STLFormula` describing the specification.
+    :param sys:     A :class:`.LinearSystem` describing the system dynamics.
+    :param x0:      A ``(n,)`` numpy array describing the initial state.
+    :param T:       The total number of timesteps in the trajectory (including
+                    :math:`t=0`).
+    :param M:       A large positive scalar used in the big-M constraints.
+    :param encoding:    (optional) How to encode disjunctions (``or`` nodes). Must be
+                        ``"naive"`` (the encoding above), ``"log_sos1"``, or ``"sos1"``.
+                        Default is ``"naive"``.
+
+    With ``encoding="log_sos1"`` or ``encoding="sos1"``, disjunctions are instead
+    written with a Special Ordered Set of type 1 (SOS1), as in :class:`.DrakeSos1Solver`:
+    each child of an ``or`` node gets a continuous variable :math:`\\lambda_i \\geq 0`
+    with
+
+    .. math::
+
+        \\sum_i \\lambda_i = z, \\quad \\text{at most one } \\lambda_i \\text{ is nonzero},
+
+    and the predicate variables are continuous. For ``"log_sos1"``, the SOS1
+    condition on :math:`(1-z, \\lambda_1, \\dots, \\lambda_k)` is written with
+    :math:`\\lceil \\log_2(k+1) \\rceil` binary variables, which take the value
+    of the (Gray) code of the nonzero entry. These are stored in the ``"sos1"``
+    block and placed after the ``z`` variables. For ``"sos1"``, no binary
+    variables are used at all, and the solver must enforce the sets in
+    ``sos1_groups`` (the indices of :math:`\\lambda_1,\\dots,\\lambda_k` for
+    each ``or`` node) natively.
+
+    Once bounds on the states and controls are given with :meth:`set_bounds`,
+    each predicate row gets its own (much smaller) big-M value from
+    :func:`.predicate_big_m`, and ``M`` is only used for predicates whose
+    value is not bounded.
+    """
+    encodings = ("naive", "log_sos1", "sos1")
+
+    def __init__(self, spec, sys, x0, T, M=1000, encoding="naive"):
+        assert encoding in self.encodings, "encoding must be one of %s" % (self.encodings,)
+        self.spec = spec
+        self.encoding = encoding
+        self.sys = sys
+        self.x0 = np.asarray(x0, dtype=float).ravel()
+        self.T = T
+        self.M = float(M)
+        n, m, p = sys.n, sys.m, sys.p
+        self.problem = compile_problem(spec, sys, T)
+
+        # Variable layout
+        self.num_vars = 0
+        self.lb = []
+        self.ub = []
+        self.integer = []
+        self.y_index = self._add_variables(p*T).reshape((p, T))
+        self.x_index = self._add_variables(n*T).reshape((n, T))
+        self.u_index = self._add_variables(m*T).reshape((m, T))
+        self.rho_index = self._add_variables(1, lb=0.0)[0]
+        self.x_min = np.full(n, -np.inf)
+        self.x_max = np.full(n, np.inf)
+        self.u_min = np.full(m, -np.inf)
+        self.u_max = np.full(m, np.inf)
+        self.bounded = False
+
+        # Constraint blocks: name -> (A, sense, b), with sense "<" or "=".
+        # These are stored in triplet form until all variables are known.
+        self.blocks = {}
+        self._encode_dynamics()
+        self._encode_formula()
+
+        self.lb = np.hstack(self.lb)
+        self.ub = np.hstack(self.ub)
+        self.integer = np.hstack(self.integer)
+        for name, (rows, cols, vals, sense, b) in self.blocks.items():
+            A = sp.csr_matrix((vals, (rows, cols)), shape=(len(b), self.num_vars))
+            self.blocks[name] = (A, sense, b)
+
+    def _add_variables(self, count, lb=-np.inf, ub=np.inf, integer=False):
+        """
+        Reserve ``count`` new decision variables and return their indices.
+        """
+        index = np.arange(self.num_vars, self.num_vars + count)
+        self.num_vars += count
+        self.lb.append(np.full(count, lb, dtype=float))
+        self.ub.append(np.full(count, ub, dtype=float))
+        self.integer.append(np.full(count, integer, dtype=bool))
+        return index
+
+    def _add_block(self, name, rows, cols, vals, sense, b):
+        """
+        Store the sparse constraint block A v (sense) b given in triplet form.
+        """
+        b = np.asarray(b, dtype=float)
+        rows = np.asarray(rows, dtype=int).ravel()
+        cols = np.asarray(cols, dtype=int).ravel()
+        vals = np.asarray(vals, dtype=float).ravel()
+        self.blocks[name] = (rows, cols, vals, sense, b)
+
+    def _encode_dynamics(self):
+        """
+        Encode x_0 = x0, x_{t+1} = A x_t + B u_t, and y_t = C x_t + D u_t.
+        """
+        A, B, C, D = self.problem.A, self.problem.B, self.problem.C, self.problem.D
+        n, m, p, T = self.problem.n, self.problem.m, self.problem.p, self.T
+
+        # Initial condition
+        self._add_block("initial_state", np.arange(n), self.x_index[:, 0], np.ones(n), "=", self.x0)
+
+        # x_{t+1} - A x_t - B u_t = 0, one row per (t, i) for t < T-1
+        row = (np.arange(T-1)[:, np.newaxis]*n + np.arange(n)[np.newaxis, :])   # (T-1,n)
+        rows = [row,
+                np.repeat(row[:, :, np.newaxis], n, axis=2),
+                np.repeat(row[:, :, np.newaxis], m, axis=2)]
+        cols = [self.x_index[:, 1:].T,
+                np.broadcast_to(self.x_index[:, :-1].T[:, np.newaxis, :], (T-1, n, n)),
+                np.broadcast_to(self.u_index[:, :-1].T[:, np.newaxis, :], (T-1, n, m))]
+        vals = [np.ones((T-1, n)),
+                np.broadcast_to(-A, (T-1, n, n)),
+                np.broadcast_to(-B, (T-1, n, m))]
+        self._add_block("dynamics", np.hstack([r.ravel() for r in rows]),
+                        np.hstack([c.ravel() for c in cols]),
+                        np.hstack([v.ravel() for v in vals]), "=", np.zeros((T-1)*n))
+
+        # y_t - C x_t - D u_t = 0, one row per (t, i)
+        row = (np.arange(T)[:, np.newaxis]*p + np.arange(p)[np.newaxis, :])     # (T,p)
+        rows = [row,
+                np.repeat(row[:, :, np.newaxis], n, axis=2),
+                np.repeat(row[:, :, np.newaxis], m, axis=2)]
+        cols = [self.y_index.T,
+                np.broadcast_to(self.x_index.T[:, np.newaxis, :], (T, p, n)),
+                np.broadcast_to(self.u_index.T[:, np.newaxis, :], (T, p, m))]
+        vals = [np.ones((T, p)),
+                np.broadcast_to(-C, (T, p, n)),
+                np.broadcast_to(-D, (T, p, m))]
+        self._add_block("outputs", np.hstack([r.ravel() for r in rows]),
+                        np.hstack([c.ravel() for c in cols]),
+                        np.hstack([v.ravel() for v in vals]), "=", np.zeros(T*p))
+
+    def _encode_formula(self):
+        """
+        Assign a z variable to every node of the :class:`.STLProblem`, and
+        encode the predicate, and, and or constraints.
+        """
+        problem = self.problem
+        naive = self.encoding == "naive"
+        table = problem.predicate_table
+        self.predicate_table = table
+        if len(problem.nonlinear_predicates) > 0:
+            raise TypeError("Mixed integer programming does not support nonlinear predicates")
+
+        predicate_nodes = []    # (z index, predicate row, t)
+        predicate_z = {}        # (predicate row, t) -> z index
+        and_edges = []          # (parent z, child z)
+        or_groups = []          # (parent z, [child z])
+
+        # Predicates with the same row of the predicate table share a single
+        # (binary, unless disjunctions use SOS1) variable at each timestep
+        root = self._add_variables(1, lb=0.0, ub=1.0, integer=naive)[0]
+        node_z = np.full(problem.n_nodes, -1, dtype=int)
+        node_z[problem.root] = root
+        for i in range(problem.n_linear_leaves):
+            if problem.polytope_only[i]:
+                continue
+            key = (problem.linear_leaf_rows[i], problem.node_times[i])
+            if key not in predicate_z:
+                if node_z[i] < 0:
+                    node_z[i] = self._add_variables(1, lb=0.0, ub=1.0, integer=naive)[0]
+                predicate_z[key] = node_z[i]
+                predicate_nodes.append((node_z[i], key[0], key[1]))
+            node_z[i] = predicate_z[key]
+
+        # Polytopes take the place of their predicates, with one variable for all the
+        # faces at each timestep
+        for i in np.flatnonzero(problem.is_polytope):
+            if node_z[i] < 0:
+                node_z[i] = self._add_variables(1, lb=0.0, ub=1.0, integer=naive)[0]
+            for c in problem.children(i):
+                predicate_nodes.append((node_z[i], problem.linear_leaf_rows[c], problem.node_times[c]))
+
+        # All other nodes
+        internal = np.flatnonzero(node_z < 0)
+        internal = internal[~problem.polytope_only[internal]]
+        node_z[internal] = self._add_variables(len(internal), lb=0.0, ub=1.0)
+
+        for i in range(problem.n_leaves, problem.n_nodes):
+            children = problem.children(i)
+            if problem.is_polytope[i]:
+                continue
+            elif problem.is_and[i]:
+                and_edges += [(node_z[i], node_z[c]) for c in children]
+            elif naive:
+                or_groups.append((node_z[i], list(node_z[children])))
+            else:
+                # Variables that are shared with other parents can't be members
+                # of an SOS1, so use a new variable that implies the child
+                group = []
+                for c in children:
+                    if c < problem.n_leaves or problem.parent_count[c] > 1:
+                        z_lambda = self._add_variables(1, lb=0.0, ub=1.0)[0]
+                        and_edges.append((z_lambda, node_z[c]))
+                        group.append(z_lambda)
+                    else:
+                        group.append(node_z[c])
+                or_groups.append((node_z[i], group))
+        self.z_root = root
+        self.z_index = np.arange(self.rho_index + 1, self.num_vars)
+
+        # Predicates: -a^T y_t + M z + rho <= M - b
+        self.predicate_z = np.array([z for z, _, _ in predicate_nodes], dtype=int)
+        self.predicate_rows = np.array([r for _, r, _ in predicate_nodes], dtype=int)
+        self.predicate_times = np.array([t for _, _, t in predicate_nodes], dtype=int)
+        self.predicate_offsets = table.b.copy()
+        self.predicate_M = np.full(len(predicate_nodes), self.M)
+        k = len(predicate_nodes)
+        p = self.sys.p
+        rows = np.arange(k)
+        a = table.A[self.predicate_rows]                          # (k,p)
+        y_cols = self.y_index[:, self.predicate_times].T          # (k,p)
+        self._add_block("predicates",
+                np.hstack([np.repeat(rows, p), rows, rows]),
+                np.hstack([y_cols.ravel(), self.predicate_z, np.full(k, self.rho_index)]),
+                np.hstack([-a.ravel(), self.predicate_M, np.ones(k)]),
+                "<", self.predicate_rhs())
+
+        # And nodes: z - z_i <= 0
+        e = len(and_edges)
+        edges = np.array(and_edges, dtype=int).reshape((e, 2))
+        self._add_block("and", np.hstack([np.arange(e), np.arange(e)]),
+                        np.hstack([edges[:, 0], edges[:, 1]]),
+                        np.hstack([np.ones(e), -np.ones(e)]), "<", np.zeros(e))
+
+        # Or nodes: z - sum_i z_i <= 0, or z - sum_i lambda_i = 0 with SOS1
+        counts = np.array([len(children) for _, children in or_groups], dtype=int)
+        parents = np.array([z for z, _ in or_groups], dtype=int)
+        children = np.array([c for _, group in or_groups for c in group], dtype=int)
+        g = len(or_groups)
+        self._add_block("or", np.hstack([np.arange(g), np.repeat(np.arange(g), counts)]),
+                        np.hstack([parents, children]),
+                        np.hstack([np.ones(g), -np.ones(len(children))]),
+                        "<" if naive else "=", np.zeros(g))
+        self.sos1_groups = [] if naive else [np.array(group, dtype=int) for _, group in or_groups]
+        if self.encoding == "log_sos1":
+            self._encode_log_sos1(or_groups)
+
+        # The specification must hold
+        self._add_block("root", [0], [root], [1.0], "=", [1.0])
+
+    def _encode_log_sos1(self, or_groups):
+        """
+        Encode the SOS1 condition on (1-z, lambda_1, ..., lambda_k) of each or
+        node with binary variables b that hold the Gray code c_j of the nonzero
+        entry j. For each bit l, with lambda_0 = 1-z, this is
+
+            sum_{j : c_j[l] = 1} lambda_j <= b_l
+            sum_{j : c_j[l] = 0} lambda_j <= 1 - b_l.
+
+        Since c_0 = 0, lambda_0 only appears in the second constraint.
+        """
+        rows, cols, vals = [], [], []
+        num_rows = 0
+        bits = []
+        for z, group in or_groups:
+            k = len(group)
+            L = max(1, int(np.ceil(np.log2(k + 1))))
+            b = self._add_variables(L, lb=0.0, ub=1.0, integer=True)
+            bits.append(b)
+            j = np.arange(1, k + 1)
+            code = (j ^ (j >> 1))[:, np.newaxis] >> np.arange(L)[np.newaxis, :] & 1    # (k,L)
+            group = np.asarray(group, dtype=int)
+            for l in range(L):
+                ones = group[code[:, l] == 1]
+                zeros = group[code[:, l] == 0]
+
+                # sum_{ones} lambda_j - b_l <= 0
+                rows += [np.full(len(ones) + 1, num_rows)]
+                cols += [ones, [b[l]]]
+                vals += [np.ones(len(ones)), [-1.0]]
+
+                # sum_{zeros} lambda_j - z + b_l <= 0
+                rows += [np.full(len(zeros) + 2, num_rows + 1)]
+                cols += [zeros, [z, b[l]]]
+                vals += [np.ones(len(zeros)), [-1.0, 1.0]]
+                num_rows += 2
+        self.sos1_bits = np.hstack(bits).astype(int) if bits else np.zeros(0, dtype=int)
+        self._add_block("sos1", np.hstack(rows) if rows else [], np.hstack(cols) if cols else [],
+                        np.hstack(vals) if vals else [], "<", np.zeros(num_rows))
+
+    def predicate_rhs(self):
+        """
+        Compute the right-hand side :math:`M - b` of the rows of the
+        ``"predicates"`` block from the current ``predicate_offsets``.
+
+        :return:    A numpy array with one entry per row of the block.
+        """
+        return self.predicate_M - self.predicate_offsets[self.predicate_rows]
+
+    def set_predicate_offset(self, predicate, b):
+        """
+        Change the offset :math:`b` of a :class:`.LinearPredicate` in the
+        encoding. This affects every row that uses this predicate, and every
+        other predicate with the same :math:`a` and :math:`b`, since these share
+        a row of the :class:`.PredicateTable`.
+
+        The faces of a :class:`.PolytopePredicate` are linear predicates too, so
+        one side of a polytope can be moved by passing its face. Passing the
+        :class:`.PolytopePredicate` itself with a ``(k,)`` array of offsets moves
+        all of its faces, where ``b`` describes the polytope :math:`Ay \leq b`.
+
+        If bounds were given with :meth:`set_bounds`, the big-M values depend on
+        the offsets and are recomputed as well.
+
+        :param predicate:   A :class:`.LinearPredicate` or :class:`.PolytopePredicate`
+                            in the specification.
+        :param b:           The new offset, or a ``(k,)`` array of offsets for a
+                            :class:`.PolytopePredicate`.
+        """
+        if isinstance(predicate, PolytopePredicate):
+            b = np.asarray(b, dtype=float).ravel()
+            assert b.shape == (predicate.k,), "b must be of shape (k,)"
+            # The faces are written as -a_i^Ty + b_i >= 0 inside the polytope
+            sign = -1 if predicate.inside else 1
+            for face, b_i in zip(predicate.faces, b):
+                self.predicate_offsets[self.predicate_table.row(face)] = sign*b_i
+        else:
+            self.predicate_offsets[self.predicate_table.row(predicate)] = float(np.squeeze(b))
+        if self.bounded:
+            self._update_big_m()
+        else:
+            A, sense, _ = self.blocks["predicates"]
+            self.blocks["predicates"] = (A, sense, self.predicate_rhs())
+
+    def set_bounds(self, x_min=None, x_max=None, u_min=None, u_max=None, tighten=True):
+        """
+        Add bounds on the states and/or controls at all timesteps. These are
+        intersected with any bounds given previously and written into ``lb`` and
+        ``ub``. Unless ``tighten`` is ``False``, they are also used to tighten
+        the big-M value of each predicate row and, if every predicate is bounded,
+        to bound the robustness variable from above.
+
+        :param x_min:   (optional) A ``(n,)`` numpy array of lower bounds on the state.
+        :param x_max:   (optional) A ``(n,)`` numpy array of upper bounds on the state.
+        :param u_min:   (optional) A ``(m,)`` numpy array of lower bounds on the control.
+        :param u_max:   (optional) A ``(m,)`` numpy array of upper bounds on the control.
+        :param tighten: (optional) Whether to recompute the big-M values. Default is ``True``.
+        """
+        if x_min is not None:
+            self.x_min = np.maximum(self.x_min, np.ravel(x_min))
+        if x_max is not None:
+            self.x_max = np.minimum(self.x_max, np.ravel(x_max))
+        if u_min is not None:
+            self.u_min = np.maximum(self.u_min, np.ravel(u_min))
+        if u_max is not None:
+            self.u_max = np.minimum(self.u_max, np.ravel(u_max))
+        self.lb[self.x_index] = self.x_min[:, np.newaxis]
+        self.ub[self.x_index] = self.x_max[:, np.newaxis]
+        self.lb[self.u_index] = self.u_min[:, np.newaxis]
+        self.ub[self.u_index] = self.u_max[:, np.newaxis]
+
+        if tighten:
+            self.bounded = True
+            self._update_big_m()
+
+    def _update_big_m(self):
+        """
+        Recompute the big-M value of each predicate row from the current
+        bounds and offsets, and update the ``"predicates"`` block.
+        """
+        table = self.predicate_table
+        M, rho_max = predicate_big_m(table.A, self.predicate_offsets, self.sys,
+                self.x_min, self.x_max, self.u_min, self.u_max, self.M)
+        self.ub[self.rho_index] = rho_max
+        self.predicate_M = M[self.predicate_rows]
+
+        A, sense, _ = self.blocks["predicates"]
+        A = A.tocoo()
+        is_z = np.isin(A.col, self.predicate_z)
+        A.data[is_z] = self.predicate_M[A.row[is_z]]
+        self.blocks["predicates"] = (A.tocsr(), sense, self.predicate_rhs())
+
+    def set_initial_state(self, x0):
+        """
+        Change the initial state :math:`x_0` in the encoding.
+
+        :param x0:  A ``(n,)`` numpy array describing the new initial state.
+        """
+        x0 = np.asarray(x0, dtype=float).ravel()
+        assert x0.shape == (self.sys.n,), "x0 must have shape (n,)"
+        self.x0 = x0
+        A, sense, _ = self.blocks["initial_state"]
+        self.blocks["initial_state"] = (A, sense, x0)
@@ -0,0 +1,163 @@
+from collections import OrderedDict
+import numpy as np
+from ..systems import LinearSystem
+
+class STLProblem:
+    """
+    A solver-independent description of the STL synthesis problem for a given
+    specification, system, and horizon, which the solvers build their
+    optimization problems from.
+
+    The formula is lowered once into a :class:`.CompiledSTLFormula`, from which
+    this class exposes
+
+        - the :class:`.PredicateTable` of all linear predicates,
+        - a directed acyclic graph of nodes, where each node is a subformula at an
+          absolute timestep. Identical ``(subformula, timestep)`` pairs are a single
+          node. Nodes are numbered so that children come before their parents:
+          first the linear predicates, then the nonlinear predicates, and then
+          the ``and``/``or`` nodes, with the root somewhere after all its descendants.
+          Each :class:`.PolytopePredicate` is an ``and`` (inside) or ``or`` (outside)
+          node over its faces. ``and`` nodes over linear predicates that are not shared
+          with other nodes (e.g., the inside of a polytope) are marked in ``is_polytope``,
+          so that mixed-integer solvers can encode them with a single variable.
+        - the system dynamics, including the matrices :math:`A,B,C,D` if the system
+          is a :class:`.LinearSystem`.
+
+    This avoids walking the formula tree separately in every solver. Since building
+    it can take a while for large specifications, use :func:`compile_problem` to get
+    a cached copy.
+
+    :param spec:    An :class:`.STLFormula` describing the specification.
+    :param sys:     A :class:`.NonlinearSystem` describing the system dynamics.
+    :param T:       The total number of timesteps in the trajectory (including
+                    :math:`t=0`).
+    """
+    def __init__(self, spec, sys, T):
+        self.spec = spec
+        self.sys = sys
+        self.T = T
+        self.n, self.m, self.p = sys.n, sys.m, sys.p
+        self.linear = isinstance(sys, LinearSystem)
+        if self.linear:
+            self.A, self.B, self.C, self.D = sys.A, sys.B, sys.C, sys.D
+        else:
+            self.A = self.B = self.C = self.D = None
+
+        compiled = spec.compile()
+        assert compiled.horizon < T, "T must be larger than the horizon of the specification"
+        self.compiled = compiled
+        self.predicate_table = compiled.predicate_table
+
+        # Nodes
+        self.n_nodes = compiled.n_instances
+        self.root = compiled.root
+        self.node_times = compiled.instance_times
+        self.n_linear_leaves = len(compiled.linear_leaf_rows)
+        self.n_leaves = compiled.n_leaves
+        self.linear_leaf_rows = compiled.linear_leaf_rows
+        self.nonlinear_predicates = compiled.nonlinear_predicates
+        self.nonlinear_leaf_rows = compiled.nonlinear_leaf_rows
+
+        # Edges, in compressed sparse row format: the children of node i are
+        # child_index[child_ptr[i]:child_ptr[i+1]]
+        self.is_and = np.zeros(self.n_nodes, dtype=bool)
+        counts = np.zeros(self.n_nodes, dtype=int)
+        for level in compiled.levels:
+            for combination_type, out, children, starts, count in level:
+                counts[out] = count
+                # Polytopes are min/max nodes over their faces
+                self.is_and[out] = combination_type in ("and", "min")
+        self.child_ptr = np.zeros(self.n_nodes + 1, dtype=int)
+        self.child_ptr[1:] = np.cumsum(counts)
+        self.child_index = np.empty(self.child_ptr[-1], dtype=int)
+        for level in compiled.levels:
+            for combination_type, out, children, starts, count in level:
+                position = np.repeat(self.child_ptr[out] - starts, count) + np.arange(len(children))
+                self.child_index[position] = children
+        self.parent_count = np.bincount(self.child_index, minlength=self.n_nodes)
+        self._find_polytopes()
+
+    def _find_polytopes(self):
+        """
+        Find the and nodes that can be encoded as a single polytope: those whose
+        children are all linear predicates (e.g., the inside of a :class:`.PolytopePredicate`),
+        none of which is used by any other kind of node at the same timestep.
+        These are marked in ``is_polytope``, and the linear leaves that are only
+        used by such nodes are marked in ``polytope_only``.
+        """
+        counts = np.diff(self.child_ptr)
+        parent = np.repeat(np.arange(self.n_nodes), counts)
+        child = self.child_index
+        linear_child = child < self.n_linear_leaves
+
+        # And nodes over linear predicates only
+        other_children = np.bincount(parent[~linear_child], minlength=self.n_nodes)
+        candidate = self.is_and & (counts > 0) & (other_children == 0)
+
+        # Predicates with the same row are the same variable at each timestep,
+        # so rule out candidates that share one with any other node
+        key = self.linear_leaf_rows * self.T + self.node_times[:self.n_linear_leaves]
+        edge_key = key[child[linear_child]]
+        edge_parent = parent[linear_child]
+        shared_keys = edge_key[~candidate[edge_parent]]
+        if self.root < self.n_linear_leaves:
+            shared_keys = np.append(shared_keys, key[self.root])
+        shared = np.isin(edge_key, shared_keys)
+        self.is_polytope = candidate & (np.bincount(edge_parent[shared], minlength=self.n_nodes) == 0)
+
+        self.polytope_only = np.zeros(self.n_nodes, dtype=bool)
+        self.polytope_only[:self.n_linear_leaves] = True
+        self.polytope_only[child[linear_child & ~self.is_polytope[parent]]] = False
+        if self.root < self.n_linear_leaves:
+            self.polytope_only[self.root] = False
+
+    def children(self, i):
+        """
+        Get the children of a node.
+
+        :param i:   The index of an ``and`` or ``or`` node.
+
+        :return:    A numpy array with the indices of its children.
+        """
+        return self.child_index[self.child_ptr[i]:self.child_ptr[i+1]]
+
+# Problems compiled most recently, (id(spec), id(sys), T) -> STLProblem
+_problem_cache = OrderedDict()
+_problem_cache_size = 8
+
+def compile_problem(spec, sys, T):
+    """
+    Get the :class:`.STLProblem` for the given specification, system, and horizon,
+    reusing it if it was built recently, e.g., by another solver for the same
+    specification.
+
+    .. note::
+
+        Problems are cached by the identity of ``spec`` and ``sys``. If either one is
+        modified in place (e.g., with :meth:`.STLFormula.simplify`) after a problem
+        was built from it, call :func:`clear_problem_cache`.
+
+    :param spec:    An :class:`.STLFormula` describing the specification.
+    :param sys:     A :class:`.NonlinearSystem` describing the system dynamics.
+    :param T:       The total number of timesteps in the trajectory (including
+                    :math:`t=0`).
+
+    :return:    An :class:`.STLProblem`.
+    """
+    key = (id(spec), id(sys), T)
+    problem = _problem_cache.get(key)
+    if problem is None or problem.spec is not spec or problem.sys is not sys:
+        problem = STLProblem(spec, sys, T)
+        _problem_cache[key] = problem
+        if len(_problem_cache) > _problem_cache_size:
+            _problem_cache.popitem(last=False)
+    else:
+        _problem_cache.move_to_end(key)
+    return problem
+
+def clear_problem_cache():
+    """
+    Forget all problems built by :func:`compile_problem`.
+    """
+    _problem_cache.clear()
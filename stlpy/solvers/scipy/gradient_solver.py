@@ -1,11 +1,15 @@
 import matplotlib.pyplot as plt
 import numpy as np
 import time
-from scipy.optimize import minimize
+from autograd import jacobian
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from scipy.optimize import minimize, OptimizeResult
 from stlpy.STL.predicate import LinearPredicate
+from stlpy.systems import LinearSystem
 import stlpy.enumerations.option
-from autograd import grad
 from ..base import STLSolver
+from ..problem import compile_problem
 
 class ScipyGradientSolver(STLSolver):
     """
@@ -25,10 +29,18 @@ class ScipyGradientSolver(STLSolver):
     using a shooting method and the
     `scipy.optimize <https://docs.scipy.org/doc/scipy/reference/tutorial/optimize.html>`_ solver.
 
+    The gradient of the cost with respect to the control sequence is computed
+    exactly (up to subgradients of non-smooth measures) by reverse-mode
+    differentiation through the robustness measure and the rollout, see
+    :meth:`cost_and_gradient`.
+
+    For a :class:`.LinearSystem`, the rollout is precomputed as a single affine
+    map of the control sequence.
+
     .. warning::
 
-        This solver uses finite-differences to approximate the gradient of the (non-smooth) cost.
-        As such, this method is likely to scale extremely poorly.
+        For systems other than :class:`.LinearSystem`, the Jacobians of the dynamics
+        are approximated with finite differences at each timestep.
 
     :param spec:    An :class:`.STLFormula` describing the specification.
     :param sys:     A :class:`.NonlinearSystem` describing the system dynamics.
@@ -46,6 +58,21 @@ class ScipyGradientSolver(STLSolver):
         self.R = np.zeros((sys.m,sys.m))
         self.method = method
 
+        # Lower the specification to a vectorized program once, since the
+        # robustness measure is evaluated at every cost function call
+        self.problem = compile_problem(spec, sys, self.T)
+        self.compiled_spec = self.problem.compiled
+
+        # For linear systems, the whole trajectory is an affine function of
+        # the controls, which we can precompute once
+        if isinstance(sys, LinearSystem):
+            self._lift_linear_rollout()
+        else:
+            self.lifted = False
+
+        # Whether autograd can differentiate the system dynamics, see _linearize()
+        self._differentiable = True
+
     def AddControlBounds(self, u_min, u_max):
         raise NotImplementedError("This solver does not support control bounds!")
 
@@ -76,29 +103,20 @@ class ScipyGradientSolver(STLSolver):
         u_guess = np.random.uniform(-0.2,0.2,(self.sys.m,self.T))
         #u_guess = np.random.uniform(0.29,0.3, (self.sys.m,self.T))
         # Run scipy's minimize
-        start_time = time.time()
-        p = []
-        def save(u):
-            p.append(self.cost(u))
-
-        # Do a forward rollout to compute the state and output trajectories
-        res = minimize(self.cost, u_guess.flatten(), method=self.method, callback=save)
-        solve_time = time.time() - start_time
+        result = self._solve_from(u_guess)
+        res = result["res"]
+        solve_time = result["solve_time"]
 
         if self.verbose:
             print(res.message)
             print("Solve Time: ", solve_time)
 
         if res.success:
-            u = res.x.reshape((self.sys.m,self.T))
-            x, y = self.forward_rollout(u)
+            x, u, rho = result["x"], result["u"], result["rho"]
             print("Cost function evaluation times: ", res.nfev)
             print("Cost function iteration times: ", res.nit)
 
-            rho = self.spec.robustness(y, 0, self.robustness_type)
-            cost = 0
-            for t in range(self.T):
-                cost += x[:, t].T@self.Q@x[:, t] + u[:, t].T@self.R@u[:, t]
+            cost = self.quadratic_cost(x, u)
             print("QuadraticCost: ", cost)
             print("Cost: ", self.cost(u))
             if self.verbose:
@@ -109,7 +127,166 @@ class ScipyGradientSolver(STLSolver):
             u = None
             rho = -np.inf
 
-        return x, u, rho, solve_time, p
+        return x, u, rho, solve_time, result["p"]
+
+    def SolveMultiStart(self, num_starts, num_workers=None, rho_target=None, seed=0):
+        """
+        Run several independent local optimizations from different random
+        initial guesses, in parallel over a pool of processes, and return the
+        most robust trajectory found by any of them, whether or not that start
+        converged.
+
+        Start ``i`` uses an initial guess drawn uniformly from :math:`[-0.2,0.2]`
+        with random seed ``seed+i``, so start ``0`` with the default seed is the
+        same as :meth:`Solve`. If ``rho_target`` is given, all remaining starts are
+        stopped as soon as one of them reaches a robustness of at least
+        ``rho_target``.
+
+        :param num_starts:  The number of initial guesses to try.
+        :param num_workers: (optional) The number of worker processes. Defaults to
+                            the number of CPUs. With ``num_workers=1`` the starts
+                            are run one after another in this process.
+        :param rho_target:  (optional) A robustness value at which to stop early.
+        :param seed:        (optional) Random seed for the first initial guess.
+                            Default is ``0``.
+
+        :return x:          A ``(n,T)`` numpy array with the best state trajectory,
+                            or ``None`` if no start was run.
+        :return u:          A ``(m,T)`` numpy array with the best control sequence,
+                            or ``None`` if no start was run.
+        :return rho:        The robustness of the best solution, or ``-np.inf``.
+        :return solve_time: The total (wall clock) solve time.
+        :return starts:     A list with one dictionary per start, holding its
+                            ``seed``, ``rho``, ``solve_time``, ``success`` flag,
+                            and whether it was ``stopped`` early.
+        """
+        assert num_starts > 0, "num_starts must be positive"
+        guesses = [np.random.RandomState(seed + i).uniform(-0.2,0.2,(self.sys.m,self.T))
+                   for i in range(num_starts)]
+
+        start_time = time.time()
+        results = [None]*num_starts
+        if num_workers == 1:
+            for i in range(num_starts):
+                results[i] = self._solve_from(guesses[i])
+                if rho_target is not None and results[i]["res"].success \
+                        and results[i]["rho"] >= rho_target:
+                    break
+        else:
+            # Forking lets workers inherit the solver, which may hold
+            # functions (e.g., nonlinear predicates) that cannot be pickled
+            if "fork" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("fork")
+            else:
+                context = multiprocessing.get_context()
+            stop_event = context.Event()
+            with ProcessPoolExecutor(max_workers=num_workers, mp_context=context,
+                                     initializer=_init_worker,
+                                     initargs=(self, stop_event)) as pool:
+                futures = {pool.submit(_solve_worker, guesses[i]): i for i in range(num_starts)}
+                for future in as_completed(futures):
+                    if future.cancelled():
+                        continue
+                    i = futures[future]
+                    results[i] = future.result()
+                    if rho_target is not None and results[i]["res"].success \
+                            and results[i]["rho"] >= rho_target:
+                        stop_event.set()
+                        for other in futures:
+                            other.cancel()
+        solve_time = time.time() - start_time
+
+        starts = []
+        best = None
+        for i, result in enumerate(results):
+            if result is None:
+                starts.append({"seed": seed + i, "rho": None, "solve_time": 0.0,
+                               "success": False, "stopped": True})
+                continue
+            success = bool(result["res"].success)
+            starts.append({"seed": seed + i, "rho": float(result["rho"][0]), "solve_time": result["solve_time"],
+                           "success": success, "stopped": result["stopped"]})
+            # Starts that were stopped early or didn't converge still produced
+            # a trajectory, which may well be the most robust one
+            if best is None or result["rho"] > best["rho"]:
+                best = result
+
+        if self.verbose:
+            for start in starts:
+                print("Start %s: rho = %s, success = %s, time = %.3fs" % (
+                      start["seed"], start["rho"], start["success"], start["solve_time"]))
+            print("Solve Time: ", solve_time)
+
+        if best is None:
+            return None, None, -np.inf, solve_time, starts
+        return best["x"], best["u"], best["rho"], solve_time, starts
+
+    def _solve_from(self, u_guess, stop_event=None):
+        """
+        Run a single local optimization from the given ``(m,T)`` initial guess.
+        If ``stop_event`` is set while the optimizer is running, it stops at the
+        end of the current iteration.
+        """
+        start_time = time.time()
+        p = []
+        def save(u):
+            p.append(self.cost(u))
+            if stop_event is not None and stop_event.is_set():
+                raise StopIteration
+
+        stopped = stop_event is not None and stop_event.is_set()
+        if stopped:
+            res = OptimizeResult(x=u_guess.flatten(), success=False, nfev=0, nit=0,
+                                 message="Stopped before starting")
+        else:
+            res = minimize(self.cost_and_gradient, u_guess.flatten(), method=self.method,
+                           jac=True, callback=save)
+            stopped = stop_event is not None and stop_event.is_set() and not res.success
+        solve_time = time.time() - start_time
+
+        u = res.x.reshape((self.sys.m,self.T))
+        x, y = self.forward_rollout(u)
+        rho = self.compiled_spec.robustness(y, 0, self.robustness_type)
+        return {"x": x, "u": u, "rho": rho, "solve_time": solve_time, "p": p,
+                "res": res, "stopped": stopped}
+
+    def _lift_linear_rollout(self):
+        """
+        Precompute the lifted (block Toeplitz) form of the rollout of a
+        :class:`.LinearSystem`,
+
+        .. math::
+
+            x = \Phi x_0 + \Gamma_x u, \quad y = C \Phi x_0 + \Gamma_y u,
+
+        where :math:`x`, :math:`y`, and :math:`u` are the flattened ``(n,T)``,
+        ``(p,T)``, and ``(m,T)`` trajectories, so that a rollout is a single
+        matrix-vector product.
+        """
+        A, B, C, D = self.sys.A, self.sys.B, self.sys.C, self.sys.D
+        n, m, p, T = self.sys.n, self.sys.m, self.sys.p, self.T
+
+        # A^k for k = 0,...,T-1
+        powers = np.empty((T, n, n))
+        powers[0] = np.eye(n)
+        for k in range(1, T):
+            powers[k] = A@powers[k-1]
+
+        # x_t = A^t x_0 + sum_{s<t} A^(t-1-s) B u_s
+        self.x_offset = np.einsum('tij,j->it', powers, np.asarray(self.x0).ravel())
+        lag = np.arange(T)[:, np.newaxis] - 1 - np.arange(T)[np.newaxis, :]
+        AkB = np.einsum('kij,jl->kil', powers, B)
+        blocks = np.where((lag >= 0)[:, :, np.newaxis, np.newaxis], AkB[np.maximum(lag, 0)], 0.0)
+        Gamma_x = blocks.transpose(2, 0, 3, 1)   # (n,T,m,T)
+
+        # y_t = C x_t + D u_t
+        Gamma_y = np.einsum('pi,itjs->ptjs', C, Gamma_x)
+        Gamma_y += np.einsum('pj,ts->ptjs', D, np.eye(T))
+
+        self.y_offset = C@self.x_offset
+        self.Gamma_x = Gamma_x.reshape((n*T, m*T))
+        self.Gamma_y = Gamma_y.reshape((p*T, m*T))
+        self.lifted = True
 
     def forward_rollout(self, u):
         """
@@ -118,6 +295,12 @@ class ScipyGradientSolver(STLSolver):
         state and output trajectories.
         """
         T = u.shape[1]
+        if self.lifted and T == self.T:
+            u_flat = u.flatten()
+            x = self.x_offset + (self.Gamma_x@u_flat).reshape((self.sys.n, T))
+            y = self.y_offset + (self.Gamma_y@u_flat).reshape((self.sys.p, T))
+            return x, y
+
         x = np.full((self.sys.n,T),np.nan)
         y = np.full((self.sys.p,T),np.nan)
 
@@ -127,10 +310,17 @@ class ScipyGradientSolver(STLSolver):
             x[:,t+1] = self.sys.f(x[:,t], u[:,t])
             y[:,t] = self.sys.g(x[:,t], u[:,t])
 
-        y[:,T-1] = self.sys.g(x[:,t-1], u[:,t-1])
+        y[:,T-1] = self.sys.g(x[:,T-1], u[:,T-1])
 
         return x, y
 
+    def quadratic_cost(self, x, u):
+        """
+        Compute the running cost :math:`\sum_{t} x_t^TQx_t + u_t^TRu_t` of the
+        given ``(n,T)`` state and ``(m,T)`` control trajectories.
+        """
+        return np.einsum('it,ij,jt->', x, self.Q, x) + np.einsum('it,ij,jt->', u, self.R, u)
+
     def cost(self, u_flat):
         """
         Compute the cost (negative robustness) associated
@@ -147,13 +337,109 @@ class ScipyGradientSolver(STLSolver):
         x, y = self.forward_rollout(u)
 
         # Add additional state and control costs
-        for t in range(self.T):
-            cost += x[:, t].T@self.Q@x[:, t] + u[:, t].T@self.R@u[:, t]
+        cost += self.quadratic_cost(x, u)
 
         # Add the (negative) robustness of this signal y with respect
         # to the specification to the cost
-        cost += -self.spec.robustness(y, 0, self.robustness_type)
+        cost += -self.compiled_spec.robustness(y, 0, self.robustness_type)
 
         return cost
 
+    def cost_and_gradient(self, u_flat):
+        """
+        Compute the cost (see :meth:`cost`) associated with the (flattened)
+        control sequence u, along with its gradient with respect to u.
+
+        The gradient of the robustness measure with respect to the output
+        trajectory comes from :meth:`.CompiledSTLFormula.robustness_gradient`,
+        and is propagated back through the outputs and dynamics with an
+        adjoint (backward) pass over the rollout. For a :class:`.LinearSystem`,
+        this is just a product with the transposed lifted rollout matrices.
+        """
+        u = u_flat.reshape((self.sys.m, self.T))
+        x, y = self.forward_rollout(u)
 
+        rho, drho_dy = self.compiled_spec.robustness_gradient(y, 0, self.robustness_type)
+        cost = self.quadratic_cost(x, u) - rho
+        dy = -drho_dy
+        grad_x = (self.Q + self.Q.T)@x
+        grad_u = (self.R + self.R.T)@u
+
+        if self.lifted:
+            grad_u = grad_u.flatten() + self.Gamma_x.T@grad_x.flatten() + self.Gamma_y.T@dy.flatten()
+            return cost, grad_u
+
+        # Backward pass: lam holds the derivative of the cost with respect to x[:,t+1]
+        lam = np.zeros(self.sys.n)
+        for t in reversed(range(self.T)):
+            fx, fu, gx, gu = self._linearize(x[:, t], u[:, t], t < self.T-1)
+            grad_x_t = grad_x[:, t] + gx.T@dy[:, t]
+            grad_u[:, t] += gu.T@dy[:, t]
+            if t < self.T-1:
+                grad_x_t += fx.T@lam
+                grad_u[:, t] += fu.T@lam
+            lam = grad_x_t
+
+        return cost, grad_u.flatten()
+
+    def _linearize(self, x, u, dynamics=True):
+        """
+        Compute the Jacobians of the dynamics f and output g with respect
+        to the state and control at (x, u). If ``dynamics`` is ``False``,
+        the Jacobians of f are not computed.
+
+        The Jacobians are computed with ``autograd``, which requires f and g to
+        be written with ``autograd.numpy``. If they can't be traced, the
+        Jacobians are approximated with central finite differences instead.
+        """
+        if self._differentiable:
+            try:
+                return self._autograd_linearize(x, u, dynamics)
+            except Exception:
+                self._differentiable = False
+        return self._finite_difference_linearize(x, u, dynamics)
+
+    def _autograd_linearize(self, x, u, dynamics):
+        x = x.astype(float)
+        u = u.astype(float)
+        gx = jacobian(lambda x_: self.sys.g(x_, u))(x)
+        gu = jacobian(lambda u_: self.sys.g(x, u_))(u)
+        if not dynamics:
+            return None, None, gx, gu
+        fx = jacobian(lambda x_: self.sys.f(x_, u))(x)
+        fu = jacobian(lambda u_: self.sys.f(x, u_))(u)
+        return fx, fu, gx, gu
+
+    def _finite_difference_linearize(self, x, u, dynamics):
+        eps = 1e-6
+        n, m = self.sys.n, self.sys.m
+        fx = np.zeros((n, n)) if dynamics else None
+        fu = np.zeros((n, m)) if dynamics else None
+        gx = np.zeros((self.sys.p, n))
+        gu = np.zeros((self.sys.p, m))
+        for i in range(n):
+            dx = np.zeros(n)
+            dx[i] = eps
+            if dynamics:
+                fx[:, i] = (self.sys.f(x + dx, u) - self.sys.f(x - dx, u)) / (2*eps)
+            gx[:, i] = (self.sys.g(x + dx, u) - self.sys.g(x - dx, u)) / (2*eps)
+        for i in range(m):
+            du = np.zeros(m)
+            du[i] = eps
+            if dynamics:
+                fu[:, i] = (self.sys.f(x, u + du) - self.sys.f(x, u - du)) / (2*eps)
+            gu[:, i] = (self.sys.g(x, u + du) - self.sys.g(x, u - du)) / (2*eps)
+        return fx, fu, gx, gu
+
+# Each worker process in ScipyGradientSolver.SolveMultiStart holds its own
+# copy of the solver, along with an event used to stop all workers early
+_worker_solver = None
+_worker_stop_event = None
+
+def _init_worker(solver, stop_event):
+    global _worker_solver, _worker_stop_event
+    _worker_solver = solver
+    _worker_stop_event = stop_event
+
+def _solve_worker(u_guess):
+    return _worker_solver._solve_from(u_guess, _worker_stop_event)
@@ -0,0 +1,181 @@
+import stlpy.enumerations.option
+from ..base import STLSolver
+from ..micp_encoding import MICPEncoding
+import numpy as np
+from scipy.optimize import milp, LinearConstraint, Bounds
+
+import time
+import warnings
+
+class HighsMICPSolver(STLSolver):
+    """
+    Given an :class:`.STLFormula` :math:`\\varphi` and a :class:`.LinearSystem`,
+    solve the optimization problem
+
+    .. math::
+
+        \min & -\\rho^{\\varphi}(y_0,y_1,\dots,y_T)
+
+        \\text{s.t. } & x_0 \\text{ fixed}
+
+        & x_{t+1} = A x_t + B u_t
+
+        & y_{t} = C x_t + D u_t
+
+        & \\rho^{\\varphi}(y_0,y_1,\dots,y_T) \geq 0
+
+    with the open-source `HiGHS <https://highs.dev/>`_ solver, through
+    ``scipy.optimize.milp``. This uses the same mixed-integer encoding as
+    :class:`.GurobiMICPSolver` (see :class:`.MICPEncoding`), so it also gives a
+    globally optimal solution, but does not require a Gurobi license.
+
+    .. note::
+
+        ``scipy.optimize.milp`` only solves mixed-integer linear programs, so
+        quadratic running costs are not supported.
+
+    :param spec:            An :class:`.STLFormula` describing the specification.
+    :param sys:             A :class:`.LinearSystem` describing the system dynamics.
+    :param x0:              A ``(n,1)`` numpy matrix describing the initial state.
+    :param T:               A positive integer fixing the total number of timesteps :math:`T`.
+    :param M:               (optional) A large positive scalar used to rewrite ``min`` and ``max`` as
+                            mixed-integer constraints. Default is ``1000``.
+    :param robustness_cost: (optional) Boolean flag for adding a linear cost to maximize
+                            the robustness measure. Default is ``True``.
+    :param presolve:        (optional) A boolean indicating whether to use HiGHS's
+                            presolve routines. Default is ``True``.
+    :param tight_big_m:     (optional) Boolean flag for replacing ``M`` with a separate, much
+                            smaller value for each predicate once state and control bounds are
+                            added (see :func:`.predicate_big_m`). Default is ``True``.
+    :param encoding:        (optional) How to encode disjunctions, either ``"naive"`` or
+                            ``"log_sos1"``. See :class:`.MICPEncoding`. Default is ``"naive"``.
+    :param verbose:         (optional) A boolean indicating whether to print detailed
+                            solver info. Default is ``True``.
+    """
+    def __init__(self, spec, sys, x0, T, M=1000, robustness_cost=True,
+            presolve=True, tight_big_m=True, encoding="naive", verbose=True,
+            robustness_type=stlpy.enumerations.option.RobustnessMetrics.Standard):
+        assert M > 0, "M should be a (large) positive scalar"
+        assert encoding in ("naive", "log_sos1"), "HiGHS does not support SOS1 constraints"
+        super().__init__(spec, sys, x0, T, verbose, robustness_type)
+
+        self.M = float(M)
+        self.presolve = presolve
+        self.tight_big_m = tight_big_m
+
+        if self.verbose:
+            print("Setting up optimization problem...")
+        st = time.time()  # for computing setup time
+
+        # The whole problem is stored in sparse matrix form
+        self.encoding = MICPEncoding(spec, sys, x0, self.T, self.M, encoding)
+        self.cost = np.zeros(self.encoding.num_vars)
+        self.rho_min = -np.inf
+        self.constraints = []
+        self.result = None
+
+        # Add cost and constraints to the optimization problem
+        self.AddDynamicsConstraints()
+        self.AddSTLConstraints()
+        self.AddRobustnessConstraint()
+        if robustness_cost:
+            self.AddRobustnessCost()
+
+        self.setup_time = time.time() - st
+        if self.verbose:
+            print(f"Setup complete in {self.setup_time} seconds.")
+
+    def AddDynamicsConstraints(self):
+        # Initial condition, dynamics, and outputs
+        self.constraints += ["initial_state", "dynamics", "outputs"]
+
+    def AddSTLConstraints(self):
+        """
+        Add the STL constraints
+            (x,u) |= specification
+        to the optimization problem, using the constraint blocks of
+        :class:`.MICPEncoding`.
+        """
+        self.constraints += ["predicates", "and", "or", "root"]
+        if self.encoding.encoding == "log_sos1":
+            self.constraints.append("sos1")
+
+    def AddControlBounds(self, u_min, u_max):
+        self.encoding.set_bounds(u_min=u_min, u_max=u_max, tighten=self.tight_big_m)
+
+    def AddStateBounds(self, x_min, x_max):
+        self.encoding.set_bounds(x_min=x_min, x_max=x_max, tighten=self.tight_big_m)
+
+    def AddQuadraticCost(self, Q, R):
+        raise NotImplementedError("scipy.optimize.milp only supports linear costs")
+
+    def AddRobustnessCost(self):
+        self.cost[self.encoding.rho_index] -= 1
+
+    def AddRobustnessConstraint(self, rho_min=0.0):
+        self.rho_min = max(self.rho_min, rho_min)
+
+    def Solve(self, time_limit=None, mip_gap=None, threads=None):
+        """
+        Solve the optimization problem. By default, this runs until a globally
+        optimal solution is found. If the search is stopped early, the best
+        solution found so far (if any) is returned.
+
+        :param time_limit:  (optional) A wall-clock budget in seconds.
+        :param mip_gap:     (optional) Stop once the relative gap between the best
+                            solution and the best bound is below this value.
+        :param threads:     (optional) The number of threads HiGHS may use.
+
+        :return x:          A ``(n,T)`` numpy array with the state trajectory, or ``None``
+                            if no solution was found.
+        :return u:          A ``(m,T)`` numpy array with the control inputs, or ``None``.
+        :return rho:        The robustness :math:`\\rho` of the solution, or ``-np.inf``.
+        :return solve_time: The time it took to solve the problem, in seconds.
+        """
+        enc = self.encoding
+        constraints = []
+        for name in self.constraints:
+            A, sense, b = enc.blocks[name]
+            if len(b) > 0:
+                constraints.append(LinearConstraint(A, b if sense == "=" else -np.inf, b))
+
+        lb = enc.lb.copy()
+        lb[enc.rho_index] = max(lb[enc.rho_index], self.rho_min)
+
+        options = {"disp": self.verbose, "presolve": self.presolve}
+        if time_limit is not None:
+            options["time_limit"] = time_limit
+        if mip_gap is not None:
+            options["mip_rel_gap"] = mip_gap
+        if threads is not None:
+            options["threads"] = threads
+
+        st = time.time()
+        with warnings.catch_warnings():
+            # Options that scipy does not know about (threads) are passed
+            # on to HiGHS as they are, with a warning
+            warnings.filterwarnings("ignore", "Unrecognized options", RuntimeWarning)
+            res = milp(self.cost, constraints=constraints, integrality=enc.integer.astype(int),
+                       bounds=Bounds(lb, enc.ub), options=options)
+        solve_time = time.time() - st
+        self.result = res
+
+        if self.verbose:
+            print("")
+            print(res.message)
+            print("Setup time: ", self.setup_time)
+            print("Solve time: ", solve_time)
+
+        if res.x is not None:
+            x = res.x[enc.x_index]
+            u = res.x[enc.u_index]
+            rho = res.x[enc.rho_index:enc.rho_index+1]
+            if self.verbose:
+                print("Robustness: ", rho)
+                print("")
+        else:
+            x = None
+            u = None
+            rho = -np.inf
+
+        return (x,u,rho,solve_time)
@@ -1,4 +1,9 @@
-import numpy as np
+# Write the dynamics with autograd's numpy wrapper where possible, so that
+# gradient-based solvers can differentiate them exactly
+try:
+    import autograd.numpy as np
+except ImportError:
+    import numpy as np
 
 
 class NonlinearSystem:
@@ -0,0 +1,45 @@
+import numpy as np
+from functools import reduce
+from stlpy.STL import STLTree, LinearPredicate, all_of, any_of
+from stlpy.enumerations.option import RobustnessMetrics
+
+def make_predicates(n=5):
+    rng = np.random.default_rng(0)
+    return [LinearPredicate(rng.normal(size=2), rng.normal()) for i in range(n)]
+
+def test_standard_matches_nested_fold():
+    predicates = make_predicates()
+    y = np.random.default_rng(1).normal(size=(2, 4))
+    for flat, nested in [(all_of(predicates), reduce(lambda a, b: a & b, predicates)),
+                         (any_of(predicates), reduce(lambda a, b: a | b, predicates))]:
+        np.testing.assert_allclose(flat.robustness(y, 0, RobustnessMetrics.Standard),
+                                   nested.robustness(y, 0, RobustnessMetrics.Standard))
+
+def test_other_metrics_use_one_n_ary_node():
+    # Non-associative metrics are applied to all subformulas at once, which
+    # generally differs from the nested fold
+    predicates = make_predicates()
+    y = np.random.default_rng(1).normal(size=(2, 4))
+    for combine, combination_type in [(all_of, "and"), (any_of, "or")]:
+        flat = combine(predicates)
+        n_ary = STLTree(predicates, combination_type, [0]*len(predicates))
+        assert flat.combination_type == combination_type
+        assert len(flat.subformula_list) == len(predicates)
+        for metric in RobustnessMetrics:
+            if metric == RobustnessMetrics.TimeRobustness:
+                continue
+            np.testing.assert_allclose(flat.compile().robustness(y, 0, metric),
+                                       n_ary.compile().robustness(y, 0, metric), err_msg=metric.name)
+
+    nested = reduce(lambda a, b: a & b, predicates)
+    assert not np.allclose(all_of(predicates).robustness(y, 0, RobustnessMetrics.AGM),
+                           nested.robustness(y, 0, RobustnessMetrics.AGM))
+
+def test_single_formula_keeps_name():
+    predicate = make_predicates(1)[0]
+    assert all_of([predicate]) is predicate
+    for combine in [all_of, any_of]:
+        named = combine([predicate], name="goal")
+        assert isinstance(named, STLTree)
+        assert named.name == "goal"
+        assert named.subformula_list == [predicate]
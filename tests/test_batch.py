@@ -0,0 +1,26 @@
+import numpy as np
+from stlpy.benchmarks import RandomMultitarget, NonlinearReachAvoid
+from stlpy.enumerations.option import RobustnessMetrics
+
+def test_batch_matches_single_signals():
+    for scenario in (RandomMultitarget(2, 2, 2, 10, seed=0), NonlinearReachAvoid((7.5, 8.5), 0.75, (4, 5), 1.5, 10)):
+        spec = scenario.GetSpecification()
+        compiled = spec.compile()
+        Y = np.random.default_rng(0).uniform(0, 10, size=(20, spec.d, 11))
+        for metric in RobustnessMetrics:
+            if metric == RobustnessMetrics.TimeRobustness:
+                continue
+            batch = spec.robustness_batch(Y, 0, metric)
+            assert batch.shape == (20,)
+            single = [compiled.robustness(Y[n], 0, metric)[0] for n in range(20)]
+            np.testing.assert_allclose(batch, single, rtol=1e-9, atol=1e-12)
+
+def test_batch_predicate_values_are_one_product():
+    spec = RandomMultitarget(2, 2, 2, 10, seed=0).GetSpecification()
+    table = spec.get_predicate_table()
+    Y = np.random.default_rng(1).normal(size=(5, spec.d, 11))
+    values = table.evaluate(Y, RobustnessMetrics.Standard)
+    assert values.shape == (len(table), 5, 11)
+    for n in range(5):
+        np.testing.assert_allclose(values[:, n], table.evaluate(Y[n], RobustnessMetrics.Standard),
+                                   rtol=1e-12, atol=1e-12)
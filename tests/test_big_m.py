@@ -0,0 +1,44 @@
+import numpy as np
+from stlpy.systems import DoubleIntegrator
+from stlpy.STL import LinearPredicate
+from stlpy.systems import LinearSystem
+from stlpy.solvers import predicate_big_m, HighsMICPSolver
+
+def test_unbounded_predicate_disables_robustness_bound():
+    sys = DoubleIntegrator(2)
+    x_min = np.array([0, 0, -1, -1.])
+    x_max = np.array([10, np.inf, 1, 1.])
+    u_min = -np.ones(2)
+    u_max = np.ones(2)
+    # The second predicate depends on the unbounded state y2
+    A = np.zeros((2, sys.p))
+    A[0, 0] = A[1, 1] = 1
+    b = np.array([2., 3])
+    M, rho_max = predicate_big_m(A, b, sys, x_min, x_max, u_min, u_max, M=1000)
+    assert rho_max == np.inf
+    # Rows with a finite lower bound are valid for any robustness up to M
+    np.testing.assert_allclose(M, [1002, 1003])
+
+    # With every row bounded above, only a row that is unbounded below
+    # falls back to the global M
+    M, rho_max = predicate_big_m(-A, -b, sys, x_min, x_max, u_min, u_max, M=1000)
+    assert rho_max == 3
+    np.testing.assert_allclose(M, [11, 1000])
+
+def test_all_rows_unbounded():
+    sys = DoubleIntegrator(1)
+    M, rho_max = predicate_big_m(np.eye(sys.p)[:1], np.array([0.]), sys,
+                                 -np.inf*np.ones(2), np.inf*np.ones(2), -np.ones(1), np.ones(1))
+    assert rho_max == np.inf
+    np.testing.assert_allclose(M, [1000])
+
+def test_tight_big_m_keeps_optimum():
+    # x_{t+1} = x_t + u_t with y = (x, u), where only the state is bounded
+    sys = LinearSystem(np.eye(1), np.eye(1), np.array([[1.], [0]]), np.array([[0.], [1]]))
+    spec = (LinearPredicate([1, 0], 5) | LinearPredicate([0, 1], 2)).eventually(0, 3)
+    rho = []
+    for tight_big_m in (False, True):
+        solver = HighsMICPSolver(spec, sys, np.zeros(1), 4, tight_big_m=tight_big_m, verbose=False)
+        solver.AddStateBounds(np.array([-10.]), np.array([10.]))
+        rho.append(solver.Solve()[2])
+    np.testing.assert_allclose(rho[0], rho[1])
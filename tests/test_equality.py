@@ -0,0 +1,29 @@
+import numpy as np
+from stlpy.STL import LinearPredicate
+
+def make_formula():
+    a = LinearPredicate(np.array([1., 0]), 1)
+    b = LinearPredicate(np.array([0., 1]), 2)
+    return (a & b.eventually(0, 3)).always(0, 2)
+
+def test_equality_is_identity():
+    first = make_formula()
+    second = make_formula()
+    assert first == first
+    assert first != second
+    assert len({first, second}) == 2
+
+def test_structural_equality():
+    first = make_formula()
+    second = make_formula()
+    assert first.structurally_equal(second)
+    assert first.fingerprint() == second.fingerprint()
+    assert not first.structurally_equal(first.subformula)
+
+def test_clear_cache_after_mutation():
+    first = make_formula()
+    second = make_formula()
+    assert first.structurally_equal(second)
+    first.t2 = 3
+    first.clear_cache()
+    assert not first.structurally_equal(second)
@@ -0,0 +1,51 @@
+import numpy as np
+from stlpy.STL import NonlinearPredicate
+from stlpy.systems import Unicycle
+from stlpy.solvers import ScipyGradientSolver
+
+def test_predicate_gradient_uses_autograd():
+    predicate = NonlinearPredicate(lambda y: 1 - y[0]**2 - 0.3*y[1], 2)
+    y_t = np.array([0.7, -1.2])
+    np.testing.assert_allclose(predicate.gradient(y_t), [-1.4, -0.3], rtol=1e-12)
+    assert predicate._differentiable
+
+def test_predicate_gradient_falls_back_to_finite_differences():
+    # np.cos on an autograd box fails, so g can't be traced
+    predicate = NonlinearPredicate(lambda y: float(np.cos(y[0])) + y[1], 2)
+    y_t = np.array([0.7, -1.2])
+    np.testing.assert_allclose(predicate.gradient(y_t), [-np.sin(0.7), 1.0], rtol=1e-6)
+    assert not predicate._differentiable
+
+def test_linearize_matches_finite_differences():
+    sys = Unicycle(0.1)
+    spec = NonlinearPredicate(lambda y: y[0], 3).always(0, 2)
+    solver = ScipyGradientSolver(spec, sys, np.zeros(3), 3, verbose=False)
+    x = np.array([0.3, -0.2, 0.9])
+    u = np.array([1.1, 0.4])
+    exact = solver._linearize(x, u)
+    assert solver._differentiable
+    approx = solver._finite_difference_linearize(x, u, True)
+    for J, J_approx in zip(exact, approx):
+        np.testing.assert_allclose(J, J_approx, atol=1e-8)
+
+def test_multi_start_keeps_best_unconverged_start(monkeypatch):
+    import stlpy.solvers.scipy.gradient_solver as gradient_solver
+    from stlpy.systems import LinearSystem
+    from stlpy.STL import LinearPredicate
+
+    # Report every start as not converged, as if it had been stopped early
+    minimize = gradient_solver.minimize
+    def unconverged_minimize(*args, **kwargs):
+        res = minimize(*args, **kwargs)
+        res.success = False
+        return res
+    monkeypatch.setattr(gradient_solver, "minimize", unconverged_minimize)
+
+    sys = LinearSystem(np.eye(1), np.eye(1), np.eye(1), np.zeros((1,1)))
+    spec = LinearPredicate([1], 5).eventually(0, 4)
+    solver = ScipyGradientSolver(spec, sys, np.zeros(1), 5, verbose=False)
+    x, u, rho, _, starts = solver.SolveMultiStart(3, num_workers=1)
+
+    assert not any(start["success"] for start in starts)
+    assert x is not None and u is not None
+    assert float(rho[0]) == max(start["rho"] for start in starts)
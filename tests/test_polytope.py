@@ -0,0 +1,69 @@
+import numpy as np
+from stlpy.STL import LinearPredicate, PolytopePredicate, SlidingWindowEvaluator, all_of
+from stlpy.benchmarks.common import inside_rectangle_formula, outside_rectangle_formula
+from stlpy.systems import DoubleIntegrator
+from stlpy.solvers import MICPEncoding
+from stlpy.enumerations.option import RobustnessMetrics
+
+metrics = [m for m in RobustnessMetrics if m != RobustnessMetrics.TimeRobustness]
+
+def test_rectangle_faces_are_named_linear_predicates():
+    rectangle = inside_rectangle_formula((1, 2, 3, 4), 0, 1, 2, name="goal")
+    assert rectangle.is_predicate()
+    assert all(isinstance(face, LinearPredicate) for face in rectangle.faces)
+    assert [face.name for face in rectangle.faces] == \
+            ["right of goal", "left of goal", "top of goal", "bottom of goal"]
+    outside = outside_rectangle_formula((1, 2, 3, 4), 0, 1, 2, name="obstacle")
+    assert [face.name for face in outside.faces] == \
+            ["left of obstacle", "right of obstacle", "bottom of obstacle", "top of obstacle"]
+    assert [face.name for face in rectangle.negation().faces] == \
+            ["not right of goal", "not left of goal", "not top of goal", "not bottom of goal"]
+
+def test_polytope_is_min_or_max_over_faces():
+    rng = np.random.default_rng(0)
+    y = rng.uniform(0, 5, size=(2, 6))
+    for polytope in [inside_rectangle_formula((1, 2, 3, 4), 0, 1, 2),
+                     outside_rectangle_formula((1, 2, 3, 4), 0, 1, 2)]:
+        spec = polytope.always(0, 2) | polytope.eventually(1, 3)
+        compiled = spec.compile()
+        evaluator = SlidingWindowEvaluator(spec)
+        for metric in metrics:
+            faces = np.array([face.robustness(y, 0, metric)[0] for face in polytope.faces])
+            expected = faces.min() if polytope.inside else faces.max()
+            np.testing.assert_allclose(polytope.robustness(y, 0, metric), [expected])
+            np.testing.assert_allclose(polytope.evaluate(y, metric)[0], expected)
+            np.testing.assert_allclose(compiled.robustness(y, 0, metric),
+                                       spec.robustness(y, 0, metric), err_msg=metric.name)
+            np.testing.assert_allclose(evaluator.evaluate(y, metric)[0],
+                                       compiled.robustness(y, 0, metric)[0], err_msg=metric.name)
+
+    # The standard robustness matches the conjunction of the faces
+    rectangle = inside_rectangle_formula((1, 2, 3, 4), 0, 1, 2)
+    np.testing.assert_allclose(rectangle.robustness(y, 2, RobustnessMetrics.Standard),
+                               all_of(rectangle.faces).robustness(y, 2, RobustnessMetrics.Standard))
+
+def test_polytope_inequalities():
+    A = np.array([[1., 0], [0, 1], [-1, -1]])
+    b = np.array([1., 2, 0])
+    polytope = PolytopePredicate(A, b)
+    A_out, b_out = polytope.get_all_inequalities()
+    np.testing.assert_allclose(A_out, A)
+    np.testing.assert_allclose(b_out, b)
+    assert polytope.get_all_conjunctive_state_formulas() == [polytope]
+
+def test_move_polytope_faces():
+    sys = DoubleIntegrator(2)
+    goal = inside_rectangle_formula((7, 8, 8, 9), 0, 1, 6, name="goal")
+    spec = goal.eventually(0, 5)
+    encoding = MICPEncoding(spec, sys, np.zeros(4), 6)
+    table = encoding.predicate_table
+
+    # Move the left side of the goal, y1 >= 7, to y1 >= 6.5
+    right_of = goal.faces[0]
+    encoding.set_predicate_offset(right_of, 6.5)
+    assert encoding.predicate_offsets[table.row(right_of)] == 6.5
+
+    # Move the whole goal, given as A y <= b
+    encoding.set_predicate_offset(goal, goal.b + 1)
+    offsets = [encoding.predicate_offsets[table.row(face)] for face in goal.faces]
+    np.testing.assert_allclose(offsets, -(goal.b + 1))
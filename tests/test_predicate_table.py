@@ -0,0 +1,44 @@
+import numpy as np
+from stlpy.benchmarks import RandomMultitarget, DoorPuzzle
+from stlpy.STL import LinearPredicate, PredicateTable
+from stlpy.enumerations.option import RobustnessMetrics
+
+def test_table_matches_each_predicate():
+    spec = RandomMultitarget(3, 2, 2, 10, seed=0).GetSpecification()
+    table = PredicateTable(spec)
+    y = np.random.default_rng(0).uniform(0, 10, size=(spec.d, 11))
+    for metric in (RobustnessMetrics.Standard, RobustnessMetrics.wSTL_Standard):
+        values = table.evaluate(y, metric)
+        assert values.shape == (len(table), 11)
+        for row, predicate in enumerate(table.predicates):
+            expected = [predicate.robustness(y, t, metric)[0] for t in range(11)]
+            np.testing.assert_allclose(values[row], expected, rtol=1e-12, atol=1e-12)
+
+def test_identical_predicates_share_a_row():
+    p = LinearPredicate([1, 2], 3)
+    q = LinearPredicate([1, 2], 3)
+    table = PredicateTable(p & q.eventually(0, 2))
+    assert len(table) == 1
+    assert table.row(p) == table.row(q)
+
+def test_recursive_and_compiled_robustness_agree():
+    spec = DoorPuzzle(10, 2).GetSpecification()
+    compiled = spec.compile()
+    y = np.random.default_rng(1).uniform(0, 10, size=(spec.d, 11))
+    for metric in (RobustnessMetrics.Standard, RobustnessMetrics.AGM, RobustnessMetrics.NewRobustness):
+        np.testing.assert_allclose(spec.robustness(y, 0, metric), compiled.robustness(y, 0, metric),
+                                   rtol=1e-9, atol=1e-12)
+
+def test_predicate_table_is_cached():
+    p = LinearPredicate(np.array([1., 0]), 1)
+    q = LinearPredicate(np.array([0., 1]), 2)
+    spec = p & q.eventually(0, 2)
+    table = spec.get_predicate_table()
+    assert spec.get_predicate_table() is table
+    assert spec.compile().predicate_table is table
+
+    # Mutating the formula needs clear_cache to rebuild the table
+    spec.subformula_list.append(LinearPredicate(np.array([1., 1]), 0))
+    spec.timesteps.append(0)
+    spec.clear_cache()
+    assert len(spec.get_predicate_table()) == 3
@@ -0,0 +1,33 @@
+import numpy as np
+from stlpy.STL import LinearPredicate, SlidingWindowEvaluator
+from stlpy.enumerations.option import RobustnessMetrics
+
+def make_formula():
+    p = LinearPredicate([1, 0], 0.3, name="p")
+    q = LinearPredicate([0, 1], 0.5, name="q")
+    formula = p.always(0, 3) & q.eventually(2, 8)
+    formula.name = "spec"
+    return formula
+
+def test_signal_matches_pointwise_robustness():
+    formula = make_formula()
+    compiled = formula.compile()
+    y = np.random.default_rng(0).uniform(0, 1, size=(2, 20))
+    for metric in (RobustnessMetrics.Standard, RobustnessMetrics.AGM, RobustnessMetrics.LSE):
+        rho = formula.robustness_signal(y, metric)
+        assert rho.shape == (20,)
+        expected = [compiled.robustness(y, t, metric)[0] for t in range(20 - compiled.horizon)]
+        np.testing.assert_allclose(rho[:len(expected)], expected, rtol=1e-9, atol=1e-12)
+        assert np.all(np.isnan(rho[len(expected):]))
+
+def test_short_signal_is_nan():
+    formula = make_formula()
+    y = np.random.default_rng(1).uniform(0, 1, size=(2, 5))
+    rho, named = formula.robustness_signal(y, RobustnessMetrics.Standard, subformulas=True)
+    assert rho.shape == (5,) and np.all(np.isnan(rho))
+    assert np.all(np.isnan(named["spec"]))
+    # Predicates can still be evaluated at every timestep
+    np.testing.assert_allclose(named["p"], (y[0] - 0.3) / 10)
+
+    rho = SlidingWindowEvaluator(formula).robustness_signal(y[:, :1], RobustnessMetrics.LSE)
+    assert rho.shape == (1,) and np.isnan(rho[0])
@@ -0,0 +1,44 @@
+import numpy as np
+from stlpy.STL import STLTree, LinearPredicate, UntilTree
+from stlpy.enumerations.option import RobustnessMetrics
+
+def switching_time_until(left, right, t1, t2):
+    # The until operator as a disjunction over every switching time
+    self_until_tprime = []
+    for t_prime in range(t1, t2+1):
+        subformula_list = [left for t in range(t1, t_prime)] + [right]
+        self_until_tprime.append(STLTree(subformula_list, "and", list(range(t1, t_prime+1))))
+    return STLTree(self_until_tprime, "or", [0]*len(self_until_tprime))
+
+def make_predicates():
+    p = LinearPredicate(np.array([1., 0]), -1)
+    q = LinearPredicate(np.array([0., 1]), 0.5)
+    return p, q
+
+def test_until_matches_switching_time_construction():
+    p, q = make_predicates()
+    y = np.random.default_rng(0).normal(size=(2, 12))
+    for t1, t2 in [(0, 0), (0, 5), (2, 8)]:
+        spec = p.until(q, t1, t2)
+        baseline = switching_time_until(p, q, t1, t2)
+        for metric in RobustnessMetrics:
+            if metric == RobustnessMetrics.TimeRobustness:
+                assert spec.robustness(y, 0, metric) is None
+                assert baseline.robustness(y, 0, metric) is None
+                continue
+            np.testing.assert_allclose(spec.compile().robustness(y, 0, metric),
+                                       baseline.compile().robustness(y, 0, metric),
+                                       rtol=1e-12, err_msg=metric.name)
+        np.testing.assert_allclose(spec.robustness(y, 0, RobustnessMetrics.Standard),
+                                   baseline.robustness(y, 0, RobustnessMetrics.Standard))
+
+def test_linear_until_matches_standard_robustness():
+    p, q = make_predicates()
+    spec = p.until(q, 2, 8, linear=True)
+    assert isinstance(spec, UntilTree)
+    baseline = switching_time_until(p, q, 2, 8)
+    rng = np.random.default_rng(1)
+    for _ in range(10):
+        y = rng.normal(size=(2, 12))
+        np.testing.assert_allclose(spec.robustness(y, 0, RobustnessMetrics.Standard),
+                                   baseline.robustness(y, 0, RobustnessMetrics.Standard), rtol=1e-12)